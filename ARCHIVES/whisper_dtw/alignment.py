@@ -0,0 +1,220 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+Word-level timestamps from cross-attention QKs, for a whole batch at once.
+
+Per item this is the `whisper.timing.find_alignment` recipe: softmax over
+frames, normalization over tokens, median filter over frames, mean over
+alignment heads, then DTW. Here the tensor steps run once over the padded
+batch, masking each item's frames past its length, and the DTWs run on a
+thread pool (the numba kernels release the GIL).
+"""
+
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from whisper.audio import TOKENS_PER_SECOND
+from whisper.timing import WordTiming, merge_punctuations
+from whisper.tokenizer import get_tokenizer
+
+from dtw_kernels import dtw
+
+# Alignment falls back to the CPU on hosts without a GPU
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+LEN_SOT = 3
+MEDIAN_FILTER_WIDTH = 7
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+
+DTW_WORKERS = min(8, os.cpu_count() or 1)
+_dtw_executor = None
+
+
+@functools.lru_cache(maxsize=None)
+def whisper_tokenizer(multilingual: bool = True, num_languages: int = 99, language: str = "en", task: str = "transcribe"):
+    return get_tokenizer(multilingual, num_languages=num_languages, language=language, task=task)
+
+
+def median_filter(x: torch.Tensor, lengths: torch.Tensor, filter_width: int = MEDIAN_FILTER_WIDTH) -> torch.Tensor:
+    """
+    `whisper.timing.median_filter` along the last axis of a padded batch:
+    item b (first axis) is reflected at its own length `lengths[b]` instead
+    of at the end of the padding. Values past an item's length are undefined.
+    """
+    pad_width = filter_width // 2
+    n_frames = x.shape[-1]
+    if n_frames <= pad_width:
+        return x
+
+    # Reflect-padding as a gather: position -k reads k, position L - 1 + k reads L - 1 - k
+    positions = torch.arange(-pad_width, n_frames + pad_width, device=x.device).abs()
+    last = (lengths.to(x.device) - 1)[:, None]
+    index = torch.where(positions > last, 2 * last - positions, positions).clamp(0, n_frames - 1)
+    index = index.view(index.shape[0], *([1] * (x.ndim - 2)), -1).expand(*x.shape[:-1], -1)
+    padded = x.gather(-1, index)
+    if torch.isnan(padded).any():
+        # min/max propagate NaN where sort puts it last; keep whisper's semantics
+        filtered = padded.unfold(-1, filter_width, 1).sort()[0][..., pad_width]
+    else:
+        filtered = _sorting_network_median(padded, filter_width)
+
+    # Like whisper, leave items too short to filter unchanged
+    too_short = (lengths <= pad_width).to(x.device).view(-1, *([1] * (x.ndim - 1)))
+    return torch.where(too_short, x, filtered)
+
+
+@functools.lru_cache(maxsize=None)
+def _median_network(width: int) -> tuple:
+    """
+    Comparators (a, b, keep_min, keep_max) selecting the middle of `width` values:
+    Batcher's odd-even merge sort, minus the comparators and outputs the middle doesn't depend on.
+    """
+    size = 1
+    while size < width:
+        size *= 2
+    comparators = []
+    t = 1
+    while t < size:
+        k = t
+        while k >= 1:
+            for j in range(k % t, size - k, 2 * k):
+                for i in range(min(k, size - j - k)):
+                    if (i + j) // (2 * t) == (i + j + k) // (2 * t):
+                        comparators.append((i + j, i + j + k))
+            k //= 2
+        t *= 2
+
+    needed = {width // 2}
+    network = []
+    for a, b in reversed(comparators):
+        # Wires past `width` hold +inf and never swap
+        if b < width and (a in needed or b in needed):
+            network.append((a, b, a in needed, b in needed))
+            needed |= {a, b}
+    return tuple(reversed(network))
+
+
+def _sorting_network_median(padded: torch.Tensor, filter_width: int) -> torch.Tensor:
+    # Elementwise min/max over the `filter_width` shifted views: several times
+    # faster than sorting unfolded windows, with the same values
+    n = padded.shape[-1] - filter_width + 1
+    views = [padded[..., k : k + n] for k in range(filter_width)]
+    for a, b, keep_min, keep_max in _median_network(filter_width):
+        low = torch.minimum(views[a], views[b]) if keep_min else None
+        high = torch.maximum(views[a], views[b]) if keep_max else None
+        views[a], views[b] = low, high
+    return views[filter_width // 2]
+
+
+def alignment_matrices(cross_qk, n_frames: list, n_tokens: list = None) -> list:
+    """
+    Token x frame alignment matrices for a batch.
+
+    `cross_qk` is (batch, heads, tokens, frames), `n_frames[b]` the number of mel
+    frames of item b (its QKs cover n_frames[b] // 2 frames) and `n_tokens[b]`
+    its number of tokens (default: all). Returns one float64 NumPy array of
+    shape (n_tokens[b] - LEN_SOT, n_frames[b] // 2) per item.
+    """
+    qk = torch.as_tensor(cross_qk).to(DEVICE)
+    batch_size, _, max_tokens, _ = qk.shape
+    frames = torch.tensor([n // 2 for n in n_frames], device=DEVICE)
+    tokens = list(n_tokens) if n_tokens is not None else [max_tokens] * batch_size
+
+    qk = qk[..., : int(frames.max())]
+    frame_mask = (torch.arange(qk.shape[-1], device=DEVICE) < frames[:, None])[:, None, None, :]
+    qk = qk.masked_fill(~frame_mask, -torch.inf).softmax(dim=-1)
+    if all(n == max_tokens for n in tokens):
+        std, mean = torch.std_mean(qk, dim=-2, keepdim=True, unbiased=False)
+    else:
+        token_mask = (torch.arange(max_tokens, device=DEVICE) < torch.tensor(tokens, device=DEVICE)[:, None])
+        token_mask = token_mask[:, None, :, None]
+        count = token_mask.sum(dim=-2, keepdim=True)
+        mean = qk.masked_fill(~token_mask, 0).sum(dim=-2, keepdim=True) / count
+        std = ((qk - mean).masked_fill(~token_mask, 0).square().sum(dim=-2, keepdim=True) / count).sqrt()
+    qk = ((qk - mean) / std).masked_fill(~frame_mask, 0)
+    qk = median_filter(qk, frames)
+    matrix = qk.mean(dim=1)
+
+    # One device-to-host copy for the whole batch
+    matrix = matrix.double().cpu().numpy()
+    return [matrix[b, LEN_SOT : tokens[b], : int(frames[b])] for b in range(batch_size)]
+
+
+def word_timings(text_indices: np.ndarray, time_indices: np.ndarray, tokens, tokenizer=None) -> list:
+    """Turns a DTW path into `WordTiming`s, merging punctuation and capping the first word's duration."""
+    tokenizer = tokenizer or whisper_tokenizer()
+    if not isinstance(tokens, list):
+        tokens = tokens.tolist()
+    text_tokens = [t for t in tokens if t < tokenizer.eot]
+
+    words, word_tokens = tokenizer.split_to_word_tokens(text_tokens + [tokenizer.eot])
+    word_boundaries = np.pad(np.cumsum([len(t) for t in word_tokens[:-1]]), (1, 0))
+
+    jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+    jump_times = time_indices[jumps] / TOKENS_PER_SECOND
+    if len(jump_times) == word_boundaries[-1]: # No row for the final EOT: the last word ends where the path does
+        jump_times = np.append(jump_times, time_indices[-1] / TOKENS_PER_SECOND)
+    start_times = jump_times[word_boundaries[:-1]]
+    end_times = jump_times[word_boundaries[1:]]
+    alignment = [
+        WordTiming(word, word_tokens, start, end, 0.0) for word, start, end in zip(words, start_times, end_times)
+    ]
+    merge_punctuations(alignment, PREPEND_PUNCTUATIONS, APPEND_PUNCTUATIONS)
+
+    word_durations = np.array([t.end - t.start for t in alignment])
+    word_durations = word_durations[word_durations.nonzero()]
+    median_duration = np.median(word_durations) if len(word_durations) > 0 else 0.0
+    median_duration = min(0.7, float(median_duration))
+    max_duration = median_duration * 2
+
+    alignment = [t for t in alignment if t.word != ""]  # Remove empty words, strip leading/trailing spaces
+    if len(alignment) > 0:
+        if alignment[0].end - alignment[0].start > max_duration or (len(alignment) > 1 and alignment[1].end - alignment[0].start > max_duration * 2):
+            if len(alignment) > 1 and alignment[1].end - alignment[1].start > max_duration:
+                boundary = max(alignment[1].end / 2, alignment[1].end - max_duration)
+                alignment[0].end = alignment[1].start = boundary
+            alignment[0].start = max(0, alignment[0].end - max_duration)
+    return alignment
+
+
+def _executor():
+    global _dtw_executor
+    if _dtw_executor is None:
+        _dtw_executor = ThreadPoolExecutor(max_workers=DTW_WORKERS, thread_name_prefix="dtw")
+    return _dtw_executor
+
+
+def align_batch(
+    cross_qk,
+    n_frames: list,
+    tokens: list,
+    n_tokens: list = None,
+    dtw_backend: str = "auto",
+    dtw_band: str = "full",
+    dtw_radius: int = None,
+    beam: int = 0,
+) -> list:
+    """
+    Word timings for every item of a batch: `cross_qk` is (batch, heads, tokens, frames) or, as
+    returned by generation, (batch, beams, heads, tokens, frames), of which beam `beam` is aligned.
+    `n_frames`/`n_tokens` as in `alignment_matrices`, `tokens[b]` the generated sequence of item b.
+    Returns a list of `WordTiming` lists.
+    """
+    if cross_qk.ndim == 5:
+        cross_qk = cross_qk[:, beam]
+    matrices = alignment_matrices(cross_qk, n_frames, n_tokens)
+    tokenizer = whisper_tokenizer()
+
+    def align(b):
+        text_indices, time_indices = dtw(-matrices[b], backend=dtw_backend, band=dtw_band, radius=dtw_radius)
+        return word_timings(text_indices, time_indices, tokens[b], tokenizer)
+
+    if len(matrices) == 1:
+        return [align(0)]
+    return list(_executor().map(align, range(len(matrices))))
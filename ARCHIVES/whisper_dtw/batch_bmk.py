@@ -0,0 +1,161 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+Throughput with real batches: 30 s segments of many audio files packed into
+batches (see scheduler.py), transcribed (and, with ORT GenAI, aligned), then
+reassembled per file. Reports segments/s and the real-time factor (processing
+time / audio duration) for each batch size.
+
+    python batch_bmk.py -a "audios/*.flac" ../../batch_fast/audios -b 1 2 4 8
+    python batch_bmk.py -e openai -a "audios/*.flac" -b 1 4 8 -o transcripts
+"""
+
+import argparse
+import os
+import time
+
+import torch
+
+from dtw_kernels import BANDS
+from mel_cache import load_mel
+from pipeline import pipeline
+from scheduler import Transcripts, duration, expand_audio_paths, iter_batches, segment_mel, stack_features
+
+
+def ort_engine(args: argparse.Namespace):
+    """
+    Returns (n_mels, stages, collect) for ORT GenAI with bmk.py's generation and alignment. The stages take
+    (batch index, list of segments); collect(batch, result, transcripts) stores a result.
+    """
+    import onnxruntime_genai as og
+    import bmk
+
+    print("Loading model...")
+    model = og.Model(args.model_path)
+    processor = model.create_multimodal_processor()
+    tokenizer = og.Tokenizer(model)
+    params = bmk.generator_params(model, args.num_beams)
+    cross_qk_mode = {"mode": args.cross_qk, "checked": False}
+
+    def prepare(item):
+        batch_index, batch = item
+        return batch_index, [segment.n_frames for segment in batch], stack_features(batch)
+
+    def align(result):
+        if args.no_align:
+            result["alignments"] = []
+            return result
+        return bmk.align_segment(args, result)
+
+    def collect(batch, result, transcripts):
+        for b, segment in enumerate(batch):
+            text = processor.decode(result["sequences"][b * args.num_beams])
+            words = result["alignments"][b] if result["alignments"] else None
+            transcripts.add(segment, text, words)
+
+    def generate(prepared):
+        return bmk.generate_segment(model, params, tokenizer, args, cross_qk_mode, prepared)
+
+    return 80, [prepare, generate, align], collect
+
+
+def openai_engine(args: argparse.Namespace):
+    """Returns (n_mels, stages, collect) for openai-whisper, as in openai_bmk.py."""
+    import openai_bmk
+
+    model, tokenizer = openai_bmk.get_model_tokenizer(args.model_card)
+
+    def prepare(item):
+        _, batch = item
+        return torch.from_numpy(stack_features(batch)).to(model.device)
+
+    def decode(mel_batch):
+        return openai_bmk.decode_batch(model, tokenizer, mel_batch, args.num_beams)
+
+    def collect(batch, texts, transcripts):
+        for segment, text in zip(batch, texts):
+            transcripts.add(segment, text)
+
+    return model.dims.n_mels, [prepare, decode], collect
+
+
+def run(args: argparse.Namespace):
+    paths = expand_audio_paths(args.audio_paths)
+    if not paths:
+        raise SystemExit("No audio files found")
+    n_mels, stages, collect = (ort_engine if args.engine == "ort" else openai_engine)(args)
+
+    # Audio decoding and mel extraction are done once, outside the timed runs, and cached across runs (mel_cache.py)
+    segments, audio_seconds = [], 0.0
+    for file_index, path in enumerate(paths):
+        mel = load_mel(path, n_mels, use_cache=not args.no_mel_cache)
+        audio_seconds += duration(mel)
+        segments += segment_mel(file_index, mel)
+    print(f"{len(paths)} file(s), {len(segments)} segment(s), {audio_seconds:.1f} s of audio")
+
+    # Warm up on one full batch of the largest size
+    for _ in pipeline([(0, segments[: max(args.batch_sizes)])], stages, queue_size=0):
+        pass
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        transcripts = Transcripts(paths)
+        busy = [0.0] * len(stages)
+        start = time.perf_counter()
+        # Results come back in batch order
+        batches = list(iter_batches(segments, batch_size))
+        for batch, result in zip(batches, pipeline(enumerate(batches), stages, args.pipeline_depth, busy)):
+            collect(batch, result, transcripts)
+        elapsed = time.perf_counter() - start
+        rows.append((batch_size, elapsed, busy))
+        if args.output_dir:
+            transcripts.write(os.path.join(args.output_dir, f"batch_{batch_size}"))
+
+    print()
+    print(f"{'batch':>5}{'seconds':>10}{'segments/s':>12}{'RTF':>8}{'x realtime':>12}  busy per stage (s)")
+    for batch_size, elapsed, busy in rows:
+        print(
+            f"{batch_size:>5}{elapsed:>10.2f}{len(segments) / elapsed:>12.2f}{elapsed / audio_seconds:>8.3f}"
+            f"{audio_seconds / elapsed:>12.1f}  {', '.join(f'{b:.2f}' for b in busy)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-a", "--audio_paths", nargs="+", default=["audios"], help="Audio files, glob patterns or directories"
+    )
+    parser.add_argument("-b", "--batch_sizes", nargs="+", type=int, default=[1, 2, 4, 8], help="Batch sizes to run")
+    parser.add_argument("-e", "--engine", type=str, default="ort", choices=["ort", "openai"], help="Inference engine")
+    parser.add_argument(
+        "-m", "--model_path", type=str, default="whisper_new_export/wtiny-fp16", help="Path to the ORT GenAI model"
+    )
+    parser.add_argument(
+        "--model_card",
+        type=str,
+        default=os.environ.get("WHISPER_MODEL_SIZE", "tiny"),
+        help="openai-whisper model for --engine openai",
+    )
+    parser.add_argument("-n", "--num_beams", type=int, default=4, help="Number of beams")
+    parser.add_argument("-o", "--output_dir", type=str, default=None, help="Write per-file transcripts here")
+    parser.add_argument("--no_align", action="store_true", help="Skip word-level alignment (ORT GenAI)")
+    parser.add_argument(
+        "--cross_qk", type=str, default="recompute", choices=["cached", "check", "recompute"], help="As in bmk.py"
+    )
+    parser.add_argument(
+        "--dtw_backend", type=str, default="auto", choices=["auto", "numba", "wavefront"], help="As in bmk.py"
+    )
+    parser.add_argument("--dtw_band", type=str, default="full", choices=BANDS, help="As in bmk.py")
+    parser.add_argument("--dtw_radius", type=int, default=None, help="As in bmk.py")
+    parser.add_argument(
+        "--pipeline_depth", type=int, default=2, help="Batches queued between stages (0: run them serially)"
+    )
+    parser.add_argument(
+        "--no_mel_cache", action="store_true", help="Decode the audio and compute its mel without mel_cache.py"
+    )
+    # bmk.generate_segment/align_segment options that don't apply here
+    parser.set_defaults(profile=False, save_alignment_inputs=None)
+    args = parser.parse_args()
+
+    run(args)
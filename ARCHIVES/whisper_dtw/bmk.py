@@ -3,15 +3,26 @@
 
 import argparse
 import glob
+import os
 import nvtx
 import readline
+import time
 import torch
 import whisper
 
 import numpy as np
 import onnxruntime_genai as og
 
-from whisper.audio import N_FRAMES, TOKENS_PER_SECOND, log_mel_spectrogram
+from whisper.audio import N_FRAMES, TOKENS_PER_SECOND
+
+from alignment import DEVICE, align_batch
+from dtw_kernels import BANDS, dtw
+from mel_cache import load_mel
+from pipeline import pipeline
+
+ALIGNMENT_HEADS = np.array([[2, 2], [3, 0], [3, 2], [3, 3], [3, 4], [3, 5]]).astype(np.int32)
+# Largest word timestamp difference (one QK frame) for cached cross_qk to count as matching the recomputed one
+CROSS_QK_TOLERANCE = 0.02
 
 # og.set_log_options(enabled=True, model_input_values=True)
 
@@ -27,10 +38,12 @@ class Format:
     underline = "\033[4m"
 
 
-def find_alignment(cross_qk: np.ndarray, actual_n_frames: int, text_tokens: list, processor=None):
-    from whisper.timing import median_filter, dtw
+def find_alignment(
+    cross_qk: np.ndarray, actual_n_frames: int, text_tokens: list, processor=None, dtw_backend: str = "auto"
+):
+    from whisper.timing import median_filter
 
-    qk = torch.tensor(cross_qk).to("cuda")
+    qk = torch.tensor(cross_qk).to(DEVICE)
     qk = qk[:, :, : actual_n_frames // 2]
     print(f"qk: shape={qk.shape}")
     qk = qk.softmax(dim=-1)
@@ -42,7 +55,7 @@ def find_alignment(cross_qk: np.ndarray, actual_n_frames: int, text_tokens: list
     matrix = matrix[len_sot:]
     print(f"matrix: {matrix}")
 
-    text_indices, time_indices = dtw(-matrix)
+    text_indices, time_indices = dtw(-matrix, backend=dtw_backend)
     print("text_indices:", ", ".join(map(str, text_indices)))
     print("time_indices:", ", ".join(map(str, time_indices)))
     print(f"len_text_indices={len(text_indices)}, len_time_indices={len(time_indices)}")
@@ -88,59 +101,10 @@ def find_alignment(cross_qk: np.ndarray, actual_n_frames: int, text_tokens: list
     f.close()
 
 
-def whisper_find_alignment(cross_qk: np.ndarray, actual_n_frames: int, tokens: list):
-    from whisper.timing import median_filter, dtw, WordTiming, merge_punctuations
-    from whisper.tokenizer import get_tokenizer
-
-    qk = torch.tensor(cross_qk).to("cuda")
-    qk = qk[:, :, : actual_n_frames // 2]
-    qk = qk.softmax(dim=-1)
-    std, mean = torch.std_mean(qk, dim=-2, keepdim=True, unbiased=False)
-    qk = (qk - mean) / std
-    qk = median_filter(qk, filter_width=7)
-    matrix = qk.mean(axis=0)
-    len_sot = 3
-    matrix = matrix[len_sot:]
-
-    text_indices, time_indices = dtw(-matrix)
-    whisper_tokenizer = get_tokenizer(True, num_languages=99, language="en", task="transcribe")
-
-    if not isinstance(tokens, list):
-        tokens = tokens.tolist()
-    text_tokens = [t for t in tokens if t < whisper_tokenizer.eot]
-
-    words, word_tokens = whisper_tokenizer.split_to_word_tokens(text_tokens + [whisper_tokenizer.eot])
-    word_boundaries = np.pad(np.cumsum([len(t) for t in word_tokens[:-1]]), (1, 0))
-
-    jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
-    jump_times = time_indices[jumps] / TOKENS_PER_SECOND
-    start_times = jump_times[word_boundaries[:-1]]
-    end_times = jump_times[word_boundaries[1:]]
-    print(len(start_times), len(end_times), len(words))
-    alignment = [
-        WordTiming(word, word_tokens, start, end, 0.0) for word, start, end in zip(words, start_times, end_times)
-    ]
-    prepend_punctuations = "\"'“¿([{-"
-    append_punctuations = "\"'.。,，!！?？:：”)]}、"
-    merge_punctuations(alignment, prepend_punctuations, append_punctuations)
-
-    word_durations = np.array([t.end - t.start for t in alignment])
-    word_durations = word_durations[word_durations.nonzero()]
-    median_duration = np.median(word_durations) if len(word_durations) > 0 else 0.0
-    median_duration = min(0.7, float(median_duration))
-    max_duration = median_duration * 2
-
-    alignment = [t for t in alignment if t.word != ""]  # Remove empty words, strip leading/trailing spaces
-    if len(alignment) > 0:
-        if alignment[0].end - alignment[0].start > max_duration or (len(alignment) > 1 and alignment[1].end - alignment[0].start > max_duration * 2):
-            if len(alignment) > 1 and alignment[1].end - alignment[1].start > max_duration:
-                boundary = max(alignment[1].end / 2, alignment[1].end - max_duration)
-                alignment[0].end = alignment[1].start = boundary
-            alignment[0].start = max(0, alignment[0].end - max_duration)
-
+def write_word_timestamps(alignment: list, path: str = "output_ort.txt"):
     print("Word-level timestamps:")
     header = "start\tend\tword\n-----\t---\t----"
-    f = open("output_ort.txt", "w")
+    f = open(path, "w")
     f.write(header + "\n")
     for word in alignment:
         if word.word == "":
@@ -151,6 +115,223 @@ def whisper_find_alignment(cross_qk: np.ndarray, actual_n_frames: int, tokens: l
     f.close()
 
 
+def whisper_find_alignment(
+    cross_qk: np.ndarray,
+    actual_n_frames: int,
+    tokens: list,
+    dtw_backend: str = "auto",
+    dtw_band: str = "full",
+    dtw_radius: int = None,
+):
+    [alignment] = align_batch(
+        cross_qk[None], [actual_n_frames], [tokens], dtw_backend=dtw_backend, dtw_band=dtw_band, dtw_radius=dtw_radius
+    )
+    write_word_timestamps(alignment)
+
+
+def save_alignment_inputs(directory: str, segment: int, cross_qk: np.ndarray, actual_n_frames: int, tokens):
+    """Saves what the alignment of one segment needs, for `dtw_band_bmk.py --inputs`."""
+    os.makedirs(directory, exist_ok=True)
+    np.savez(
+        os.path.join(directory, f"segment_{segment:04d}.npz"),
+        cross_qk=cross_qk,
+        n_frames=actual_n_frames,
+        offset_frames=segment * N_FRAMES,
+        tokens=np.asarray(tokens),
+    )
+
+
+def generator_params(model, num_beams: int):
+    params = og.GeneratorParams(model)
+    params.set_search_options(
+        do_sample=False,
+        num_beams=num_beams,
+        num_return_sequences=num_beams,
+        min_length=0,
+        max_length=448,
+    )
+    return params
+
+
+def prepare_segment(mel: torch.Tensor, segment: int, batch_size: int):
+    """Slices and pads the 30 s mel segment `segment`; returns (segment, n_frames per batch item, audio_features)."""
+    offset = segment * N_FRAMES
+    mel_segment = mel[:, offset : offset + N_FRAMES]
+    actual_n_frames = mel_segment.shape[-1]
+    mel_segment = whisper.pad_or_trim(mel_segment, N_FRAMES).to(torch.float16)
+    # The generators take host memory, so the features never need to visit the GPU
+    audio_features = np.ascontiguousarray(np.repeat(mel_segment.numpy()[None], batch_size, axis=0))
+    return segment, [actual_n_frames] * batch_size, audio_features
+
+
+def recompute_cross_qk(model, audio_features: np.ndarray, batch_tokens: list) -> np.ndarray:
+    """
+    Runs one decoder step over each item's decoded sequence to get its cross-attention QKs. Items with
+    different sequences (different audio) run one by one, their QKs zero-padded to the longest sequence.
+    """
+    if any(not np.array_equal(tokens, batch_tokens[0]) for tokens in batch_tokens[1:]):
+        cross_qks = [recompute_cross_qk(model, audio_features[b : b + 1], [tokens]) for b, tokens in enumerate(batch_tokens)]
+        max_tokens = max(cross_qk.shape[-2] for cross_qk in cross_qks)
+        padding = lambda cross_qk: [(0, 0)] * (cross_qk.ndim - 2) + [(0, max_tokens - cross_qk.shape[-2]), (0, 0)]
+        return np.concatenate([np.pad(cross_qk, padding(cross_qk)) for cross_qk in cross_qks])
+
+    new_params = og.GeneratorParams(model)
+    new_params.set_search_options(do_sample=False, num_beams=1, num_return_sequences=1, min_length=0, max_length=448)
+    new_params.audio_features = audio_features
+    new_params.input_ids = [batch_tokens[0]] * len(batch_tokens)
+    new_params.alignment_heads = ALIGNMENT_HEADS
+
+    new_generator = og.Generator(model, new_params)
+    # Run only a single step
+    nvtx.push_range("cross_qk", color="red")
+    new_generator.compute_logits()
+    new_generator.generate_next_token()
+    nvtx.pop_range()
+    assert new_generator.is_done()  # Triggers Finalize()
+    return new_generator.get_output("cross_qk")
+
+
+def token_counts(cross_qk: np.ndarray, batch_tokens: list) -> list:
+    # QKs are zero-padded past the end of shorter sequences, and the cached ones may lack the final EOT's row
+    return [int(np.any(cross_qk[b, 0, :, : len(tokens)] != 0, axis=(0, 2)).sum()) for b, tokens in enumerate(batch_tokens)]
+
+
+def cached_rows_mismatch(cross_qk: np.ndarray, batch_tokens: list):
+    """
+    Checks that the cached QKs of beam 0 have one non-zero row per decoded token of every item, except possibly the
+    final EOT (which the generation loop may never feed back to the decoder), and only zeros after them. A buffer
+    missing other rows or holding zero rows inside a sequence would otherwise be normalized and aligned as if it were
+    attention. Returns a description of the first mismatch, or None.
+    """
+    for b, tokens in enumerate(batch_tokens):
+        # (heads, tokens, frames) -> whether each token row holds any QK
+        filled = np.any(cross_qk[b, 0] != 0, axis=(0, 2))
+        n_filled = int(filled.sum())
+        if n_filled not in (len(tokens), len(tokens) - 1) or not filled[:n_filled].all():
+            return f"item {b}: {n_filled} non-zero of {len(filled)} rows for {len(tokens)} tokens"
+    return None
+
+
+def cross_qk_parity(cached: np.ndarray, recomputed: np.ndarray, n_frames: list, batch_tokens: list) -> tuple:
+    """Aligns every batch item with both QKs; returns (same words, max timestamp difference in seconds)."""
+    alignments = [
+        align_batch(cross_qk, n_frames, batch_tokens, n_tokens=token_counts(cross_qk, batch_tokens))
+        for cross_qk in (cached, recomputed)
+    ]
+    if any([t.word for t in a] != [t.word for t in b] for a, b in zip(*alignments)):
+        return False, float("inf")
+    drift = max(
+        (
+            max(abs(a.start - b.start), abs(a.end - b.end))
+            for cached_item, recomputed_item in zip(*alignments)
+            for a, b in zip(cached_item, recomputed_item)
+        ),
+        default=0.0,
+    )
+    return True, drift
+
+
+def generate_segment(model, params, tokenizer, args: argparse.Namespace, cross_qk_mode: dict, prepared: tuple) -> dict:
+    """
+    Runs generation for one prepared segment and picks its cross_qk: the QKs cached during beam search,
+    or (`cross_qk_mode["mode"] == "recompute"`) those of an extra decoder step over the decoded tokens.
+    """
+    segment, n_frames, audio_features = prepared
+    batch_size = audio_features.shape[0]
+    decoder_prompt_tokens = ["<|startoftranscript|>", "<|en|>", "<|transcribe|>", "<|notimestamps|>"]
+
+    params.audio_features = audio_features
+    params.input_ids = [[tokenizer.to_token_id(token) for token in decoder_prompt_tokens]] * batch_size
+    params.alignment_heads = ALIGNMENT_HEADS
+
+    generator = og.Generator(model, params)
+
+    nvtx.push_range("generate", color="blue")
+    inner_step = 0
+    while not generator.is_done():
+        nvtx.push_range(f"single_step_{inner_step}", color="green")
+        nvtx.push_range("compute_logits", color="yellow")
+        generator.compute_logits()
+        nvtx.pop_range()
+        nvtx.push_range("generate_next_token", color="orange")
+        generator.generate_next_token()
+        nvtx.pop_range()
+        nvtx.pop_range()
+        inner_step += 1
+        # print('generator.get_output("logits"):', generator.get_output("logits"))
+    nvtx.pop_range()
+
+    sequences = [generator.get_sequence(i) for i in range(batch_size * args.num_beams)]
+    # Pick the first beam for each batch
+    batch_tokens = sequences[:: args.num_beams]
+    result = {"segment": segment, "n_frames": n_frames, "sequences": sequences, "cross_qk": None}
+    mode = cross_qk_mode["mode"]
+    if args.profile:
+        # Nothing is aligned; only profile the decoder work the selected mode costs
+        if mode == "recompute":
+            recompute_cross_qk(model, audio_features, batch_tokens)
+        return result
+
+    if mode == "recompute":
+        print("Running additional step to get cross_qk")
+        result["cross_qk"] = recompute_cross_qk(model, audio_features, batch_tokens)
+        return result
+
+    # (batch_size, num_beams, n, token_length, num_frames); beam 0 is the selected one
+    cross_qk = generator.get_output("cross_qk")
+    print(f"cross_qk: shape={cross_qk.shape}")
+    mismatch = cached_rows_mismatch(cross_qk, batch_tokens)
+    if mismatch is not None:
+        print(f"WARNING: cached cross_qk rows do not match the decoded tokens (segment {segment}, {mismatch})")
+        if mode == "cached":
+            print("WARNING: recomputing cross_qk for the remaining segments")
+            cross_qk_mode["mode"] = "recompute"
+        result["cross_qk"] = recompute_cross_qk(model, audio_features, batch_tokens)
+        return result
+    if mode == "check" or not cross_qk_mode["checked"]:
+        cross_qk_mode["checked"] = True
+        recomputed = recompute_cross_qk(model, audio_features, batch_tokens)
+        same_words, drift = cross_qk_parity(cross_qk, recomputed, n_frames, batch_tokens)
+        if same_words and round(drift, 3) <= CROSS_QK_TOLERANCE:
+            print(f"cross_qk parity (segment {segment}): OK, max timestamp difference {drift:.2f} s")
+        else:
+            reason = f"max timestamp difference {drift:.2f} s" if same_words else "different words"
+            print(f"WARNING: cached cross_qk differs from recomputed cross_qk (segment {segment}, {reason})")
+            if mode == "cached":
+                print("WARNING: recomputing cross_qk for the remaining segments")
+                cross_qk_mode["mode"] = "recompute"
+            cross_qk = recomputed
+    result["cross_qk"] = cross_qk
+    return result
+
+
+def align_segment(args: argparse.Namespace, result: dict) -> dict:
+    """Word-level timestamps of the first beam of each batch item of a generated segment."""
+    result["alignments"] = []
+    cross_qk = result["cross_qk"]
+    if cross_qk is None:
+        return result
+
+    n_frames = result["n_frames"]
+    # Pick the first beam for each batch
+    batch_tokens = result["sequences"][:: args.num_beams]
+    n_tokens = token_counts(cross_qk, batch_tokens)
+    if args.save_alignment_inputs:
+        save_alignment_inputs(
+            args.save_alignment_inputs, result["segment"], cross_qk[0][0][:, : n_tokens[0]], n_frames[0], batch_tokens[0]
+        )
+    result["alignments"] = align_batch(
+        cross_qk,
+        n_frames,
+        batch_tokens,
+        n_tokens=n_tokens,
+        dtw_backend=args.dtw_backend,
+        dtw_band=args.dtw_band,
+        dtw_radius=args.dtw_radius,
+    )
+    return result
+
+
 def run(args: argparse.Namespace):
     if args.profile and args.steps == 1:
         args.steps = 5
@@ -167,89 +348,36 @@ def run(args: argparse.Namespace):
     audio_path = args.audio_path or "audios/audio_teapot.mp3"
     audio_paths = [audio_path]
 
-    audio = whisper.load_audio(audio_paths[0])
-    mel = log_mel_spectrogram(audio, 80, padding=0)
+    mel = load_mel(audio_paths[0], 80, use_cache=not args.no_mel_cache)
 
     batch_size = args.batch_size
     print("mel:", mel.shape)
-    decoder_prompt_tokens = ["<|startoftranscript|>", "<|en|>", "<|transcribe|>", "<|notimestamps|>"]
 
-    params = og.GeneratorParams(model)
-    params.set_search_options(
-        do_sample=False,
-        num_beams=args.num_beams,
-        num_return_sequences=args.num_beams,
-        min_length=0,
-        max_length=448,
-    )
+    params = generator_params(model, args.num_beams)
+
+    # Cached cross_qk is checked against a recomputed one on the first segment ("cached") or on all of them ("check")
+    cross_qk_mode = {"mode": args.cross_qk, "checked": False}
+
+    # Long audio is processed in segments each with N_FRAMES frames except the last one. Preparing segment k + 1,
+    # generating segment k and aligning segment k - 1 overlap; results are printed in segment order.
+    n_segments = -(-mel.shape[-1] // N_FRAMES)
+    stages = [
+        lambda segment: prepare_segment(mel, segment, batch_size),
+        lambda prepared: generate_segment(model, params, tokenizer, args, cross_qk_mode, prepared),
+        lambda result: align_segment(args, result),
+    ]
 
     # Run ORT GenAI
     for i in range(args.steps):
-        offset = 0
-        # In this loop, long audio is processed in segments each with N_FRAMES frames except the last one.
-        while offset < mel.shape[-1]:
-            mel_segment = mel[:, offset : offset + N_FRAMES]
-            actual_n_frames = mel_segment.shape[-1]
-            offset += N_FRAMES
-            mel_segment = whisper.pad_or_trim(mel_segment, N_FRAMES).to("cuda").to(torch.float16)
-            mel_segment = mel_segment.unsqueeze(0).repeat(batch_size, 1, 1)
-
-            params.audio_features = np.ascontiguousarray(mel_segment.cpu().numpy().astype(np.float16))
-            params.input_ids = [[tokenizer.to_token_id(token) for token in decoder_prompt_tokens]] * batch_size
-            params.alignment_heads = np.array([[2, 2], [3, 0], [3, 2], [3, 3], [3, 4], [3, 5]]).astype(np.int32)
-
-            generator = og.Generator(model, params)
-
-            nvtx.push_range("generate", color="blue")
-            inner_step = 0
-            while not generator.is_done():
-                nvtx.push_range(f"single_step_{inner_step}", color="green")
-                nvtx.push_range("compute_logits", color="yellow")
-                generator.compute_logits()
-                nvtx.pop_range()
-                nvtx.push_range("generate_next_token", color="orange")
-                generator.generate_next_token()
-                nvtx.pop_range()
-                nvtx.pop_range()
-                inner_step += 1
-                # print('generator.get_output("logits"):', generator.get_output("logits"))
-            nvtx.pop_range()
-
-            print("Running additional step to get cross_qk")
-            tokens = generator.get_sequence(0)
-            new_params = og.GeneratorParams(model)
-            new_params.set_search_options(
-                do_sample=False, num_beams=1, num_return_sequences=1, min_length=0, max_length=448
-            )
-            new_params.audio_features = np.ascontiguousarray(mel_segment.cpu().numpy().astype(np.float16))
-            new_params.input_ids = [tokens] * batch_size
-            new_params.alignment_heads = np.array([[2, 2], [3, 0], [3, 2], [3, 3], [3, 4], [3, 5]]).astype(np.int32)
-
-            new_generator = og.Generator(model, new_params)
-            # Run only a single step
-            nvtx.push_range("cross_qk", color="red")
-            new_generator.compute_logits()
-            new_generator.generate_next_token()
-            nvtx.pop_range()
-
-            if not args.profile:
-                if args.use_cached_cross_qk:
-                    cross_qk = generator.get_output("cross_qk")
-                    print(f"cross_qk: shape={cross_qk.shape}")  # (batch_size, num_beams, n, token_length, num_frames)
-                else:
-                    assert new_generator.is_done()  # Triggers Finalize()
-                    cross_qk = new_generator.get_output("cross_qk")
-
-                for b in range(batch_size):
-                    cross_qk_b = cross_qk[b][0]
-                    # Pick the first beam for each batch
-                    tokens = generator.get_sequence(b * args.num_beams)
-                    whisper_find_alignment(cross_qk_b, actual_n_frames, tokens)
+        busy = [0.0] * len(stages)
+        start = time.perf_counter()
+        for result in pipeline(range(n_segments), stages, queue_size=args.pipeline_depth, busy=busy):
+            for alignment in result["alignments"]:
+                write_word_timestamps(alignment)
 
             print()
-            for i in range(batch_size * args.num_beams):
+            for i, tokens in enumerate(result["sequences"]):
                 print("Batch:", i // args.num_beams, "Beam:", i % args.num_beams)
-                tokens = generator.get_sequence(i)
                 print("Tokens:", tokens)
                 transcription = processor.decode(tokens)
 
@@ -259,6 +387,10 @@ def run(args: argparse.Namespace):
                     transcription,
                 )
 
+        print(
+            f"{n_segments} segment(s) in {time.perf_counter() - start:.2f} s; busy: "
+            f"prepare {busy[0]:.2f} s, generate {busy[1]:.2f} s, align {busy[2]:.2f} s"
+        )
         for _ in range(3):
             print()
 
@@ -278,7 +410,48 @@ if __name__ == "__main__":
     parser.add_argument("-a", "--audio_path", type=str, default=None, help="Path to the audio file")
     parser.add_argument("-s", "--steps", type=int, default=1, help="Number of steps to run")
     parser.add_argument(
-        "-u", "--use_cached_cross_qk", action="store_true", help="Use cached cross_qk instead of recomputing"
+        "--cross_qk",
+        type=str,
+        default="recompute",
+        choices=["cached", "check", "recompute"],
+        help="cached: use the cross_qk collected during generation, checked against a recomputed one on the first "
+        "segment (falls back to recomputing on mismatch); check: check every segment; recompute: always run an "
+        "extra decoder step over the decoded tokens",
+    )
+    parser.add_argument(
+        "--dtw_backend",
+        type=str,
+        default="auto",
+        choices=["auto", "numba", "wavefront"],
+        help="DTW kernel for word alignment (auto: numba if installed, else the NumPy wavefront kernel)",
+    )
+    parser.add_argument(
+        "--dtw_band",
+        type=str,
+        default="full",
+        choices=BANDS,
+        help="Constrain the DTW path to a band around the diagonal (sakoe-chiba) or a coarse first-pass path (coarse)",
+    )
+    parser.add_argument(
+        "--dtw_radius",
+        type=int,
+        default=None,
+        help="Half-width of the DTW band, in frames (20 ms); default: 200 for sakoe-chiba, 10 for coarse",
+    )
+    parser.add_argument(
+        "--save_alignment_inputs",
+        type=str,
+        default=None,
+        help="Directory to save each segment's cross_qk and tokens to, for dtw_band_bmk.py",
+    )
+    parser.add_argument(
+        "--pipeline_depth",
+        type=int,
+        default=2,
+        help="Segments queued between the prepare, generate and align stages (0: run them serially)",
+    )
+    parser.add_argument(
+        "--no_mel_cache", action="store_true", help="Decode the audio and compute its mel without mel_cache.py"
     )
     args = parser.parse_args()
 
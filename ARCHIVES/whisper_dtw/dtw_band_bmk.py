@@ -0,0 +1,182 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+Speed and memory of banded DTW vs. timestamp drift.
+
+Runs every band configuration over alignment matrices and reports the DTW
+time, its peak memory (tracemalloc) and how far token/word timestamps move
+compared to the full DTW and, with --reference, to `output_ref.txt` from
+`ref.py` (what diff_outputs.sh diffs against).
+
+Matrices come either from real runs:
+
+    python bmk.py -n 1 -b 1 -a audios/1.flac --save_alignment_inputs alignment_inputs
+    python ref.py -a audios/1.flac
+    python dtw_band_bmk.py --inputs alignment_inputs --reference output_ref.txt
+
+or, without a model (no torch/whisper needed), from synthetic attention
+ridges of the given sizes:
+
+    python dtw_band_bmk.py --synthetic 100x1500 220x1500
+"""
+
+import argparse
+import difflib
+import glob
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from dtw_kernels import dtw, dtw_numba
+
+# Cross-QK frames per second (whisper.audio.TOKENS_PER_SECOND) and mel frames per second
+QK_FRAMES_PER_SECOND = 50
+MEL_FRAMES_PER_SECOND = 100
+
+CONFIGS = [("full", 0)] + [("sakoe-chiba", r) for r in (25, 50, 100, 200, 400)] + [("coarse", r) for r in (5, 10, 25, 50)]
+
+
+def synthetic_matrix(n_tokens: int, n_frames: int, rng: np.random.Generator) -> np.ndarray:
+    """An alignment-like matrix: a noisy ridge along uneven token durations with pauses."""
+    durations = rng.gamma(2.0, 1.0, n_tokens) * (rng.random(n_tokens) < 0.9) + rng.gamma(0.3, 8.0, n_tokens)
+    starts = np.concatenate(([0], np.cumsum(durations)[:-1]))
+    scale = n_frames * rng.uniform(0.6, 1.0) / durations.sum()
+    lead = rng.uniform(0, n_frames - durations.sum() * scale)
+    centers = lead + (starts + durations / 2) * scale
+    widths = np.maximum(durations * scale / 2, 1.0)
+    frames = np.arange(n_frames)
+    ridge = np.exp(-(((frames[None, :] - centers[:, None]) / widths[:, None]) ** 2))
+    return ridge + 0.3 * rng.standard_normal((n_tokens, n_frames))
+
+
+def token_times(path: np.ndarray) -> np.ndarray:
+    """Start time (seconds) of every token along a DTW path, as in `alignment.word_timings`."""
+    text_indices, time_indices = path
+    jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+    return time_indices[jumps] / QK_FRAMES_PER_SECOND
+
+
+def measure(x: np.ndarray, backend: str, band: str, radius: int, repeats: int):
+    """Returns (path, best time in ms, peak traced memory in bytes)."""
+    path = dtw(x, backend=backend, band=band, radius=radius) # Warm up (numba compiles on first use)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        dtw(x, backend=backend, band=band, radius=radius)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    dtw(x, backend=backend, band=band, radius=radius)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return path, best * 1000, peak
+
+
+def read_word_timestamps(path: str) -> list:
+    """(start, end, word) rows of an output_ref.txt/output_ort.txt file."""
+    rows = []
+    with open(path) as f:
+        for line in f.read().splitlines()[2:]:
+            parts = line.split("\t")
+            if len(parts) == 3:
+                rows.append((float(parts[0]), float(parts[1]), parts[2]))
+    return rows
+
+
+def word_drift(words: list, reference: list):
+    """(matched words, mean and max |start/end difference|) against reference rows."""
+    matcher = difflib.SequenceMatcher(a=[w for _, _, w in words], b=[w for _, _, w in reference], autojunk=False)
+    diffs = []
+    for block in matcher.get_matching_blocks():
+        for k in range(block.size):
+            (start, end, _), (ref_start, ref_end, _) = words[block.a + k], reference[block.b + k]
+            diffs += [abs(start - ref_start), abs(end - ref_end)]
+    if not diffs:
+        return 0, float("nan"), float("nan")
+    return len(diffs) // 2, float(np.mean(diffs)), float(np.max(diffs))
+
+
+def load_inputs(directory: str) -> list:
+    """(name, matrix, tokens, offset seconds) for every segment saved by `bmk.py --save_alignment_inputs`."""
+    from alignment import alignment_matrices
+
+    segments = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.npz"))):
+        saved = np.load(path)
+        [matrix] = alignment_matrices(saved["cross_qk"][None], [int(saved["n_frames"])])
+        offset = int(saved["offset_frames"]) / MEL_FRAMES_PER_SECOND
+        segments.append((os.path.basename(path), matrix, saved["tokens"].tolist(), offset))
+    return segments
+
+
+def main(args: argparse.Namespace):
+    if args.inputs:
+        segments = load_inputs(args.inputs)
+    else:
+        rng = np.random.default_rng(args.seed)
+        segments = []
+        for size in args.synthetic:
+            n_tokens, n_frames = map(int, size.lower().split("x"))
+            segments.append((size, synthetic_matrix(n_tokens, n_frames, rng), None, 0.0))
+    if not segments:
+        raise SystemExit("No alignment matrices to run")
+    reference = read_word_timestamps(args.reference) if args.reference else None
+    backend = args.backend if args.backend != "auto" else ("numba" if dtw_numba is not None else "wavefront")
+
+    print(f"backend={backend}, segments={len(segments)}")
+    header = f"{'band':<12}{'radius':>7}{'ms':>10}{'peak KiB':>11}{'token drift mean/max s':>25}{'tokens moved':>14}"
+    if reference is not None:
+        from alignment import word_timings
+
+        header += f"{'words':>8}{'vs ref mean/max s':>20}"
+    print(header)
+
+    full_times = {}
+    for band, radius in CONFIGS:
+        total_ms, peak, drifts, moved, n_tokens, words = 0.0, 0, [], 0, 0, []
+        for name, matrix, tokens, offset in segments:
+            path, ms, segment_peak = measure(-matrix, backend, band, radius, args.repeats)
+            total_ms += ms
+            peak = max(peak, segment_peak)
+            times = token_times(path)
+            if band == "full":
+                full_times[name] = times
+            drift = np.abs(times - full_times[name])
+            drifts.append(drift)
+            moved += int((drift > 0).sum())
+            n_tokens += len(times)
+            if reference is not None:
+                words += [
+                    (offset + w.start, offset + w.end, w.word.strip())
+                    for w in word_timings(*path, tokens)
+                    if w.word != ""
+                ]
+
+        drift = np.concatenate(drifts)
+        line = (
+            f"{band:<12}{radius if band != 'full' else '-':>7}{total_ms:>10.2f}{peak / 1024:>11.1f}"
+            f"{f'{drift.mean():.3f}/{drift.max():.2f}':>25}{f'{moved}/{n_tokens}':>14}"
+        )
+        if reference is not None:
+            matched, mean, worst = word_drift(words, reference)
+            line += f"{matched:>8}{f'{mean:.3f}/{worst:.2f}':>20}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--inputs", type=str, default=None, help="Directory written by bmk.py --save_alignment_inputs")
+    parser.add_argument("-r", "--reference", type=str, default=None, help="Reference word timestamps (output_ref.txt)")
+    parser.add_argument(
+        "--synthetic", nargs="+", default=["60x1500", "120x1500", "220x1500"], help="TOKENSxFRAMES synthetic matrices"
+    )
+    parser.add_argument("--backend", type=str, default="auto", choices=["auto", "numba", "wavefront"], help="DTW kernel")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per configuration (best is reported)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic matrices")
+    args = parser.parse_args()
+    if args.reference and not args.inputs:
+        parser.error("--reference needs --inputs")
+
+    main(args)
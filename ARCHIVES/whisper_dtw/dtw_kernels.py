@@ -0,0 +1,331 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+CPU DTW kernels for word-level alignment, replacing `whisper.timing.dtw`.
+
+Both kernels reproduce `whisper.timing.dtw_cpu` exactly: float32 cumulative
+cost, the same tie-breaking (diagonal, then up, then left) and the same
+backtrace, so `text_indices`/`time_indices` are identical.
+
+- `dtw_numba`: the classic double loop, jitted with numba (optional dependency).
+- `dtw_wavefront`: pure NumPy. Cells on the same anti-diagonal (i + j = d) only
+  depend on the two previous anti-diagonals, so each anti-diagonal is computed
+  with a handful of vectorized operations: N + M Python iterations instead of N * M.
+
+`dtw()` picks numba when it is installed and the wavefront kernel otherwise,
+and accepts NumPy arrays or (CPU or CUDA) torch tensors.
+
+With `band="sakoe-chiba"` or `band="coarse"`, the path is constrained to a
+window of columns per row (see `band_windows`): cells outside it cost
+infinity and are never computed, and the traceback keeps only the window,
+2 bits per cell. Memory and (with numba) time scale with the band area
+instead of tokens x frames, at the cost of timestamps drifting when the
+true path leaves the band; `dtw_band_bmk.py` measures both.
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Directions stored in the trace matrix, as in whisper.timing
+DIAGONAL, UP, LEFT = 0, 1, 2
+
+BANDS = ("full", "sakoe-chiba", "coarse")
+# Default band half-width in frames (20 ms each). The straight sakoe-chiba band must absorb pauses and speaking rate
+# changes, so it needs a much wider band than one around the coarse path: dtw_band_bmk.py measured timestamp drift of
+# seconds below 200 frames for sakoe-chiba and none from 10 frames for coarse.
+DEFAULT_RADII = {"sakoe-chiba": 200, "coarse": 10}
+# Frames averaged together for the first pass of the "coarse" band
+COARSE_FACTOR = 10
+
+
+def backtrace(trace: np.ndarray) -> np.ndarray:
+    """Follows `trace` from the bottom-right corner; returns a (2, path_length) array of (text, time) indices."""
+    i = trace.shape[0] - 1
+    j = trace.shape[1] - 1
+    trace[0, :] = LEFT
+    trace[:, 0] = UP
+
+    result = []
+    while i > 0 or j > 0:
+        result.append((i - 1, j - 1))
+        t = trace[i, j]
+        if t == DIAGONAL:
+            i -= 1
+            j -= 1
+        elif t == UP:
+            i -= 1
+        elif t == LEFT:
+            j -= 1
+        else:
+            raise ValueError("Unexpected trace[i, j]")
+
+    return np.array(result)[::-1, :].T
+
+
+def _wavefront_trace(x: np.ndarray) -> np.ndarray:
+    N, M = x.shape
+    trace = np.full((N + 1, M + 1), -1, dtype=np.int8)
+
+    # Anti-diagonals of the (N + 1) x (M + 1) cost matrix, indexed by row i
+    prev2 = np.full(N + 1, np.inf, dtype=np.float32) # d - 2
+    prev1 = np.full(N + 1, np.inf, dtype=np.float32) # d - 1
+    prev2[0] = 0.0 # cost[0, 0]
+
+    for d in range(2, N + M + 1):
+        lo, hi = max(1, d - M), min(N, d - 1)
+        current = np.full(N + 1, np.inf, dtype=np.float32)
+        rows = np.arange(lo, hi + 1)
+        cols = d - rows
+
+        c0 = prev2[lo - 1 : hi] # cost[i - 1, j - 1]
+        c1 = prev1[lo - 1 : hi] # cost[i - 1, j]
+        c2 = prev1[lo : hi + 1] # cost[i, j - 1]
+
+        take0 = (c0 < c1) & (c0 < c2)
+        take1 = ~take0 & (c1 < c0) & (c1 < c2)
+        c = np.where(take0, c0, np.where(take1, c1, c2))
+        t = np.where(take0, DIAGONAL, np.where(take1, UP, LEFT))
+
+        # float64 addition rounded to float32, as in whisper's kernel
+        current[lo : hi + 1] = x[rows - 1, cols - 1] + c
+        trace[rows, cols] = t
+        prev2, prev1 = prev1, current
+
+    return trace
+
+
+def dtw_wavefront(x: np.ndarray) -> np.ndarray:
+    return backtrace(_wavefront_trace(np.asarray(x, dtype=np.float64)))
+
+
+if numba is not None:
+
+    @numba.jit(nopython=True, cache=True, nogil=True)
+    def _numba_trace(x):
+        N, M = x.shape
+        cost = np.full((N + 1, M + 1), np.inf, dtype=np.float32)
+        trace = np.full((N + 1, M + 1), -1, dtype=np.int8)
+
+        cost[0, 0] = 0
+        for j in range(1, M + 1):
+            for i in range(1, N + 1):
+                c0 = cost[i - 1, j - 1]
+                c1 = cost[i - 1, j]
+                c2 = cost[i, j - 1]
+
+                if c0 < c1 and c0 < c2:
+                    c, t = c0, 0
+                elif c1 < c0 and c1 < c2:
+                    c, t = c1, 1
+                else:
+                    c, t = c2, 2
+
+                cost[i, j] = x[i - 1, j - 1] + c
+                trace[i, j] = t
+        return trace
+
+    def dtw_numba(x: np.ndarray) -> np.ndarray:
+        return backtrace(_numba_trace(np.ascontiguousarray(x, dtype=np.float64)))
+
+    @numba.jit(nopython=True, cache=True, nogil=True)
+    def _numba_banded_trace(x, lo, hi, packed):
+        N, M = x.shape
+        # Two cost rows; cells outside the band stay at infinity
+        prev = np.full(M + 1, np.inf, dtype=np.float32)
+        cur = np.full(M + 1, np.inf, dtype=np.float32)
+        prev[0] = 0
+
+        for i in range(1, N + 1):
+            # `cur` still holds row i - 2
+            if i == 2:
+                cur[0] = np.inf
+            elif i > 2:
+                cur[lo[i - 2] : hi[i - 2] + 1] = np.inf
+            for j in range(lo[i], hi[i] + 1):
+                c0 = prev[j - 1]
+                c1 = prev[j]
+                c2 = cur[j - 1]
+
+                if c0 < c1 and c0 < c2:
+                    c, t = c0, 0
+                elif c1 < c0 and c1 < c2:
+                    c, t = c1, 1
+                elif c0 == c1 and c0 < np.inf and c2 == np.inf:
+                    c, t = c0, 0 # tie on the left edge of the band: stay inside it
+                else:
+                    c, t = c2, 2
+
+                cur[j] = x[i - 1, j - 1] + c
+                k = j - lo[i]
+                packed[i, k >> 2] |= t << ((k & 3) * 2)
+            prev, cur = cur, prev
+
+    def dtw_numba_banded(x: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        packed = _packed_trace(lo, hi)
+        _numba_banded_trace(np.ascontiguousarray(x, dtype=np.float64), lo, hi, packed)
+        return banded_backtrace(packed, lo, x.shape[1])
+
+else:
+    dtw_numba = None
+    dtw_numba_banded = None
+
+
+def band_windows(
+    x: np.ndarray, band: str, radius: int = None, coarse_factor: int = COARSE_FACTOR, backend: str = "auto"
+):
+    """
+    Column windows of a banded DTW over `x` (tokens x frames): row i (1-based)
+    may only use columns lo[i]..hi[i] (1-based, inclusive). Returns (lo, hi),
+    int64 arrays of length N + 1 (entry 0 is unused).
+
+    - "sakoe-chiba": `radius` frames around the straight line from (1, 1) to (N, M).
+    - "coarse": `radius` frames around the path of a full DTW over `x` with
+      every `coarse_factor` frames averaged together (run with `backend`).
+
+    `radius` defaults to `DEFAULT_RADII[band]`.
+    """
+    if band not in DEFAULT_RADII:
+        raise ValueError(f"Unknown DTW band: {band}")
+    if radius is None:
+        radius = DEFAULT_RADII[band]
+    N, M = x.shape
+    rows = np.arange(1, N + 1)
+    if band == "sakoe-chiba":
+        lo = (rows - 1) * M // N + 1 - radius
+        hi = -(-rows * M // N) + radius
+    elif band == "coarse":
+        starts = np.arange(0, M, coarse_factor)
+        counts = np.diff(np.append(starts, M))
+        coarse = np.add.reduceat(x, starts, axis=1)
+        coarse /= counts
+        text_indices, time_indices = dtw(coarse, backend=backend, band="full")
+        cmin = np.full(N, len(starts), dtype=np.int64)
+        cmax = np.zeros(N, dtype=np.int64)
+        np.minimum.at(cmin, text_indices, time_indices)
+        np.maximum.at(cmax, text_indices, time_indices)
+        lo = cmin * coarse_factor + 1 - radius
+        hi = np.minimum((cmax + 1) * coarse_factor, M) + radius
+
+    lo = np.clip(lo, 1, M)
+    hi = np.clip(hi, 1, M)
+    lo[0], hi[-1] = 1, M # The path runs from (1, 1) to (N, M)
+    # Windows must move right monotonically and overlap (or touch) from one row to the next
+    hi = np.maximum.accumulate(hi)
+    lo = np.minimum.accumulate(lo[::-1])[::-1]
+    lo[1:] = np.minimum(lo[1:], hi[:-1] + 1)
+    return np.concatenate(([0], lo)), np.concatenate(([0], hi))
+
+
+def _packed_trace(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    # 4 directions per byte, row i holding columns lo[i]..hi[i]
+    width = int((hi - lo)[1:].max()) + 1
+    return np.zeros((len(lo), (width + 3) // 4), dtype=np.uint8)
+
+
+def banded_backtrace(packed: np.ndarray, lo: np.ndarray, M: int) -> np.ndarray:
+    """`backtrace` over a packed banded trace."""
+    i = packed.shape[0] - 1
+    j = M
+
+    result = []
+    while i > 0 or j > 0:
+        result.append((i - 1, j - 1))
+        if i == 0:
+            t = LEFT
+        elif j == 0:
+            t = UP
+        else:
+            k = j - lo[i]
+            t = (packed[i, k >> 2] >> ((k & 3) * 2)) & 3
+        if t == DIAGONAL:
+            i -= 1
+            j -= 1
+        elif t == UP:
+            i -= 1
+        else:
+            j -= 1
+
+    return np.array(result)[::-1, :].T
+
+
+def dtw_wavefront_banded(x: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    N, M = x.shape
+    packed = _packed_trace(lo, hi)
+    # Row i lies on anti-diagonal d iff i + lo[i] <= d <= i + hi[i]; both bounds increase with i
+    first_diagonal = np.arange(N + 1) + lo
+    last_diagonal = np.arange(N + 1) + hi
+
+    diagonals = np.arange(2, N + M + 1)
+    row_starts = np.searchsorted(last_diagonal[1:], diagonals) + 1
+    row_ends = np.searchsorted(first_diagonal[1:], diagonals, side="right")
+
+    prev2 = np.full(N + 1, np.inf, dtype=np.float32)
+    prev1 = np.full(N + 1, np.inf, dtype=np.float32)
+    prev2[0] = 0.0
+
+    for d, a, b in zip(diagonals.tolist(), row_starts.tolist(), row_ends.tolist()):
+        current = np.full(N + 1, np.inf, dtype=np.float32)
+        if a <= b:
+            rows = np.arange(a, b + 1)
+            cols = d - rows
+
+            c0 = prev2[a - 1 : b]
+            c1 = prev1[a - 1 : b]
+            c2 = prev1[a : b + 1]
+
+            take0 = (c0 < c1) & (c0 < c2)
+            take1 = ~take0 & (c1 < c0) & (c1 < c2)
+            # Tie on the left edge of the band: stay inside it
+            take0 |= (c0 == c1) & np.isfinite(c0) & np.isinf(c2)
+            c = np.where(take0, c0, np.where(take1, c1, c2))
+            t = np.where(take0, DIAGONAL, np.where(take1, UP, LEFT)).astype(np.uint8)
+
+            current[a : b + 1] = x[rows - 1, cols - 1] + c
+            # One cell per row on a diagonal, so no two cells share a byte
+            k = cols - lo[rows]
+            packed[rows, k >> 2] |= t << ((k & 3) * 2).astype(np.uint8)
+        prev2, prev1 = prev1, current
+
+    return banded_backtrace(packed, lo, M)
+
+
+def to_numpy(x) -> np.ndarray:
+    """Converts a torch tensor (on any device) or array-like to a float64 NumPy array."""
+    if hasattr(x, "detach"):
+        x = x.detach().double().cpu().numpy()
+    return np.asarray(x, dtype=np.float64)
+
+
+def dtw(
+    x,
+    backend: str = "auto",
+    band: str = "full",
+    radius: int = None,
+    coarse_factor: int = COARSE_FACTOR,
+) -> np.ndarray:
+    """
+    DTW over a cost matrix `x` of shape (tokens, frames), as in `whisper.timing.dtw`.
+    `backend` is "auto", "numba" or "wavefront"; `band` is one of `BANDS`, see
+    `band_windows` for `radius` and `coarse_factor`. Returns a (2, path_length)
+    array: `text_indices, time_indices = dtw(-matrix)`.
+    """
+    if backend == "auto":
+        backend = "numba" if dtw_numba is not None else "wavefront"
+    if backend not in ("numba", "wavefront"):
+        raise ValueError(f"Unknown DTW backend: {backend}")
+    if backend == "numba" and dtw_numba is None:
+        raise RuntimeError("numba is not installed; use backend='wavefront'")
+
+    x = to_numpy(x)
+    if band == "full":
+        return dtw_numba(x) if backend == "numba" else dtw_wavefront(x)
+    lo, hi = band_windows(x, band, radius, coarse_factor, backend)
+    if backend == "numba":
+        return dtw_numba_banded(x, lo, hi)
+    return dtw_wavefront_banded(x, lo, hi)
@@ -0,0 +1,122 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+Persistent cache of log-mel spectrograms.
+
+Decoding audio (`whisper.load_audio` spawns ffmpeg) and computing its log-mel
+spectrogram is repeated by every benchmark run. `load_mel` stores the result
+as a float16 .npy file keyed by a hash of the audio file's contents, n_mels
+and padding, and memory-maps it on later loads. The models are fed float16
+features, so the cached values are exactly what they see.
+
+Once the cache holds more than `max_bytes`, the least recently used entries
+are deleted; delete the directory to clear it.
+"""
+
+import contextlib
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import torch
+import whisper
+
+from whisper.audio import log_mel_spectrogram
+
+CACHE_DIR = os.environ.get(
+    "WHISPER_MEL_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mel_cache")
+)
+MAX_CACHE_BYTES = int(os.environ.get("WHISPER_MEL_CACHE_BYTES", 4 << 30))
+# Bump when the cached arrays change so old entries are ignored
+CACHE_FORMAT = 1
+
+_HASH_CHUNK_BYTES = 1 << 20
+_digests = {} # (real path, mtime_ns, size) -> content hash, so a file is hashed once per process
+
+
+def file_digest(path: str) -> str:
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+                sha256.update(chunk)
+        digest = _digests[key] = sha256.hexdigest()
+    return digest
+
+
+def cache_path(path: str, n_mels: int, padding: int, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f"{file_digest(path)}.{n_mels}.{padding}.v{CACHE_FORMAT}.npy")
+
+
+def _prune(cache_dir: str, max_bytes: int):
+    entries, total = [], 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".npy"):
+            with contextlib.suppress(OSError):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    entries.sort()
+    for _, size, old_path in entries:
+        if total <= max_bytes:
+            break
+        with contextlib.suppress(OSError):
+            os.unlink(old_path)
+            total -= size
+
+
+def _write_cache(entry_path: str, mel: np.ndarray, max_bytes: int):
+    """Best effort: a read-only directory just means no cache."""
+    cache_dir = os.path.dirname(entry_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".npy.part", dir=cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, mel)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        _prune(cache_dir, max_bytes)
+    except OSError:
+        pass
+
+
+def load_mel(
+    path: str,
+    n_mels: int = 80,
+    padding: int = 0,
+    use_cache: bool = True,
+    cache_dir: str = CACHE_DIR,
+    max_bytes: int = MAX_CACHE_BYTES,
+) -> torch.Tensor:
+    """
+    The (n_mels, frames) float16 log-mel spectrogram of an audio file:
+    `log_mel_spectrogram(whisper.load_audio(path), n_mels, padding=padding)` in float16.
+    Cached entries are memory-mapped copy-on-write, so callers may modify the tensor.
+    """
+    if not use_cache:
+        return log_mel_spectrogram(whisper.load_audio(path), n_mels, padding=padding).to(torch.float16)
+
+    entry_path = cache_path(path, n_mels, padding, cache_dir)
+    try:
+        mel = np.load(entry_path, mmap_mode="c")
+        if mel.dtype == np.float16 and mel.ndim == 2 and mel.shape[0] == n_mels:
+            with contextlib.suppress(OSError):
+                os.utime(entry_path) # Mark as recently used
+            return torch.from_numpy(mel)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError):
+        pass # Corrupt or unreadable entry: compute it again and overwrite it
+
+    mel = log_mel_spectrogram(whisper.load_audio(path), n_mels, padding=padding).to(torch.float16)
+    _write_cache(entry_path, mel.numpy(), max_bytes)
+    return mel
@@ -1,10 +1,14 @@
 import argparse
 import nvtx
 import os
+import time
 import torch
 import whisper
 from whisper.tokenizer import get_tokenizer
-from whisper.audio import N_FRAMES, log_mel_spectrogram
+from whisper.audio import N_FRAMES
+
+from mel_cache import load_mel
+from pipeline import pipeline
 
 
 def get_model_tokenizer(model_card):
@@ -18,30 +22,98 @@ def get_model_tokenizer(model_card):
     return model, tokenizer
 
 
-def transcribe_bmk(audio_path, batch_size=3, num_beams=4):
-    model, tokenizer = get_model_tokenizer(os.environ.get("WHISPER_MODEL_SIZE", "tiny"))
-    audio = whisper.load_audio(audio_path)
-    offset = 0
-    mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=0)
-    while offset < mel.shape[-1]:
-        mel_segment = mel[:, offset : offset + N_FRAMES]
-        mel_segment = whisper.pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(torch.float16)
+def prepare_segment(mel, offset, batch_size, device, copy_stream=None):
+    """
+    The 30 s segment at `offset`, repeated `batch_size` times on `device`. With a CUDA `copy_stream`, the segment is
+    copied from pinned memory on that stream, so the copy overlaps with decoding on the default stream; it has
+    completed when this returns.
+    """
+    mel_segment = whisper.pad_or_trim(mel[:, offset : offset + N_FRAMES], N_FRAMES)
+    if copy_stream is None:
+        mel_segment = mel_segment.to(device).to(torch.float16)
+        return mel_segment.unsqueeze(0).repeat(batch_size, 1, 1)
+    with torch.cuda.stream(copy_stream):
+        mel_segment = mel_segment.pin_memory().to(device, non_blocking=True).to(torch.float16)
         mel_segment = mel_segment.unsqueeze(0).repeat(batch_size, 1, 1)
-        options = whisper.DecodingOptions(beam_size=num_beams, temperature=0.0)
-        with nvtx.annotate("decode", color="blue"):
-            result = whisper.decode(model, mel_segment, options)
+    copy_stream.synchronize()
+    # Decoded on the default stream: don't let the allocator hand its memory to the next copy while still in use
+    mel_segment.record_stream(torch.cuda.default_stream(device))
+    return mel_segment
+
+
+def decode_segment(model, tokenizer, mel_segment, batch_size=3, num_beams=4):
+    options = whisper.DecodingOptions(beam_size=num_beams, temperature=0.0)
+    with nvtx.annotate("decode", color="blue"):
+        result = whisper.decode(model, mel_segment, options)
+
+    tokens = result[0].tokens if batch_size > 1 else result.tokens
+    tokens = [item for item in tokens if item < tokenizer.eot]
+    tokens = torch.tensor(tokens).repeat(batch_size, 1).to(model.device)
+
+    # Calculate model forward for all output tokens, to use in word-timestamping
+    with nvtx.annotate("ts model run", color="green"):
+        _ = model(mel_segment, tokens)
+    return result[0].text
+
+
+def decode_batch(model, tokenizer, mel_batch, num_beams=4):
+    """Decodes a batch of segments from different audio; returns one text per item."""
+    options = whisper.DecodingOptions(beam_size=num_beams, temperature=0.0)
+    with nvtx.annotate("decode", color="blue"):
+        results = whisper.decode(model, mel_batch, options)
+
+    # Calculate model forward for each item's own output tokens (padded with eot), to use in word-timestamping
+    batch_tokens = [[item for item in result.tokens if item < tokenizer.eot] for result in results]
+    width = max(1, max(len(tokens) for tokens in batch_tokens))
+    tokens = torch.tensor([tokens + [tokenizer.eot] * (width - len(tokens)) for tokens in batch_tokens]).to(model.device)
+    with nvtx.annotate("ts model run", color="green"):
+        _ = model(mel_batch, tokens)
+    return [result.text for result in results]
+
 
-        print(result[0].text)
+class Transcriber:
+    """
+    Loads the model and tokenizer once, so that repeated `transcribe` calls time decoding only.
 
-        tokens = result[0].tokens if batch_size > 1 else result.tokens
-        tokens = [item for item in tokens if item < tokenizer.eot]
-        tokens = torch.tensor(tokens).repeat(batch_size, 1).to(model.device)
+    With `compile`, the audio encoder (fixed-size 30 s input) is compiled with `torch.compile`; the decoder
+    is left eager, as its key/value cache grows by concatenation in forward hooks at every step.
+    """
 
-        # Calculate model forward for all output tokens, to use in word-timestamping
-        with nvtx.annotate("ts model run", color="green"):
-            _ = model(mel_segment, tokens)
+    def __init__(self, model_card, batch_size=3, num_beams=4, pipeline_depth=2, mel_cache=True, compile=False):
+        self.model, self.tokenizer = get_model_tokenizer(model_card)
+        if compile:
+            self.model.encoder.compile()
+        self.batch_size = batch_size
+        self.num_beams = num_beams
+        self.pipeline_depth = pipeline_depth
+        self.mel_cache = mel_cache
+        self.copy_stream = torch.cuda.Stream(self.model.device) if self.model.device.type == "cuda" else None
 
-        offset += N_FRAMES
+    def transcribe(self, audio_path):
+        """Returns the text of every 30 s segment of the audio."""
+        model, batch_size = self.model, self.batch_size
+        mel = load_mel(audio_path, model.dims.n_mels, use_cache=self.mel_cache)
+        # Segment k + 1 is sliced, padded and copied to the device (on its own CUDA stream) while segment k is decoded
+        stages = [
+            lambda offset: prepare_segment(mel, offset, batch_size, model.device, self.copy_stream),
+            lambda mel_segment: decode_segment(model, self.tokenizer, mel_segment, batch_size, self.num_beams),
+        ]
+        return list(pipeline(range(0, mel.shape[-1], N_FRAMES), stages, queue_size=self.pipeline_depth))
+
+    def warmup(self, audio_path, iterations=1):
+        """Runs and discards `iterations` transcriptions (CUDA context, allocator, autotuning, compilation)."""
+        for _ in range(iterations):
+            self.transcribe(audio_path)
+        if self.model.device.type == "cuda":
+            torch.cuda.synchronize()
+
+
+def transcribe_bmk(audio_path, batch_size=3, num_beams=4, pipeline_depth=2, mel_cache=True):
+    transcriber = Transcriber(
+        os.environ.get("WHISPER_MODEL_SIZE", "tiny"), batch_size, num_beams, pipeline_depth, mel_cache
+    )
+    for text in transcriber.transcribe(audio_path):
+        print(text)
 
 
 if __name__ == "__main__":
@@ -53,10 +125,37 @@ if __name__ == "__main__":
     parser.add_argument("-n", "--num_beams", type=int, default=4, help="Number of beams")
     parser.add_argument("-p", "--profile", action="store_true", help="Enable profiling")
     parser.add_argument("-a", "--audio_path", type=str, default=None, help="Path to the audio file")
+    parser.add_argument(
+        "--pipeline_depth", type=int, default=2, help="Segments queued between stages (0: run them serially)"
+    )
+    parser.add_argument(
+        "--no_mel_cache", action="store_true", help="Decode the audio and compute its mel without mel_cache.py"
+    )
+    parser.add_argument("-w", "--warmup", type=int, default=1, help="Discarded iterations before the timed ones")
+    parser.add_argument("--compile", action="store_true", help="Compile the audio encoder with torch.compile")
     args = parser.parse_args()
 
     audio_path = args.audio_path or audio_path
 
+    # The model is loaded and warmed up once, outside the timed iterations
+    transcriber = Transcriber(
+        os.environ.get("WHISPER_MODEL_SIZE", "tiny"),
+        args.batch_size,
+        args.num_beams,
+        args.pipeline_depth,
+        not args.no_mel_cache,
+        args.compile,
+    )
+    with nvtx.annotate("warmup", color="yellow"):
+        transcriber.warmup(audio_path, args.warmup)
+
     for i in range(5 if args.profile else 1):
         with nvtx.annotate(f"transcribe_{i}", color="red"):
-            transcribe_bmk(audio_path, args.batch_size, args.num_beams)
+            start = time.perf_counter()
+            texts = transcriber.transcribe(audio_path)
+            if transcriber.model.device.type == "cuda":
+                torch.cuda.synchronize()
+            elapsed = time.perf_counter() - start
+        for text in texts:
+            print(text)
+        print(f"transcribe_{i}: {elapsed:.3f} s")
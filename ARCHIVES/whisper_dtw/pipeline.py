@@ -0,0 +1,102 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+Bounded-queue pipeline for the long-audio segment loop.
+
+Every stage runs on its own thread and hands its results to the next stage
+through a queue of at most `queue_size` items. With the stages
+prepare -> generate -> align, segment k + 1 is prepared and segment k - 1
+aligned while segment k is being generated, so host-side work hides behind
+model time, and the bounded queues keep fast stages from running far ahead.
+"""
+
+import queue
+import threading
+import time
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def pipeline(items, stages: list, queue_size: int = 2, busy: list = None):
+    """
+    Yields `stages[-1](...stages[0](item))` for every item, in order.
+
+    An exception in a stage stops the pipeline and is raised here. With
+    `queue_size` 0 the stages run one after the other on the calling thread.
+    If given, `busy[i]` accumulates the seconds stage i spent working.
+    """
+    if busy is None:
+        busy = [0.0] * len(stages)
+
+    def run_stage(index, item):
+        start = time.perf_counter()
+        try:
+            return stages[index](item)
+        finally:
+            busy[index] += time.perf_counter() - start
+
+    if queue_size <= 0:
+        for item in items:
+            for index in range(len(stages)):
+                item = run_stage(index, item)
+            yield item
+        return
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def work(index):
+        source = iter(items) if index == 0 else None
+        try:
+            while True:
+                item = next(source, _DONE) if source is not None else get(queues[index - 1])
+                if item is _DONE or isinstance(item, _Failure):
+                    put(queues[index], item)
+                    return
+                if not put(queues[index], run_stage(index, item)):
+                    return
+        except BaseException as e:
+            put(queues[index], _Failure(e))
+
+    threads = [
+        threading.Thread(target=work, args=(index,), name=f"pipeline-{index}", daemon=True)
+        for index in range(len(stages))
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
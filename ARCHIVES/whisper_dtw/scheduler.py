@@ -0,0 +1,110 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License
+
+"""
+Cross-audio batching for the benchmarks.
+
+Instead of repeating one segment `batch_size` times, every input file is cut
+into 30 s mel segments and segments from different files are packed into
+real batches. Each segment keeps its file, position and actual frame count
+(needed to align it), and `Transcripts` puts the per-segment results back
+together per file, whatever order they finish in.
+"""
+
+import collections
+import glob
+import os
+
+import numpy as np
+import torch
+import whisper
+
+from whisper.audio import HOP_LENGTH, N_FRAMES, SAMPLE_RATE
+
+MEL_FRAMES_PER_SECOND = SAMPLE_RATE // HOP_LENGTH
+AUDIO_EXTENSIONS = (".flac", ".mp3", ".wav", ".wma", ".m4a", ".ogg")
+
+# `features` is the padded (n_mels, N_FRAMES) float16 mel of the segment, `n_frames` its length before padding
+Segment = collections.namedtuple("Segment", ["file_index", "index", "offset_frames", "n_frames", "features"])
+
+
+def expand_audio_paths(patterns: list) -> list:
+    """Audio files matching glob patterns; directories expand to the audio files they contain."""
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.isdir(path):
+                paths += sorted(
+                    os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(AUDIO_EXTENSIONS)
+                )
+            else:
+                paths.append(path)
+    return list(dict.fromkeys(paths))
+
+
+def duration(mel: torch.Tensor) -> float:
+    """Seconds of audio in a mel spectrogram."""
+    return mel.shape[-1] / MEL_FRAMES_PER_SECOND
+
+
+def segment_mel(file_index: int, mel: torch.Tensor):
+    """Yields the 30 s segments of one file's mel, the last one padded."""
+    for index, offset in enumerate(range(0, mel.shape[-1], N_FRAMES)):
+        mel_segment = mel[:, offset : offset + N_FRAMES]
+        features = whisper.pad_or_trim(mel_segment, N_FRAMES).to(torch.float16).numpy()
+        yield Segment(file_index, index, offset, mel_segment.shape[-1], features)
+
+
+def iter_batches(segments, batch_size: int):
+    """Packs segments, from whichever files they come, into lists of `batch_size` (the last may be shorter)."""
+    batch = []
+    for segment in segments:
+        batch.append(segment)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stack_features(batch: list) -> np.ndarray:
+    """(batch, n_mels, N_FRAMES) float16 features of a batch of segments."""
+    return np.ascontiguousarray(np.stack([segment.features for segment in batch]))
+
+
+class Transcripts:
+    """Per-file text and word timings, reassembled from segment results in segment order."""
+
+    def __init__(self, paths: list):
+        self.paths = paths
+        self._segments = [{} for _ in paths] # file index -> {segment index: (text, words)}
+
+    def add(self, segment: Segment, text: str, words: list = None):
+        """`words` are `WordTiming`s relative to the segment; they are stored relative to the file."""
+        offset = segment.offset_frames / MEL_FRAMES_PER_SECOND
+        shifted = [(offset + word.start, offset + word.end, word.word.strip()) for word in words or [] if word.word != ""]
+        self._segments[segment.file_index][segment.index] = (text, shifted)
+
+    def text(self, file_index: int) -> str:
+        segments = self._segments[file_index]
+        return " ".join(segments[index][0].strip() for index in sorted(segments))
+
+    def words(self, file_index: int) -> list:
+        """(start, end, word) rows for the whole file."""
+        segments = self._segments[file_index]
+        return [word for index in sorted(segments) for word in segments[index][1]]
+
+    def write(self, directory: str):
+        """
+        Writes `<index>_<file name>.txt` and `<index>_<file name>.words.txt` (same format as output_ref.txt) for every
+        file; the index in the input list keeps files with the same name from different directories apart.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for file_index, path in enumerate(self.paths):
+            name = os.path.join(directory, f"{file_index:03d}_{os.path.basename(path)}")
+            with open(name + ".txt", "w") as f:
+                f.write(self.text(file_index) + "\n")
+            with open(name + ".words.txt", "w") as f:
+                f.write("start\tend\tword\n-----\t---\t----\n")
+                for start, end, word in self.words(file_index):
+                    f.write(f"{start:.2f}\t{end:.2f}\t{word}\n")
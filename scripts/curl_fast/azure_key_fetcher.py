@@ -1,10 +1,14 @@
 import subprocess
 import json
+import shutil
 import sys
 import keyring
 from keyring.errors import KeyringError, PasswordDeleteError
 import argparse
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config_store import ConfigStore
 
 # This is the unique name for the service in your OS credential store.
 SERVICE_NAME = "curl_gui_app"
@@ -12,58 +16,221 @@ SERVICE_NAME = "curl_gui_app"
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "curl_gui_config.json")
 DEFAULT_RESOURCE_GROUP = "speech1b-test-prod"
 DEFAULT_SUBSCRIPTION_ID = "03ec5728-957f-4af3-9499-5456bc37a20c"
+# Every `az` invocation pays 1-3 s of Python startup, so lookups run in parallel.
+DEFAULT_WORKERS = 8
+# Set AZ_CLI to run a different executable (e.g. a fake `az` script in tests).
+AZ_COMMAND = os.environ.get("AZ_CLI", "az")
+
+
+def run_az(args):
+    """
+    Default command runner: runs `az <args>` without a shell and returns its stdout.
+    Raises FileNotFoundError if the CLI is missing and CalledProcessError if it fails.
+    """
+    # shutil.which resolves az.cmd on Windows, which a shell-less Popen would not find.
+    executable = shutil.which(AZ_COMMAND) or AZ_COMMAND
+    process = subprocess.run([executable, *args], capture_output=True, text=True, check=True)
+    return process.stdout
+
+
+def _subscription_args(subscription):
+    return ["--subscription", subscription] if subscription else []
+
+def _target_label(target):
+    resource_group, subscription = target
+    return f"{subscription}/{resource_group}" if subscription else resource_group
+
+def default_subscription(resource_group):
+    """The subscription to use for a resource group given without one."""
+    return DEFAULT_SUBSCRIPTION_ID if resource_group == DEFAULT_RESOURCE_GROUP else None
 
-def update_keys_and_config(resource_group, subscription=None):
+def load_manifest(path):
+    """
+    Reads a sweep manifest: a JSON list whose entries are either a resource
+    group name or {"resource_group": ..., "subscription": ...}.
+    Returns a list of (resource_group, subscription) targets.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"'{path}' must contain a JSON list of resource groups.")
+    targets = []
+    for entry in entries:
+        if isinstance(entry, str):
+            targets.append((entry, default_subscription(entry)))
+        elif isinstance(entry, dict) and entry.get("resource_group"):
+            resource_group = entry["resource_group"]
+            targets.append((resource_group, entry.get("subscription") or default_subscription(resource_group)))
+        else:
+            raise ValueError(f"Invalid manifest entry in '{path}': {entry!r}")
+    return targets
+
+def update_keys_and_config(resource_group, subscription=None, runner=run_az, workers=DEFAULT_WORKERS):
     """
     Fetches all speech service accounts from a resource group, updates the
     local config file with their regions, and stores their keys securely.
     Optionally scopes Azure CLI queries to a specific subscription.
+
+    Returns the list of (name, error) pairs that could not be fetched.
     """
-    print(f"Processing resource group: '{resource_group}'...")
-    if subscription:
-        print(f"  - Using subscription: '{subscription}'")
-    subscription_clause = f" --subscription {subscription}" if subscription else ""
-    try:
-        # 1. Get all speech accounts from Azure
-        print("  - Querying Azure for speech service accounts...")
-        accounts = _get_speech_accounts(resource_group, subscription_clause)
-        if not accounts:
-            print("  - Status: No Speech service accounts found in this resource group.")
-            return
+    return sync_keys_and_config([(resource_group, subscription)], runner, workers)
 
-        print(f"  - Found {len(accounts)} account(s).")
+def sync_keys_and_config(targets, runner=run_az, workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Syncs the regions and keys of several (resource_group, subscription) targets.
 
-        # 2. Update the local JSON config file with the regions
-        found_regions = sorted(list(set(acc['Location'] for acc in accounts)))
-        _update_config_file(resource_group, found_regions)
-        print(f"  - Successfully updated '{CONFIG_FILE}' with {len(found_regions)} region(s).")
+    All account listings and key lookups share one pool of `workers` Azure CLI
+    calls, so a sweep over many resource groups costs about as much as the
+    slowest one. The results are then applied in one step: `rg_region_map` is
+    rewritten once (and only if it changed), and only keyring entries whose
+    key differs from the stored one are written. Targets or accounts that
+    fail are left untouched.
 
-        # 3. Fetch and store the key for each account in the keyring
-        print("  - Storing API keys in secure keyring...")
-        for account in accounts:
-            account_name = account['Name']
-            location = account['Location']
-
-            keys_cmd = (
-                f"az cognitiveservices account keys list -n {account_name} -g {resource_group}"
-                f"{subscription_clause} --query \"{{key1:key1}}\" -o json"
-            )
-            keys_process = subprocess.run(keys_cmd, capture_output=True, text=True, shell=True, check=True)
-            keys = json.loads(keys_process.stdout)
-            key1 = keys.get('key1')
+    `runner` takes a list of `az` arguments and returns the command's stdout.
+    Returns the list of (name, error) pairs that could not be fetched.
+    """
+    targets = list(dict.fromkeys(targets))
+    print(f"Processing {len(targets)} resource group(s) with up to {workers} concurrent Azure CLI call(s)...")
+    try:
+        accounts_by_target, keys, failures = _discover(targets, runner, workers)
+    except FileNotFoundError as e:
+        _handle_azure_cli_error(e, ", ".join(_target_label(target) for target in targets))
 
+    # Later accounts (and targets) win when several share a region, as if synced one by one
+    desired_keys = {}
+    for target, accounts in accounts_by_target.items():
+        for account in accounts:
+            key1 = keys.get((target, account['Name']))
             if not key1:
-                print(f"    - Warning: Could not retrieve key for '{account_name}'. Skipping.")
                 continue
+            location = account['Location']
+            if location in desired_keys and desired_keys[location] != key1:
+                print(f"  - Warning: Several accounts serve region '{location}'; using '{account['Name']}' "
+                      f"from '{_target_label(target)}'.", file=sys.stderr)
+            desired_keys[location] = key1
 
-            keyring.set_password(SERVICE_NAME, location, key1)
-            print(f"    - Stored key for region: '{location}'")
+    # rg_region_map is keyed by resource group name only, so same-named groups in several subscriptions are merged
+    region_map, subscription_map = {}, {}
+    for target, accounts in accounts_by_target.items():
+        if not accounts:
+            print(f"  - Status: No Speech service accounts found in '{_target_label(target)}'.")
+            continue
+        resource_group, subscription = target
+        regions = set(account['Location'] for account in accounts)
+        if resource_group in region_map:
+            print(f"  - Warning: Resource group '{resource_group}' exists in several subscriptions; "
+                  f"merging their regions in '{CONFIG_FILE}'.", file=sys.stderr)
+            regions.update(region_map[resource_group])
+        region_map[resource_group] = sorted(regions)
+        subscription_map.setdefault(resource_group, []).append(subscription)
 
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        _handle_azure_cli_error(e, resource_group)
-    except Exception as e:
-        print(f"\nAn unexpected error occurred: {e}", file=sys.stderr)
+    try:
+        changed_groups = _update_config_file(region_map, subscription_map, dry_run)
+    except OSError as e:
+        print(f"\nError: Could not write '{CONFIG_FILE}'. Details: {e}", file=sys.stderr)
         sys.exit(1)
+    if changed_groups:
+        verb = "Would update" if dry_run else "Updated"
+        print(f"  - {verb} '{CONFIG_FILE}' for: {', '.join(changed_groups)}")
+    elif region_map:
+        print(f"  - '{CONFIG_FILE}' is up to date.")
+
+    updated, unchanged, keyring_failures = _sync_keyring(desired_keys, dry_run)
+    failures += keyring_failures
+    verb = "would be updated" if dry_run else "updated"
+    print(f"  - Keys: {len(updated)} {verb}, {unchanged} unchanged, {len(failures)} failed.")
+
+    _report_failures(failures)
+    return failures
+
+def _discover(targets, runner, workers):
+    """
+    Lists the accounts of every target and fetches each account's key as soon
+    as its target is listed, printing progress as commands complete.
+
+    Returns ({target: [account]}, {(target, account name): key1}, [(name, error)]).
+    Failed targets are missing from the first dict. A missing `az` executable
+    (FileNotFoundError) is raised since no command can succeed.
+    """
+    accounts_by_target, keys, failures = {}, {}, []
+
+    def fetch_key(target, account_name):
+        resource_group, subscription = target
+        output = runner([
+            "cognitiveservices", "account", "keys", "list",
+            "-n", account_name, "-g", resource_group, *_subscription_args(subscription),
+            "--query", "{key1:key1}", "-o", "json"
+        ])
+        return json.loads(output).get('key1')
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="az") as pool:
+        pending = {
+            pool.submit(_get_speech_accounts, target[0], target[1], runner): (target, None)
+            for target in targets
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                target, account = pending.pop(future)
+                name = f"'{account['Name']}' ({account['Location']})" if account else "account list"
+                prefix = f"  - [{_target_label(target)}] {name}:"
+                try:
+                    result = future.result()
+                except FileNotFoundError:
+                    for other in pending:
+                        other.cancel()
+                    raise
+                except subprocess.CalledProcessError as e:
+                    failures.append((account['Name'] if account else _target_label(target), _describe_cli_error(e)))
+                    print(f"{prefix} failed")
+                    continue
+                except (ValueError, AttributeError, KeyError, TypeError) as e:
+                    failures.append((account['Name'] if account else _target_label(target),
+                                     f"Unexpected Azure CLI output: {e}"))
+                    print(f"{prefix} failed")
+                    continue
+
+                if account is None:
+                    accounts_by_target[target] = result
+                    print(f"{prefix} found {len(result)} account(s)")
+                    for listed in result:
+                        pending[pool.submit(fetch_key, target, listed['Name'])] = (target, listed)
+                elif result:
+                    keys[(target, account['Name'])] = result
+                    print(f"{prefix} key fetched")
+                else:
+                    failures.append((account['Name'], "No key1 returned"))
+                    print(f"{prefix} no key returned")
+
+    # Keep the order targets were given in, not completion order
+    accounts_by_target = {target: accounts_by_target[target] for target in targets if target in accounts_by_target}
+    return accounts_by_target, keys, failures
+
+def _sync_keyring(desired_keys, dry_run=False):
+    """
+    Writes only the keys that differ from the keyring. A region whose key
+    cannot be stored is reported and the others are still written.
+    Returns (updated regions, unchanged count, [(region, error)]).
+    """
+    updated, unchanged, failures = [], 0, []
+    for region, key1 in desired_keys.items():
+        try:
+            current = keyring.get_password(SERVICE_NAME, region)
+        except KeyringError:
+            current = None
+        if current == key1:
+            unchanged += 1
+            continue
+        if not dry_run:
+            try:
+                keyring.set_password(SERVICE_NAME, region, key1)
+            except KeyringError as e:
+                failures.append((region, f"Could not store key: {e}"))
+                print(f"    - Failed to store key for region: '{region}'")
+                continue
+        updated.append(region)
+        print(f"    - {'Would store' if dry_run else 'Stored'} key for region: '{region}'")
+    return updated, unchanged, failures
 
 def delete_keys(region_names):
     """
@@ -86,33 +253,60 @@ def delete_keys(region_names):
         except KeyringError as e:
             print(f"  - Error: Failed to delete key for region '{region}'. Details: {e}", file=sys.stderr)
 
-def _update_config_file(resource_group, regions):
-    """Helper to read, update, and write the JSON config file."""
-    config = {}
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            try:
-                config = json.load(f)
-            except json.JSONDecodeError:
-                print(f"  - Warning: Could not parse existing '{CONFIG_FILE}'. A new one will be created.")
-
-    if 'rg_region_map' not in config:
-        config['rg_region_map'] = {}
+def _update_config_file(region_map, subscription_map, dry_run=False):
+    """
+    Merges {resource_group: regions} into `rg_region_map` and the
+    subscriptions each group was found in ({resource_group: [subscription]},
+    None for the CLI's default) into `rg_subscriptions`, which --all-known
+    syncs them with, in one locked, atomic update. Returns the resource
+    groups whose regions or subscriptions changed; the file is not written
+    if there are none.
+    """
+    store = ConfigStore(CONFIG_FILE)
+    try:
+        existing = store.load()
+    except (json.JSONDecodeError, OSError):
+        print(f"  - Warning: Could not parse existing '{CONFIG_FILE}'. A new one will be created.")
+        existing = {}
+    existing_regions = existing.get('rg_region_map', {})
+    existing_subscriptions = existing.get('rg_subscriptions', {})
+    changed = [
+        rg for rg, regions in region_map.items()
+        if existing_regions.get(rg) != regions
+        or not set(subscription_map[rg]) <= set(existing_subscriptions.get(rg, []))
+    ]
 
-    config['rg_region_map'][resource_group] = regions
+    def merge(config):
+        config.setdefault('rg_region_map', {}).update(region_map)
+        subscriptions = config.setdefault('rg_subscriptions', {})
+        for rg, found_in in subscription_map.items():
+            subscriptions[rg] = list(dict.fromkeys(subscriptions.get(rg, []) + found_in))
 
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    if changed and not dry_run:
+        store.update(mutate=merge)
+    return changed
 
-def _get_speech_accounts(resource_group, subscription_clause=""):
+def _get_speech_accounts(resource_group, subscription=None, runner=run_az):
     """Helper function to query Azure for speech accounts."""
-    list_cmd = (
-        f"az cognitiveservices account list --resource-group {resource_group}"
-        f"{subscription_clause} "
-        f"--query \"[?kind=='SpeechServices'].{{Name:name, Location:location}}\" -o json"
-    )
-    process = subprocess.run(list_cmd, capture_output=True, text=True, shell=True, check=True)
-    return json.loads(process.stdout)
+    output = runner([
+        "cognitiveservices", "account", "list", "--resource-group", resource_group,
+        *_subscription_args(subscription),
+        "--query", "[?kind=='SpeechServices'].{Name:name, Location:location}", "-o", "json"
+    ])
+    return json.loads(output)
+
+def _describe_cli_error(e):
+    """Returns the last line az printed to stderr, falling back to the exception text."""
+    stderr = (e.stderr or "").strip()
+    return stderr.splitlines()[-1] if stderr else str(e)
+
+def _report_failures(failures):
+    if not failures:
+        return
+    print(f"\n  - Warning: {len(failures)} Azure CLI lookup(s) or key writes failed and were left unchanged:",
+          file=sys.stderr)
+    for name, error in failures:
+        print(f"    - '{name}': {error}", file=sys.stderr)
 
 def _handle_azure_cli_error(e, resource_group):
     """Helper function to print a standard error for Azure CLI failures."""
@@ -130,14 +324,45 @@ def main():
     parser.add_argument(
         "-g",
         "--resource-group",
-        default=DEFAULT_RESOURCE_GROUP,
-        help="The Azure resource group to process when fetching and storing keys. Defaults to %(default)s."
+        action="append",
+        help="An Azure resource group to process when fetching and storing keys. "
+             f"Repeat to sync several at once. Defaults to {DEFAULT_RESOURCE_GROUP}."
+    )
+    parser.add_argument(
+        "-s",
+        "--subscription",
+        help="Subscription for the resource groups given with -g. Defaults to "
+             f"{DEFAULT_SUBSCRIPTION_ID} for {DEFAULT_RESOURCE_GROUP} and the CLI's active subscription otherwise."
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        help="JSON file listing resource groups to sync, as names or "
+             "{\"resource_group\": ..., \"subscription\": ...} objects."
+    )
+    parser.add_argument(
+        "--all-known",
+        action="store_true",
+        help="Also sync every resource group already in the config file's rg_region_map."
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Show which regions and keys would change without writing anything."
     )
     parser.add_argument(
         "-d",
         "--delete",
         help="Comma-separated list of regions whose stored keys should be deleted from the keyring."
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Maximum number of concurrent Azure CLI calls. Defaults to %(default)s."
+    )
     args = parser.parse_args()
 
     if not keyring.get_keyring():
@@ -151,9 +376,33 @@ def main():
         delete_keys(regions_to_delete)
         print("\nDeletion finished.")
     else:
-        resource_group = args.resource_group or DEFAULT_RESOURCE_GROUP
-        subscription_id = DEFAULT_SUBSCRIPTION_ID if resource_group == DEFAULT_RESOURCE_GROUP else None
-        update_keys_and_config(resource_group, subscription_id)
+        targets = [
+            (resource_group, args.subscription or default_subscription(resource_group))
+            for resource_group in (args.resource_group or [])
+        ]
+        if args.manifest:
+            try:
+                targets.extend(load_manifest(args.manifest))
+            except (OSError, ValueError) as e:
+                print(f"Error: Could not read manifest. Details: {e}", file=sys.stderr)
+                sys.exit(1)
+        if args.all_known:
+            try:
+                config = ConfigStore(CONFIG_FILE).load()
+            except (json.JSONDecodeError, OSError):
+                config = {}
+            known_subscriptions = config.get('rg_subscriptions', {})
+            for rg in config.get('rg_region_map', {}):
+                # Groups synced before subscriptions were recorded used the default for their name
+                for subscription in known_subscriptions.get(rg) or [default_subscription(rg)]:
+                    targets.append((rg, subscription))
+        if not targets:
+            targets = [(DEFAULT_RESOURCE_GROUP, DEFAULT_SUBSCRIPTION_ID)]
+
+        failures = sync_keys_and_config(targets, workers=args.workers, dry_run=args.dry_run)
+        if failures:
+            print("\nProcess finished with errors.")
+            sys.exit(1)
         print("\nProcess finished.")
 
 if __name__ == "__main__":
@@ -0,0 +1,258 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+try:
+    import keyring
+except ImportError:
+    keyring = None
+try:
+    import requests
+except ImportError:
+    requests = None
+
+import speech_api
+from http_sessions import SessionManager
+from multipart_upload import MultipartUpload
+
+# Must match CurlApp.SERVICE_NAME so keys saved from the GUI or by
+# azure_key_fetcher.py are picked up here.
+SERVICE_NAME = "curl_gui_app"
+DEFAULT_AUDIO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "batch_fast", "audios"))
+DEFAULT_OUTPUT_FILE = "batch_results.jsonl"
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".wma", ".flac", ".ogg", ".opus", ".m4a", ".aac", ".webm")
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def discover_audio_files(input_paths, extensions=AUDIO_EXTENSIONS, repeat=1):
+    """
+    Expands files and directories (non-recursive) into a sorted list of audio
+    files. `repeat` duplicates the list, which is useful for load testing with
+    a small corpus.
+    """
+    audio_files = []
+    for path in input_paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path) and name.lower().endswith(extensions):
+                    audio_files.append(full_path)
+        elif os.path.isfile(path):
+            audio_files.append(path)
+        else:
+            print(f"Warning: '{path}' does not exist. Skipping.", file=sys.stderr)
+    return audio_files * max(1, repeat)
+
+
+def resolve_keys(regions, key=None):
+    """Returns {region: key}, using `key` for every region if given, else the keyring."""
+    keys = {}
+    for region in regions:
+        if key:
+            keys[region] = key
+            continue
+        if keyring is None:
+            raise RuntimeError("The 'keyring' library is not installed; pass --key instead.")
+        stored_key = keyring.get_password(SERVICE_NAME, region)
+        if not stored_key:
+            raise RuntimeError(f"No key stored for region '{region}'. Run azure_key_fetcher.py or pass --key.")
+        keys[region] = stored_key
+    return keys
+
+
+class BatchRunner:
+    """
+    Fans transcribe requests out over a bounded thread pool.
+
+    Each region has its own semaphore so a slow or throttled region cannot
+    starve the others, and 429/5xx responses and connection errors are retried
+    with exponential backoff (honouring Retry-After when the service sends it).
+    """
+
+    def __init__(self, keys, api_version, definition, base_url=None, workers=8,
+                 per_region=4, retries=3, backoff=1.0, timeout=600, sessions=None):
+        self.keys = keys
+        self.api_version = api_version
+        self.definition = definition
+        self.base_url = base_url
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.region_limits = {region: threading.BoundedSemaphore(per_region) for region in keys}
+        self.request_data = {'definition': json.dumps(definition)}
+        self.sessions = sessions or SessionManager(pool_size=per_region)
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    pass
+        # Full jitter keeps retrying workers from synchronizing.
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def transcribe(self, audio_path, region):
+        """Sends one file, retrying as configured. Returns a JSON-serializable result record."""
+        url = speech_api.transcribe_url(region, self.api_version, self.base_url)
+        headers = speech_api.auth_headers(self.keys[region])
+        result = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "audio_file": audio_path,
+            "region": region,
+            "endpoint": url,
+            "attempts": 0,
+        }
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            result["attempts"] = attempt + 1
+            response = None
+            try:
+                with self.region_limits[region]:
+                    with MultipartUpload(self.request_data, 'audio', audio_path) as upload:
+                        response = self.sessions.request(
+                            "POST", url, data=upload, timeout=self.timeout,
+                            headers=dict(headers, **{'Content-Type': upload.content_type})
+                        )
+            except requests.exceptions.RequestException as e:
+                result.update(status_code=None, error=str(e))
+            except OSError as e:
+                result.update(status_code=None, error=f"Could not open the audio file: {e}")
+                break
+            else:
+                result.pop("error", None)
+                result["status_code"] = response.status_code
+                result["apim_request_id"] = speech_api.apim_request_id(response.headers)
+                result["timings"] = response.timings.as_dict()
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            if attempt < self.retries:
+                time.sleep(self._retry_delay(attempt, response))
+
+        result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        if response is not None:
+            try:
+                result["response"] = response.json()
+            except ValueError:
+                result["response"] = response.text
+        return result
+
+    def run(self, audio_files, output_file):
+        """
+        Distributes files round-robin over the regions and appends one JSON line
+        per file to `output_file` as requests complete. Returns (succeeded, failed).
+        """
+        regions = itertools.cycle(sorted(self.keys))
+        succeeded = failed = 0
+        start = time.perf_counter()
+        with open(output_file, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.transcribe, path, next(regions)) for path in audio_files]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                ok = result.get("status_code") is not None and 200 <= result["status_code"] < 300
+                if ok:
+                    succeeded += 1
+                else:
+                    failed += 1
+                print(f"[{done}/{len(futures)}] {result['region']}: {os.path.basename(result['audio_file'])} -> "
+                      f"{result.get('status_code') or result.get('error')} ({result['elapsed_seconds']}s, "
+                      f"{result['attempts']} attempt(s))")
+
+        elapsed = time.perf_counter() - start
+        rate = len(audio_files) / elapsed * 60 if elapsed > 0 else 0.0
+        print(f"\nFinished {len(audio_files)} request(s) in {elapsed:.1f}s ({rate:.1f} req/min): "
+              f"{succeeded} succeeded, {failed} failed. Results appended to '{output_file}'.")
+        return succeeded, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send every audio file in one or more directories to the fast transcription API concurrently."
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[DEFAULT_AUDIO_DIR],
+        help="Audio files or directories to transcribe (default: batch_fast/audios)."
+    )
+    parser.add_argument("-r", "--regions", required=True, help="Comma-separated list of regions to spread requests across.")
+    parser.add_argument("-v", "--api-version", default="2024-11-15", help="API version. Defaults to %(default)s.")
+    parser.add_argument("-l", "--locales", default="", help="Comma-separated list of locales (e.g., en-US,ja-JP).")
+    parser.add_argument("--max-speakers", type=int, default=None, help="Enable diarization with this many speakers.")
+    parser.add_argument("--channels", default="", help="Comma-separated list of channels (e.g., 0,1).")
+    parser.add_argument("--enhanced-task", choices=["transcribe", "translate"], default=None, help="Enable enhanced mode with this task.")
+    parser.add_argument("--enhanced-prompt", default="", help="Prompt for enhanced mode.")
+    parser.add_argument("-k", "--key", default=None, help="Subscription key for all regions (default: read from keyring).")
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help="Override the endpoint, e.g. http://127.0.0.1:8000 for a local stub. May contain '{region}'."
+    )
+    parser.add_argument("-w", "--workers", type=int, default=8, help="Total concurrent requests. Defaults to %(default)s.")
+    parser.add_argument("--per-region", type=int, default=4, help="Concurrent requests per region. Defaults to %(default)s.")
+    parser.add_argument("--retries", type=int, default=3, help="Retries on 429/5xx or connection errors. Defaults to %(default)s.")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base backoff in seconds. Defaults to %(default)s.")
+    parser.add_argument("--pool-size", type=int, default=None, help="Keep-alive connections per region (default: --per-region).")
+    parser.add_argument("--http2", action="store_true", help="Negotiate HTTP/2 (requires urllib3>=2.3 and h2).")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-request timeout in seconds. Defaults to %(default)s.")
+    parser.add_argument("--repeat", type=int, default=1, help="Send the input set this many times. Defaults to %(default)s.")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT_FILE, help="JSONL results file (appended). Defaults to %(default)s.")
+    args = parser.parse_args()
+
+    if requests is None:
+        print("Error: The 'requests' library is not installed. Please run 'pip install requests'.", file=sys.stderr)
+        sys.exit(1)
+
+    regions = [region.strip() for region in args.regions.split(",") if region.strip()]
+    if not regions:
+        print("Error: No valid regions provided.", file=sys.stderr)
+        sys.exit(1)
+
+    audio_files = discover_audio_files(args.inputs, repeat=args.repeat)
+    if not audio_files:
+        print("Error: No audio files found.", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        keys = resolve_keys(regions, args.key)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    channels = [int(c) for c in args.channels.split(",") if c.strip()]
+    definition = speech_api.build_definition(
+        speech_api.parse_locales(args.locales),
+        max_speakers=args.max_speakers,
+        channels=channels,
+        enhanced_task=args.enhanced_task,
+        enhanced_prompt=args.enhanced_prompt,
+    )
+
+    runner = BatchRunner(
+        keys,
+        args.api_version,
+        definition,
+        base_url=args.base_url,
+        workers=args.workers,
+        per_region=args.per_region,
+        retries=args.retries,
+        backoff=args.backoff,
+        timeout=args.timeout,
+        sessions=SessionManager(pool_size=args.pool_size or args.per_region, http2=args.http2),
+    )
+    _, failed = runner.run(audio_files, args.output)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Shared access to curl_gui_config.json.
+
+The GUI (possibly several instances) and azure_key_fetcher.py all do
+read-modify-write of the same file. ConfigStore serializes those updates
+with an exclusive lock on a sidecar `.lock` file and replaces the config
+atomically (write to a temp file, then rename), so a reader never sees a
+truncated file and one writer never drops another's changes. Reads are
+cached by (inode, mtime, size), so repeated loads skip JSON parsing; updates
+always re-read the file under the lock.
+"""
+import contextlib
+import copy
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+if sys.platform == "win32":
+    import msvcrt
+    fcntl = None
+else:
+    import fcntl
+    msvcrt = None
+
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "curl_gui_config.json")
+
+# On Windows the rename fails while another process has the file open; retry briefly.
+_REPLACE_ATTEMPTS = 10
+_REPLACE_RETRY_SECONDS = 0.05
+
+# mkstemp creates files as 0600; a new config gets the mode open() would give it. Read once: os.umask is process-wide.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path):
+    """Permissions for the file replacing `path`: those of the existing file, or the default for a new one."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path):
+    """Holds an exclusive lock on `lock_path` (created if missing) for the duration of the block."""
+    with open(lock_path, "a+b") as f:
+        if msvcrt is not None:
+            f.seek(0)
+            # LK_LOCK retries for about 10 seconds before raising OSError
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ConfigStore:
+    def __init__(self, path=DEFAULT_CONFIG_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._cache = None
+        self._cache_stamp = None # (st_ino, st_mtime_ns, st_size) of the file that was parsed
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _read(self, force=False):
+        """Returns the parsed config, reusing the cached copy if the file is unchanged (unless `force`)."""
+        stamp = self._stamp()
+        if stamp is None:
+            return {}
+        if force or stamp != self._cache_stamp:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            if not isinstance(config, dict):
+                raise json.JSONDecodeError("Config must be a JSON object.", "", 0)
+            self._cache, self._cache_stamp = config, stamp
+        return self._cache
+
+    def load(self):
+        """
+        Returns a copy of the config ({} if the file does not exist).
+        Raises json.JSONDecodeError or OSError if it cannot be read.
+        """
+        return copy.deepcopy(self._read())
+
+    def update(self, changes=None, mutate=None):
+        """
+        Applies `changes` (top-level keys to set) and/or `mutate(config)` to the
+        current file contents under the lock, and writes the result atomically.
+        The file is not rewritten if nothing changed. A missing or unparseable
+        file is treated as empty. Returns the resulting config.
+        """
+        with _file_lock(self.lock_path):
+            try:
+                # Not the cached copy: another process's write may leave the stamp unchanged
+                current = self._read(force=True)
+            except (json.JSONDecodeError, OSError):
+                current = {}
+            config = copy.deepcopy(current)
+            if changes:
+                config.update(changes)
+            if mutate is not None:
+                mutate(config)
+            if config != current or self._stamp() is None:
+                self._write(config)
+        return copy.deepcopy(config)
+
+    def _write(self, config):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".curl_gui_config.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2)
+            os.chmod(tmp_path, _file_mode(self.path))
+            for attempt in range(_REPLACE_ATTEMPTS):
+                try:
+                    os.replace(tmp_path, self.path)
+                    break
+                except PermissionError:
+                    if attempt == _REPLACE_ATTEMPTS - 1:
+                        raise
+                    time.sleep(_REPLACE_RETRY_SECONDS)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        self._cache, self._cache_stamp = config, self._stamp()
@@ -0,0 +1,118 @@
+"""
+Process-level cache of subscription keys read from the OS keyring.
+
+Some keyring backends (DBus secret service, WSL bridging) take hundreds of
+milliseconds per lookup, which froze the GUI on every region switch. The
+cache is warmed in a background thread at startup and then serves lookups
+from memory. Entries expire after `ttl` seconds so keys rotated by
+azure_key_fetcher.py in another process are picked up, and saving a key
+through the cache updates it immediately.
+
+Keys are never included in reprs or error messages.
+"""
+import threading
+import time
+try:
+    import keyring
+except ImportError:
+    keyring = None
+
+DEFAULT_TTL_SECONDS = 15 * 60
+
+
+class _Entry:
+    __slots__ = ("key", "error", "fetched_at")
+
+    def __init__(self, key, error):
+        self.key = key
+        self.error = error
+        self.fetched_at = time.monotonic()
+
+
+class CredentialCache:
+    def __init__(self, service_name, ttl=DEFAULT_TTL_SECONDS):
+        self.service_name = service_name
+        self.ttl = ttl
+        self._entries = {}
+        self._loading = set()
+        self._lock = threading.Lock()
+        # Backends such as the DBus secret service are not safe to call concurrently.
+        self._keyring_lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<CredentialCache service={self.service_name!r} regions={sorted(self._entries)}>"
+
+    def _fresh_entry(self, region):
+        entry = self._entries.get(region)
+        if entry is not None and time.monotonic() - entry.fetched_at < self.ttl:
+            return entry
+        return None
+
+    def peek(self, region):
+        """
+        Returns (key, error) from memory without touching the keyring, or None
+        if the region is not cached (or expired). `key` is None if no key is stored.
+        """
+        with self._lock:
+            entry = self._fresh_entry(region)
+        if entry is None:
+            return None
+        return entry.key, entry.error
+
+    def get(self, region):
+        """Returns the key for `region` (None if not stored), reading the keyring only on a cache miss."""
+        cached = self.peek(region)
+        if cached is None:
+            cached = self._fetch(region)
+        return cached[0]
+
+    def load_async(self, region):
+        """Starts loading `region` in the background unless it is cached or already loading."""
+        self.prefetch([region])
+
+    def prefetch(self, regions):
+        """Loads all uncached `regions` from the keyring in one background thread."""
+        with self._lock:
+            to_load = [r for r in dict.fromkeys(regions) if r not in self._loading and self._fresh_entry(r) is None]
+            self._loading.update(to_load)
+        if not to_load:
+            return
+
+        def run():
+            for region in to_load:
+                self._fetch(region)
+        threading.Thread(target=run, name="credential-prefetch", daemon=True).start()
+
+    def is_loading(self, region):
+        with self._lock:
+            return region in self._loading
+
+    def set(self, region, key):
+        """Stores `key` in the keyring and the cache. Raises the keyring's exception on failure."""
+        with self._keyring_lock:
+            keyring.set_password(self.service_name, region, key)
+        with self._lock:
+            self._entries[region] = _Entry(key, None)
+
+    def invalidate(self, region=None):
+        """Drops one region, or every region, from the cache."""
+        with self._lock:
+            if region is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(region, None)
+
+    def _fetch(self, region):
+        key, error = None, None
+        if keyring is None:
+            error = "keyring library not installed"
+        else:
+            try:
+                with self._keyring_lock:
+                    key = keyring.get_password(self.service_name, region)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        with self._lock:
+            self._entries[region] = _Entry(key, error)
+            self._loading.discard(region)
+        return key, error
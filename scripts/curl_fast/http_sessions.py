@@ -0,0 +1,245 @@
+"""
+Pooled keep-alive HTTP sessions, one per endpoint, with per-request timings.
+
+`requests.get`/`requests.post` open a new TCP+TLS connection every call; for
+short clips connection setup dominates latency. SessionManager keeps one
+`requests.Session` per scheme+host (i.e. per `{region}.api.cognitive.microsoft.com`)
+whose connection pool is reused across requests and threads.
+
+Every response gets a `timings` attribute (RequestTimings) with the
+connect/TLS/first-byte/total breakdown of that request.
+"""
+import io
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+except ImportError:
+    requests = None
+try:
+    from urllib3.http2.connection import HTTP2Connection, HTTP2Response
+except (ImportError, AttributeError):
+    HTTP2Connection = None
+
+DEFAULT_POOL_SIZE = 10
+
+# Connection setup happens on the thread that sends the request, so the
+# timing of the connection being opened (if any) is collected per thread.
+_connect_timings = threading.local()
+
+
+class RequestTimings:
+    """Latency breakdown of a single request, in seconds."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.connect = 0.0 # TCP connect (0 when a pooled connection was reused)
+        self.tls = 0.0 # TLS handshake (0 for plain HTTP or reused connections)
+        self.first_byte = None # Until the response headers were received
+        self.total = None # Until the response body was read
+        self.reused_connection = True
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def as_dict(self):
+        """Returns the timings in milliseconds, for logging."""
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+        return {
+            "connect_ms": ms(self.connect),
+            "tls_ms": ms(self.tls),
+            "first_byte_ms": ms(self.first_byte),
+            "total_ms": ms(self.total),
+            "reused_connection": self.reused_connection,
+        }
+
+    def __str__(self):
+        parts = [
+            f"connect {self.connect * 1000:.0f} ms",
+            f"TLS {self.tls * 1000:.0f} ms",
+        ]
+        if self.first_byte is not None:
+            parts.append(f"first byte {self.first_byte * 1000:.0f} ms")
+        if self.total is not None:
+            parts.append(f"total {self.total * 1000:.0f} ms")
+        if self.reused_connection:
+            parts.append("reused connection")
+        return ", ".join(parts)
+
+
+if requests is not None:
+    class _TimedConnectionMixin:
+        def _new_conn(self):
+            start = time.perf_counter()
+            try:
+                return super()._new_conn()
+            finally:
+                _connect_timings.tcp = time.perf_counter() - start
+
+        def connect(self):
+            start = time.perf_counter()
+            _connect_timings.tcp = 0.0
+            super().connect()
+            _connect_timings.total = time.perf_counter() - start
+
+    class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+        pass
+
+    class _TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _TimedHTTPConnection
+
+
+if requests is not None and HTTP2Connection is not None:
+    class _H2Context(ssl.SSLContext):
+        """
+        Offers only "h2" via ALPN. urllib3 sets ALPN from a process-wide list
+        on every handshake; overriding it here keeps HTTP/2 to our own
+        connections instead of patching urllib3 for the whole process.
+        """
+
+        def set_alpn_protocols(self, alpn_protocols):
+            super().set_alpn_protocols(["h2"])
+
+    class _BufferedHTTP2Response(HTTP2Response):
+        """
+        urllib3's HTTP/2 response holds the whole body but cannot be read
+        incrementally, which is how requests reads every response. This one
+        can, decodes gzip/deflate bodies and returns its connection to the pool.
+        """
+
+        def __init__(self, response):
+            super().__init__(
+                status=response.status,
+                headers=response.headers,
+                request_url=response._request_url,
+                data=response.data
+            )
+            self._body = None
+            self._pool = None
+            self._connection = None
+
+        def read(self, amt=None, decode_content=None, cache_content=False):
+            if self._body is None:
+                data = self._data
+                if decode_content is not False:
+                    self._init_decoder()
+                    data = self._decode(data, True, flush_decoder=True)
+                self._body = io.BytesIO(data)
+            chunk = self._body.read(amt)
+            if not chunk:
+                self.release_conn()
+            return chunk
+
+        def stream(self, amt=2 ** 16, decode_content=None):
+            while chunk := self.read(amt, decode_content):
+                yield chunk
+
+        def release_conn(self):
+            if self._pool is not None and self._connection is not None:
+                self._pool._put_conn(self._connection)
+                self._connection = None
+
+        def drain_conn(self):
+            pass
+
+    class _H2ConnectionMixin:
+        def __init__(self, host, port=None, **kwargs):
+            if kwargs.get("ssl_context") is None:
+                context = _H2Context(ssl.PROTOCOL_TLS_CLIENT)
+                context.minimum_version = ssl.TLSVersion.TLSv1_2
+                kwargs["ssl_context"] = context
+            super().__init__(host, port, **kwargs)
+
+        def getresponse(self):
+            return _BufferedHTTP2Response(super().getresponse())
+
+
+if requests is not None:
+    def _https_pool_class(http2=False):
+        bases = (_TimedConnectionMixin, HTTPSConnection)
+        if http2 and HTTP2Connection is not None:
+            bases = (_TimedConnectionMixin, _H2ConnectionMixin, HTTP2Connection)
+        elif http2:
+            print("Warning: HTTP/2 requires urllib3>=2.3 and the 'h2' package. Falling back to HTTP/1.1.")
+        connection_cls = type("_TimedHTTPSConnection", bases, {})
+        return type("_TimedHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": connection_cls})
+
+    class TimedHTTPAdapter(HTTPAdapter):
+        """HTTPAdapter whose connections record how long connect and TLS took."""
+
+        def __init__(self, http2=False, **kwargs):
+            self._https_pool_cls = _https_pool_class(http2)
+            super().__init__(**kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": _TimedHTTPConnectionPool,
+                "https": self._https_pool_cls,
+            }
+
+
+class SessionManager:
+    """
+    Hands out one pooled `requests.Session` per endpoint.
+
+    Sessions are created lazily and shared across threads; `pool_size` is the
+    number of keep-alive connections kept per endpoint and should be at least
+    the number of concurrent requests sent to one region.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, http2=False):
+        self.pool_size = pool_size
+        self.http2 = http2
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        parts = urlsplit(url)
+        endpoint = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(endpoint)
+            if session is None:
+                session = requests.Session()
+                adapter = TimedHTTPAdapter(
+                    http2=self.http2,
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    pool_block=False
+                )
+                session.mount(f"{parts.scheme}://", adapter)
+                self._sessions[endpoint] = session
+            return session
+
+    def request(self, method, url, stream=False, **kwargs):
+        """
+        Sends a request through the endpoint's pooled session and attaches
+        `response.timings`. With `stream=True` the caller reads the body and
+        then calls `response.timings.finish()`.
+        """
+        timings = RequestTimings()
+        _connect_timings.tcp = None
+        _connect_timings.total = None
+        response = self.session(url).request(method, url, stream=stream, **kwargs)
+        timings.first_byte = response.elapsed.total_seconds()
+        if _connect_timings.total is not None:
+            timings.reused_connection = False
+            timings.connect = _connect_timings.tcp or 0.0
+            if url.startswith("https"):
+                timings.tls = max(0.0, _connect_timings.total - timings.connect)
+        if not stream:
+            timings.finish()
+        response.timings = timings
+        return response
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
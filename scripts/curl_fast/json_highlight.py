@@ -0,0 +1,147 @@
+"""
+Lazy syntax highlighting of JSON in a Tk Text widget.
+
+Highlighting a multi-MB transcription response token by token locks the UI
+for seconds. LazyJsonHighlighter inserts the text unstyled right away and
+only lexes the lines in (or near) the viewport, as the user scrolls. Runs of
+tokens with the same style are coalesced and every tag is applied with a
+single `tag add` call per chunk.
+
+This relies on the JSON being pretty-printed (as `json.dumps(indent=...)`
+does), which never puts a newline inside a token, so every line can be
+lexed on its own.
+"""
+import tkinter as tk
+try:
+    from pygments import lex
+    from pygments.lexers import JsonLexer
+    from pygments.token import Token
+except ImportError:
+    lex = None # Flag that pygments is not installed
+    Token = None
+
+# Lines are highlighted in chunks of this many lines...
+CHUNK_LINES = 200
+# ...and this many lines above and below the viewport are highlighted ahead of time.
+MARGIN_LINES = 200
+# Bigger bodies are shown without highlighting.
+PLAIN_TEXT_THRESHOLD = 20 * 1024 * 1024
+# Delay before highlighting after a scroll, so fast scrolling doesn't lex every frame.
+SCROLL_DEBOUNCE_MS = 30
+
+
+class _Region:
+    """A block of JSON lines in the widget and which of its chunks are highlighted."""
+
+    def __init__(self, first_line, line_count):
+        self.first_line = first_line
+        self.line_count = line_count
+        self.pending_chunks = set(range((line_count + CHUNK_LINES - 1) // CHUNK_LINES))
+
+
+class LazyJsonHighlighter:
+    def __init__(self, text_widget):
+        self.text = text_widget
+        self.regions = []
+        self._styled_tokens = set()
+        self._tag_for_token = {}
+        self._after_id = None
+        self._lexer = JsonLexer() if lex is not None else None
+
+    @property
+    def enabled(self):
+        return lex is not None
+
+    def configure_tags(self, styles):
+        """`styles` maps Pygments token types to Text tag options, e.g. {Token.Name.Tag: {'foreground': '#008000'}}."""
+        if not self.enabled:
+            return
+        self._styled_tokens = set(styles)
+        self._tag_for_token.clear()
+        for token_type, options in styles.items():
+            self.text.tag_configure(str(token_type), **options)
+
+    def reset(self):
+        """Forgets all regions; call after clearing the widget."""
+        self.regions = []
+        if self._after_id is not None:
+            self.text.after_cancel(self._after_id)
+            self._after_id = None
+
+    def insert(self, json_string):
+        """Appends `json_string` at the end of the widget and highlights it lazily."""
+        if not self.enabled or len(json_string) > PLAIN_TEXT_THRESHOLD:
+            self.text.insert(tk.END, json_string)
+            return
+        first_line = int(self.text.index("end-1c").split(".")[0])
+        self.text.insert(tk.END, json_string)
+        line_count = json_string.count("\n") + 1
+        self.regions.append(_Region(first_line, line_count))
+        self.schedule()
+
+    def schedule(self, *args):
+        """Highlights the viewport shortly; safe to call on every scroll event."""
+        if not self.regions or self._after_id is not None:
+            return
+        self._after_id = self.text.after(SCROLL_DEBOUNCE_MS, self._highlight_visible)
+
+    def _highlight_visible(self):
+        self._after_id = None
+        first_visible = int(self.text.index("@0,0").split(".")[0])
+        last_visible = int(self.text.index(f"@0,{self.text.winfo_height()}").split(".")[0])
+        low, high = first_visible - MARGIN_LINES, last_visible + MARGIN_LINES
+
+        for region in self.regions:
+            if not region.pending_chunks:
+                continue
+            region_end = region.first_line + region.line_count
+            if high < region.first_line or low >= region_end:
+                continue
+            first_chunk = max(0, (low - region.first_line) // CHUNK_LINES)
+            last_chunk = (min(high, region_end - 1) - region.first_line) // CHUNK_LINES
+            for chunk in range(first_chunk, last_chunk + 1):
+                if chunk in region.pending_chunks:
+                    region.pending_chunks.discard(chunk)
+                    self._highlight_chunk(region, chunk)
+        self.regions = [region for region in self.regions if region.pending_chunks]
+
+    def _tag(self, token_type):
+        """Maps a token type to the tag of its closest styled ancestor (e.g. Keyword.Constant -> Keyword)."""
+        tag = self._tag_for_token.get(token_type, False)
+        if tag is False:
+            tag = None
+            t = token_type
+            while t is not None:
+                if t in self._styled_tokens:
+                    tag = str(t)
+                    break
+                t = t.parent
+            self._tag_for_token[token_type] = tag
+        return tag
+
+    def _highlight_chunk(self, region, chunk):
+        start_line = region.first_line + chunk * CHUNK_LINES
+        end_line = min(start_line + CHUNK_LINES, region.first_line + region.line_count)
+        source = self.text.get(f"{start_line}.0", f"{end_line}.0")
+
+        ranges = {} # tag -> [index1, index2, index1, index2, ...]
+        line, column = start_line, 0
+        current_tag, run_start = None, None
+        for token_type, value in lex(source, self._lexer):
+            tag = self._tag(token_type)
+            if tag != current_tag:
+                if current_tag is not None:
+                    ranges.setdefault(current_tag, []).extend((run_start, f"{line}.{column}"))
+                current_tag = tag
+                run_start = f"{line}.{column}"
+            newlines = value.count("\n")
+            if newlines:
+                line += newlines
+                column = len(value) - value.rfind("\n") - 1
+            else:
+                column += len(value)
+        if current_tag is not None:
+            ranges.setdefault(current_tag, []).extend((run_start, f"{line}.{column}"))
+
+        for tag, indices in ranges.items():
+            self.text.tag_add(tag, *indices)
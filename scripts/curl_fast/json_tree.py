@@ -0,0 +1,211 @@
+"""
+Collapsible tree view of a parsed JSON document.
+
+Only expanded nodes are materialized: a container gets a placeholder child
+until it is opened, and long arrays (like `phrases` or `words` in an
+hour-long transcription) are split into pages of PAGE_SIZE items that are
+themselves expanded on demand. The search box walks the document once to
+build an index of keys and values, then jumps between matches by
+materializing just the path to each one.
+"""
+import itertools
+import json
+import tkinter as tk
+from tkinter import ttk
+
+# Arrays and objects longer than this are split into expandable pages.
+PAGE_SIZE = 100
+# Scalar values are truncated to this many characters in the tree.
+MAX_VALUE_CHARS = 200
+
+_PLACEHOLDER = "__placeholder__"
+
+
+def _summary(value):
+    if isinstance(value, dict):
+        return f"{{{len(value)} keys}}"
+    if isinstance(value, list):
+        return f"[{len(value)} items]"
+    text = json.dumps(value, ensure_ascii=False)
+    if len(text) > MAX_VALUE_CHARS:
+        text = text[:MAX_VALUE_CHARS] + "…"
+    return text
+
+
+def _items(value, start=0, end=None):
+    """Returns the (key, child) pairs of a container, optionally only those in [start, end)."""
+    if isinstance(value, dict):
+        return list(itertools.islice(value.items(), start, end))
+    end = len(value) if end is None else end
+    return [(i, value[i]) for i in range(start, end)]
+
+
+class JsonTreeView(ttk.Frame):
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.data = None
+        self._nodes = {} # iid -> (value, path, page) where page is None or (start, end)
+        self._iid_by_path = {} # path -> iid of materialized nodes
+        self._search_index = None # [(path, searchable text)], built on first search
+        self._last_query = None
+        self._matches = []
+        self._match_position = -1
+
+        search_frame = ttk.Frame(self)
+        search_frame.pack(fill="x", padx=5, pady=(5, 0))
+        ttk.Label(search_frame, text="Search:").pack(side="left")
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        self.search_entry.pack(side="left", fill="x", expand=True, padx=5)
+        self.search_entry.bind("<Return>", lambda event: self.find_next())
+        self.search_entry.bind("<Shift-Return>", lambda event: self.find_next(backwards=True))
+        ttk.Button(search_frame, text="Previous", command=lambda: self.find_next(backwards=True)).pack(side="left")
+        ttk.Button(search_frame, text="Next", command=self.find_next).pack(side="left", padx=(5, 0))
+        self.match_var = tk.StringVar()
+        ttk.Label(search_frame, textvariable=self.match_var, width=14).pack(side="left", padx=(5, 0))
+
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        self.tree = ttk.Treeview(tree_frame, columns=("value",), selectmode="browse")
+        self.tree.heading("#0", text="Key")
+        self.tree.heading("value", text="Value")
+        self.tree.column("#0", width=250, stretch=False)
+        self.tree.column("value", width=400, stretch=True)
+        scrollbar = ttk.Scrollbar(tree_frame, command=self.tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.config(yscrollcommand=scrollbar.set)
+        self.tree.bind("<<TreeviewOpen>>", self._on_open)
+
+    def set_data(self, data):
+        """Shows a parsed JSON document; pass None to clear."""
+        self.tree.delete(*self.tree.get_children())
+        self._nodes.clear()
+        self._iid_by_path.clear()
+        self._search_index = None
+        self._last_query = None
+        self._matches = []
+        self._match_position = -1
+        self.match_var.set("")
+        self.data = data
+        if data is None:
+            return
+        if isinstance(data, (dict, list)):
+            self._insert_children("", data, (), None)
+        else:
+            self._insert_node("", "(value)", data, ())
+
+    def _insert_node(self, parent, label, value, path, page=None):
+        if page is not None:
+            iid = self.tree.insert(parent, tk.END, text=f"[{page[0]}…{page[1] - 1}]", values=("",))
+        else:
+            iid = self.tree.insert(parent, tk.END, text=label, values=(_summary(value),))
+            self._iid_by_path[path] = iid
+        self._nodes[iid] = (value, path, page)
+        if (page is not None) or (isinstance(value, (dict, list)) and value):
+            self.tree.insert(iid, tk.END, iid=f"{iid}{_PLACEHOLDER}", text="…")
+        return iid
+
+    def _insert_children(self, parent, value, path, page):
+        if page is not None:
+            items = _items(value, *page)
+        elif len(value) > PAGE_SIZE:
+            # Split into pages, nesting them so no node has more than PAGE_SIZE children
+            page_span = PAGE_SIZE
+            while len(value) > page_span * PAGE_SIZE:
+                page_span *= PAGE_SIZE
+            for start in range(0, len(value), page_span):
+                self._insert_node(parent, None, value, path, page=(start, min(start + page_span, len(value))))
+            return
+        else:
+            items = _items(value)
+        for key, child in items:
+            label = f"[{key}]" if isinstance(key, int) else str(key)
+            self._insert_node(parent, label, child, path + (key,))
+
+    def _expand(self, iid):
+        """Replaces the placeholder of `iid` with its real children."""
+        placeholder = f"{iid}{_PLACEHOLDER}"
+        if not self.tree.exists(placeholder):
+            return
+        self.tree.delete(placeholder)
+        value, path, page = self._nodes[iid]
+        if page is not None and page[1] - page[0] > PAGE_SIZE:
+            span = page[1] - page[0]
+            sub_span = span // PAGE_SIZE
+            for start in range(page[0], page[1], sub_span):
+                self._insert_node(iid, None, value, path, page=(start, min(start + sub_span, page[1])))
+        else:
+            self._insert_children(iid, value, path, page)
+
+    def _on_open(self, event=None):
+        iid = self.tree.focus()
+        if iid:
+            self._expand(iid)
+
+    def _materialize(self, path):
+        """Expands the tree along `path` and returns the iid of its node."""
+        parent = ""
+        for depth in range(len(path)):
+            prefix = path[:depth + 1]
+            while prefix not in self._iid_by_path:
+                # Open the child of `parent` (a page or the node itself) that contains prefix
+                key = prefix[-1]
+                next_iid = None
+                for child in self.tree.get_children(parent):
+                    node = self._nodes.get(child)
+                    if node is None:
+                        continue
+                    _, _, page = node
+                    if page is not None:
+                        index = key if isinstance(key, int) else list(node[0]).index(key)
+                        if page[0] <= index < page[1]:
+                            next_iid = child
+                            break
+                if next_iid is None:
+                    return None
+                self._expand(next_iid)
+                self.tree.item(next_iid, open=True)
+                parent = next_iid
+            parent = self._iid_by_path[prefix]
+            if depth < len(path) - 1:
+                self._expand(parent)
+                self.tree.item(parent, open=True)
+        return parent
+
+    def _build_search_index(self):
+        """Walks the document once in pre-order, so matches come out in display order."""
+        index = []
+        stack = [((), self.data)]
+        while stack:
+            path, value = stack.pop()
+            key_text = path[-1].lower() if path and isinstance(path[-1], str) else ""
+            if isinstance(value, (dict, list)):
+                if key_text:
+                    index.append((path, key_text))
+                stack.extend((path + (key,), child) for key, child in reversed(_items(value)))
+            else:
+                index.append((path, f"{key_text}\0{json.dumps(value, ensure_ascii=False).lower()}"))
+        return index
+
+    def find_next(self, backwards=False):
+        query = self.search_var.get().strip().lower()
+        if not query or self.data is None:
+            return
+        if self._search_index is None:
+            self._search_index = self._build_search_index()
+        if self._last_query != query:
+            self._last_query = query
+            self._matches = [path for path, text in self._search_index if query in text]
+            self._match_position = -1
+        if not self._matches:
+            self.match_var.set("No matches")
+            return
+        step = -1 if backwards else 1
+        self._match_position = (self._match_position + step) % len(self._matches)
+        iid = self._materialize(self._matches[self._match_position])
+        if iid:
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+            self.tree.see(iid)
+        self.match_var.set(f"{self._match_position + 1} of {len(self._matches)}")
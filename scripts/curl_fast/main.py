@@ -1,13 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import json
-import csv
 import subprocess
 import shlex
 import os
 import sys
 import ctypes
-from datetime import datetime, timezone
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import font as tkfont
 try:
     import keyring
@@ -18,12 +18,18 @@ try:
 except ImportError:
     requests = None
 try:
-    from pygments import lex
-    from pygments.lexers import JsonLexer
     from pygments.token import Token
 except ImportError:
-    lex = None # Flag that pygments is not installed
-    Token = None
+    Token = None # Flag that pygments is not installed
+
+import speech_api
+from config_store import ConfigStore
+from credential_cache import CredentialCache
+from http_sessions import SessionManager
+from json_highlight import LazyJsonHighlighter
+from json_tree import JsonTreeView
+from request_history import RequestHistory
+from request_jobs import RequestJob, RequestGroup, QUEUED, RUNNING, DONE, FAILED, CANCELLED
 
 class CurlApp(tk.Tk):
     def __init__(self):
@@ -33,7 +39,10 @@ class CurlApp(tk.Tk):
 
         # --- Configuration ---
         self.config_file = os.path.join(os.path.dirname(__file__), "curl_gui_config.json")
-        self.request_log_file = os.path.join(os.path.dirname(__file__), "request_history.csv")
+        self.config_store = ConfigStore(self.config_file)
+        self.CONFIG_SAVE_DELAY_MS = 1000 # Settings changes within this window are written once
+        self._save_config_after_id = None
+        self.history = RequestHistory(os.path.join(os.path.dirname(__file__), "request_history.db"))
         self.default_font = ("Fira Code", 10)
         self.SERVICE_NAME = "curl_gui_app"
         # This list provides the initial regions for the dropdown.
@@ -41,16 +50,36 @@ class CurlApp(tk.Tk):
         self.regions = [] # Will be populated from keyring
         self.api_versions = ["2024-11-15", "2025-10-15"]
         self.locale_history = [] # For storing recent locale settings
+        self.credentials = CredentialCache(self.SERVICE_NAME) # Keys are prefetched once regions are loaded
+        self.KEY_LOAD_POLL_MS = 50
+
+        # --- Background requests ---
+        self.MAX_WORKERS = 8 # Upper bound for the "Max Concurrent" setting
+        self.JOB_POLL_INTERVAL_MS = 100
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="request")
+        self.http_pool_size = self.MAX_WORKERS # Keep-alive connections per region endpoint
+        self.use_http2 = False
+        self.sessions = None # Pooled keep-alive sessions, created once the config is loaded
+        self.jobs = {} # job id -> RequestJob, in submission order
+        self.groups = {} # group id -> RequestGroup, for multi-region requests
+        self._pending_jobs = [] # Submitted but waiting for a free slot
+        self._running_jobs = 0
+        self._finished_jobs = queue.Queue() # Filled by worker threads
+        self._displayed_job = None # RequestJob or RequestGroup shown in the output
 
         self.create_widgets()
         self.toggle_diarization_fields() # Set initial state for diarization fields
         self._toggle_custom_model_fields() # Set initial state for custom model fields
         self._toggle_api_version_fields() # Set initial state for enhanced mode based on API version
         self.load_config()
+        self.sessions = SessionManager(pool_size=self.http_pool_size, http2=self.use_http2)
+        self.credentials.load_async(self.region_var.get()) # Current region first
+        self.credentials.prefetch(self.regions)
         self.update_key() # Set initial key
         self._check_keyring_backend()
 
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self._poll_after_id = self.after(self.JOB_POLL_INTERVAL_MS, self._poll_jobs)
 
     def create_widgets(self):
         main_frame = ttk.Frame(self, padding="10")
@@ -108,6 +137,19 @@ class CurlApp(tk.Tk):
         self.browse_button = ttk.Button(self.audio_file_frame, text="Browse...", command=self.browse_file)
         self.browse_button.grid(row=0, column=1, padx=(5, 0))
 
+        # Regions for "Send to Selected Regions"
+        ttk.Label(config_frame, text="Compare Regions:").grid(row=4, column=0, padx=5, pady=5, sticky="nw")
+        compare_frame = ttk.Frame(config_frame)
+        compare_frame.grid(row=4, column=1, padx=5, pady=5, sticky="ew")
+        compare_frame.grid_columnconfigure(0, weight=1)
+        self.compare_regions_listbox = tk.Listbox(compare_frame, selectmode="multiple", height=4, exportselection=False)
+        self.compare_regions_listbox.grid(row=0, column=0, rowspan=2, sticky="ew")
+        compare_scrollbar = ttk.Scrollbar(compare_frame, command=self.compare_regions_listbox.yview)
+        compare_scrollbar.grid(row=0, column=1, rowspan=2, sticky="ns")
+        self.compare_regions_listbox.config(yscrollcommand=compare_scrollbar.set)
+        ttk.Button(compare_frame, text="Select All", command=lambda: self.compare_regions_listbox.selection_set(0, tk.END)).grid(row=0, column=2, padx=(5, 0), sticky="ew")
+        ttk.Button(compare_frame, text="Clear", command=lambda: self.compare_regions_listbox.selection_clear(0, tk.END)).grid(row=1, column=2, padx=(5, 0), sticky="ew")
+
         # --- Definition Frame ---
         self.definition_frame = ttk.LabelFrame(main_frame, text="Definition")
         self.definition_frame.pack(fill="x", pady=5)
@@ -207,19 +249,61 @@ class CurlApp(tk.Tk):
         self.enhanced_mode_prompt_entry.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
 
         # --- Action and Output ---
-        self.send_button = ttk.Button(main_frame, text="Send Request", command=self.send_request)
-        self.send_button.pack(pady=10)
+        action_frame = ttk.Frame(main_frame)
+        action_frame.pack(pady=10)
+        self.send_button = ttk.Button(action_frame, text="Send Request", command=self.send_request)
+        self.send_button.pack(side="left", padx=5)
+        self.send_compare_button = ttk.Button(action_frame, text="Send to Selected Regions", command=self.send_to_selected_regions)
+        self.send_compare_button.pack(side="left", padx=5)
+
+        # --- Requests Panel ---
+        jobs_frame = ttk.LabelFrame(main_frame, text="Requests")
+        jobs_frame.pack(fill="x", pady=5)
+        jobs_frame.grid_columnconfigure(0, weight=1)
+        columns = ("id", "function", "region", "status", "time")
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=columns, show="tree headings", height=4, selectmode="extended")
+        self.jobs_tree.column("#0", width=30, stretch=False) # Expander for multi-region groups
+        for column, width in zip(columns, (40, 100, 160, 100, 80)):
+            self.jobs_tree.heading(column, text=column.capitalize() if column != "id" else "#")
+            self.jobs_tree.column(column, width=width, stretch=column == "region")
+        self.jobs_tree.grid(row=0, column=0, rowspan=3, padx=5, pady=5, sticky="ew")
+        self.jobs_tree.bind("<<TreeviewSelect>>", self._on_job_selected)
+        jobs_scrollbar = ttk.Scrollbar(jobs_frame, command=self.jobs_tree.yview)
+        jobs_scrollbar.grid(row=0, column=1, rowspan=3, pady=5, sticky="ns")
+        self.jobs_tree.config(yscrollcommand=jobs_scrollbar.set)
+
+        ttk.Button(jobs_frame, text="Cancel Selected", command=self.cancel_selected_jobs).grid(row=0, column=2, padx=5, pady=2, sticky="ew")
+        ttk.Button(jobs_frame, text="Clear Finished", command=self.clear_finished_jobs).grid(row=1, column=2, padx=5, pady=2, sticky="ew")
+        concurrency_frame = ttk.Frame(jobs_frame)
+        concurrency_frame.grid(row=2, column=2, padx=5, pady=2, sticky="ew")
+        ttk.Label(concurrency_frame, text="Max Concurrent:").pack(side="left")
+        self.max_concurrent_var = tk.IntVar(value=2)
+        ttk.Spinbox(concurrency_frame, from_=1, to=self.MAX_WORKERS, textvariable=self.max_concurrent_var, width=4).pack(side="left", padx=(5, 0))
 
         output_frame = ttk.LabelFrame(main_frame, text="Output")
         output_frame.pack(fill="both", expand=True, pady=5)
+        self.output_notebook = ttk.Notebook(output_frame)
+        self.output_notebook.pack(fill="both", expand=True, padx=5, pady=5)
+        text_tab = ttk.Frame(self.output_notebook)
+        self.output_notebook.add(text_tab, text="Text")
         self.output_font = tkfont.Font(family=self.default_font[0], size=self.default_font[1])
-        self.output_text = tk.Text(output_frame, wrap="word", height=15, font=self.output_font)
-        self.output_text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.output_text = tk.Text(text_tab, wrap="word", height=15, font=self.output_font)
+        self.output_text.pack(fill="both", expand=True)
+
+        # Collapsible view of the response body, for long phrases/words arrays
+        self.output_tree = JsonTreeView(self.output_notebook)
+        self.output_notebook.add(self.output_tree, text="Tree")
 
         # Add a scrollbar
         scrollbar = ttk.Scrollbar(self.output_text, command=self.output_text.yview)
         scrollbar.pack(side="right", fill="y")
-        self.output_text.config(yscrollcommand=scrollbar.set)
+
+        # JSON is highlighted lazily, only around the visible lines
+        self.highlighter = LazyJsonHighlighter(self.output_text)
+        def on_output_scroll(first, last):
+            scrollbar.set(first, last)
+            self.highlighter.schedule()
+        self.output_text.config(yscrollcommand=on_output_scroll)
 
         self._configure_highlighting_tags()
         self._create_menu()
@@ -243,26 +327,32 @@ class CurlApp(tk.Tk):
         for f in common_fonts:
             font_menu.add_command(label=f, command=lambda f=f: self.change_font(f))
 
+        keys_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Keys", menu=keys_menu)
+        keys_menu.add_command(label="Reload Keys from Keyring", command=self.reload_keys)
+
     def _configure_highlighting_tags(self):
         if Token is None: # Pygments not installed
             return
         # Basic color scheme for JSON
-        self.output_text.tag_configure(str(Token.Keyword), foreground='#0000ff')
-        self.output_text.tag_configure(str(Token.Name.Tag), foreground='#008000') # Keys
-        self.output_text.tag_configure(str(Token.Literal.String.Double), foreground='#a31515')
-        self.output_text.tag_configure(str(Token.Literal.Number.Integer), foreground='#098658')
-        self.output_text.tag_configure(str(Token.Literal.Number.Float), foreground='#098658')
-        self.output_text.tag_configure(str(Token.Punctuation), foreground='#333333')
+        self.highlighter.configure_tags({
+            Token.Keyword: {'foreground': '#0000ff'},
+            Token.Name.Tag: {'foreground': '#008000'}, # Keys
+            Token.Literal.String.Double: {'foreground': '#a31515'},
+            Token.Literal.Number.Integer: {'foreground': '#098658'},
+            Token.Literal.Number.Float: {'foreground': '#098658'},
+            Token.Punctuation: {'foreground': '#333333'},
+        })
 
     def _highlight_json(self, json_string):
-        if lex is None: # Pygments not installed
-            self.output_text.insert(tk.END, json_string)
-            return
+        # Don't delete, just insert at the end; highlighting follows as it scrolls into view
+        self.highlighter.insert(json_string)
+
+    def _clear_output(self):
+        self.output_text.delete("1.0", tk.END)
+        self.highlighter.reset()
+        self.output_tree.set_data(None)
 
-        # Don't delete, just insert tokens at the end
-        tokens = lex(json_string, JsonLexer())
-        for token_type, token_value in tokens:
-            self.output_text.insert(tk.END, token_value, (str(token_type),))
     def _set_widget_state_recursively(self, widget, state):
         """Recursively set the state of a widget and all its children."""
         try:
@@ -303,29 +393,57 @@ class CurlApp(tk.Tk):
 
     def change_font(self, font_family):
         self.output_font.config(family=font_family)
+        self.schedule_save_config()
 
     def increase_font_size(self):
         size = self.output_font.cget("size")
         self.output_font.config(size=size + 1)
+        self.schedule_save_config()
 
     def decrease_font_size(self):
         size = self.output_font.cget("size")
         if size > 6:
             self.output_font.config(size=size - 1)
+            self.schedule_save_config()
 
     def update_key(self, event=None):
         region = self.region_var.get()
-        if keyring:
-            try:
-                key = keyring.get_password(self.SERVICE_NAME, region)
-                if key:
-                    self.key_var.set(key)
-                else:
-                    self.key_var.set("KEY NOT FOUND IN STORE")
-            except Exception as e:
-                self.key_var.set(f"Error reading from keyring: {e}")
-        else:
+        if not keyring:
             self.key_var.set("keyring library not installed")
+            return
+
+        cached = self.credentials.peek(region)
+        if cached is None:
+            # Not prefetched yet; load it in the background and check back shortly
+            self.key_var.set("Loading key from keyring...")
+            self.credentials.load_async(region)
+            self.after(self.KEY_LOAD_POLL_MS, self._update_key_when_loaded, region)
+            return
+
+        key, error = cached
+        if error:
+            self.key_var.set(f"Error reading from keyring: {error}")
+        elif key:
+            self.key_var.set(key)
+        else:
+            self.key_var.set("KEY NOT FOUND IN STORE")
+
+    def _update_key_when_loaded(self, region):
+        if region != self.region_var.get():
+            return # The user has moved on to another region
+        if self.credentials.peek(region) is not None:
+            self.update_key()
+        else:
+            if not self.credentials.is_loading(region):
+                self.credentials.load_async(region)
+            self.after(self.KEY_LOAD_POLL_MS, self._update_key_when_loaded, region)
+
+    def reload_keys(self):
+        """Drops cached keys (e.g. after running azure_key_fetcher.py) and reloads them."""
+        self.credentials.invalidate()
+        self.credentials.load_async(self.region_var.get())
+        self.credentials.prefetch(self.regions)
+        self.update_key()
 
     def save_key_to_keyring(self):
         if not keyring:
@@ -338,16 +456,17 @@ class CurlApp(tk.Tk):
         if not region:
             messagebox.showerror("Error", "Please enter a region first.")
             return
-        if not key or "KEY NOT FOUND" in key:
+        if not key or "KEY NOT FOUND" in key or key.startswith(("Loading key", "Error reading")):
             messagebox.showerror("Error", "Please enter a valid key to save.")
             return
 
         try:
-            keyring.set_password(self.SERVICE_NAME, region, key)
+            self.credentials.set(region, key)
             messagebox.showinfo("Success", f"Successfully saved key for region: '{region}'")
             # Add the new region to the list if it's not already there
             if region not in self.region_menu['values']:
                 self.region_menu['values'] = (*self.region_menu['values'], region)
+                self.compare_regions_listbox.insert(tk.END, region)
         except Exception as e:
             messagebox.showerror("Keyring Error", f"Failed to save key for '{region}':\n{e}")
 
@@ -364,7 +483,7 @@ class CurlApp(tk.Tk):
     def browse_file(self):
         filename = filedialog.askopenfilename(
             title="Select Audio File",
-            filetypes=(("MP3 files", "*.mp3"), ("WAV files", "*.wav"), ("All files", "*.*"))
+            filetypes=(("Audio files", "*.mp3 *.wav *.wma *.flac *.ogg *.opus *.m4a *.aac *.webm"), ("MP3 files", "*.mp3"), ("WAV files", "*.wav"), ("All files", "*.*"))
         )
         if filename:
             self.audio_file_var.set(filename)
@@ -398,8 +517,7 @@ class CurlApp(tk.Tk):
     def load_config(self):
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
+                config = self.config_store.load()
 
                 # Populate regions from the map
                 rg_map = config.get("rg_region_map", {})
@@ -411,6 +529,8 @@ class CurlApp(tk.Tk):
                 if self.regions:
                     self.region_menu['values'] = self.regions
                     self.region_var.set(self.regions[0])
+                    self.compare_regions_listbox.delete(0, tk.END)
+                    self.compare_regions_listbox.insert(tk.END, *self.regions)
 
                 # Load locale history
                 self.locale_history = config.get("locale_history", ["en-US, ja-JP", "en-US"])
@@ -426,20 +546,13 @@ class CurlApp(tk.Tk):
                 font_size = config.get("font_size", self.default_font[1])
                 self.output_font.config(family=font_family, size=font_size)
 
-            except (json.JSONDecodeError, IOError):
-                pass # Ignore errors in config file, start fresh
+                self.http_pool_size = config.get("http_pool_size", self.http_pool_size)
+                self.use_http2 = config.get("http2", self.use_http2)
 
-    def save_config(self):
-        # Read existing config to preserve the region map
-        config = {}
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
             except (json.JSONDecodeError, IOError):
-                pass # Start fresh if config is broken
+                pass # Ignore errors in config file, start fresh
 
-        # Update locale history
+    def _update_locale_history(self):
         current_locales = self.locale_var.get()
         if current_locales:
             # Remove from history if it exists, to move it to the top
@@ -452,20 +565,39 @@ class CurlApp(tk.Tk):
             # Immediately update the combobox in the GUI
             self.locale_combobox['values'] = self.locale_history
 
-        # Update the values we manage
-        config["last_audio_file"] = self.audio_file_var.get()
-        config["font_family"] = self.output_font.cget("family")
-        config["font_size"] = self.output_font.cget("size")
-        config["locale_history"] = self.locale_history
+    def schedule_save_config(self):
+        """Saves the config once no further changes arrive for CONFIG_SAVE_DELAY_MS."""
+        if self._save_config_after_id is not None:
+            self.after_cancel(self._save_config_after_id)
+        self._save_config_after_id = self.after(self.CONFIG_SAVE_DELAY_MS, self.save_config)
+
+    def save_config(self):
+        if self._save_config_after_id is not None:
+            self.after_cancel(self._save_config_after_id)
+            self._save_config_after_id = None
+        # Only the values we manage are written; the store merges them into the
+        # current file, so the region map written by azure_key_fetcher.py is preserved.
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-        except IOError:
+            self.config_store.update({
+                "last_audio_file": self.audio_file_var.get(),
+                "font_family": self.output_font.cget("family"),
+                "font_size": self.output_font.cget("size"),
+                "locale_history": self.locale_history,
+            })
+        except OSError:
             # Don't crash if we can't write the config file
             pass
 
     def on_closing(self):
+        self._update_locale_history()
         self.save_config()
+        self.after_cancel(self._poll_after_id)
+        for job in self.jobs.values():
+            job.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.sessions is not None:
+            self.sessions.close()
+        self.history.close()
         self.destroy()
 
     def _convert_path_for_wsl(self, path):
@@ -477,68 +609,88 @@ class CurlApp(tk.Tk):
         return path
 
     def send_request(self):
-        self.save_config() # Save history and other settings immediately
-        self.output_text.delete("1.0", tk.END)
+        if not self._check_can_send():
+            return
+        spec = self._build_request_spec()
+        if spec is not None:
+            self._submit_job(self._make_job(spec, self.region_var.get(), self.key_var.get()))
+
+    def send_to_selected_regions(self):
+        """Sends the same request to every region selected under "Compare Regions"."""
+        regions = [self.compare_regions_listbox.get(i) for i in self.compare_regions_listbox.curselection()]
+        if len(regions) < 2:
+            messagebox.showerror("Error", "Please select at least two regions to compare.")
+            return
+        if not self._check_can_send():
+            return
+        spec = self._build_request_spec()
+        if spec is None:
+            return
+        # Keys not cached yet are read in the background; the group is sent once all of them are loaded
+        self.credentials.prefetch(regions)
+        self._send_group_when_keys_loaded(spec, regions)
+
+    def _send_group_when_keys_loaded(self, spec, regions):
+        cached = {region: self.credentials.peek(region) for region in regions}
+        pending = [region for region, entry in cached.items() if entry is None]
+        if pending:
+            for region in pending:
+                if not self.credentials.is_loading(region):
+                    self.credentials.load_async(region) # Expired while waiting for the others
+            self.after(self.KEY_LOAD_POLL_MS, self._send_group_when_keys_loaded, spec, regions)
+            return
 
-        if requests is None:
-            messagebox.showerror("Missing Library", "The 'requests' library is not installed.\nPlease run 'pip install requests' in your terminal.")
-            self.output_text.insert(tk.END, "Error: 'requests' library not found.")
+        missing = [
+            f"{region} ({error})" if error else region
+            for region, (key, error) in cached.items() if not key
+        ]
+        if missing:
+            messagebox.showerror("Keyring Error", "No key stored for region(s):\n" + ", ".join(missing))
             return
+        group = RequestGroup(self._make_job(spec, region, cached[region][0]) for region in regions)
+        self._submit_group(group)
 
-        self.output_text.insert(tk.END, "Sending request...\n\n")
-        self.update()
+    def _check_can_send(self):
+        self._update_locale_history()
+        self.schedule_save_config() # Coalesced, so rapid sends don't each write the file
 
+        if requests is None:
+            messagebox.showerror("Missing Library", "The 'requests' library is not installed.\nPlease run 'pip install requests' in your terminal.")
+            self._clear_output()
+            self.output_text.insert(tk.END, "Error: 'requests' library not found.")
+            return False
+        return True
+
+    def _build_request_spec(self):
+        """
+        Reads the form into the region-independent parts of a request.
+        Returns None (after showing an error) if the form is invalid.
+        """
         selected_function = self.function_var.get()
         if selected_function == "transcribe":
-            self._send_transcribe_request()
+            return self._build_transcribe_spec()
         elif selected_function == "locales":
-            self._send_locales_request()
-
-    def _send_locales_request(self):
-        url = f"https://{self.region_var.get()}.api.cognitive.microsoft.com/speechtotext/transcriptions/locales?api-version={self.api_version_var.get()}"
-        headers = {
-            'Ocp-Apim-Subscription-Key': self.key_var.get()
-        }
-
-        try:
-            # Mask key for printing
-            masked_headers = headers.copy()
-            if 'Ocp-Apim-Subscription-Key' in masked_headers:
-                masked_headers['Ocp-Apim-Subscription-Key'] = '********'
-
-            self.output_text.insert(tk.END, f"GET {url}\n")
-            self.output_text.insert(tk.END, f"Request Headers: {json.dumps(masked_headers, indent=2)}\n\n")
-
-            response = requests.get(url, headers=headers)
-            self._process_and_display_response(response, "GET", url, None)
+            return {"function": "locales", "method": "GET"}
+        return None
 
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Request Error", f"An error occurred while sending the request:\n{e}")
-            self.output_text.insert(tk.END, f"\n\n--- Python Exception ---\n{e}")
-        except Exception as e:
-            messagebox.showerror("An Unexpected Error Occurred", str(e))
-            self.output_text.insert(tk.END, f"\n\n--- Python Exception ---\n{e}")
+    def _make_job(self, spec, region, key):
+        api_version = self.api_version_var.get()
+        if spec["function"] == "transcribe":
+            url = speech_api.transcribe_url(region, api_version)
+        else:
+            url = speech_api.locales_url(region, api_version)
+        return RequestJob(
+            spec["function"], region, spec["method"], url, speech_api.auth_headers(key),
+            data=spec.get("data"), audio_path=spec.get("audio_path"), form_data=spec.get("form_data")
+        )
 
-    def _send_transcribe_request(self):
+    def _build_transcribe_spec(self):
         audio_path = self.audio_file_var.get()
         if not audio_path or not os.path.exists(audio_path):
             messagebox.showerror("Error", "Please select a valid audio file.")
-            return
+            return None
 
         # --- Build Definition JSON ---
-        # Parse the comma-separated string of locales
-        locales_str = self.locale_var.get()
-        locales_list = [locale.strip() for locale in locales_str.split(',') if locale.strip()]
-
-        definition = {
-            "locales": locales_list
-        }
-        if self.diarization_enabled_var.get():
-            definition["diarization"] = {
-                "enabled": True,
-                "maxSpeakers": self.max_speakers_var.get()
-            }
-
         # Add channels to the definition
         channels = []
         if self.channel_0_var.get():
@@ -546,49 +698,28 @@ class CurlApp(tk.Tk):
         if self.channel_1_var.get():
             channels.append(1)
 
-        # Only add the key if channels are selected and the selection is not the default ([0])
-        if channels and channels != [0]:
-            definition["channels"] = channels
-
-        # Handle custom properties
-        custom_properties = {}
-        if self.postprocessing_dump_var.get():
-            custom_properties["isBatchDisplayPostprocessingDataDumpEnabled"] = "true"
-
-        if custom_properties:
-            definition["customProperties"] = custom_properties
-
         # Handle custom models
+        models = None
         if self.use_custom_model_var.get():
             model_json_str = self.custom_model_text.get("1.0", tk.END).strip()
             if model_json_str:
                 try:
-                    models = json.loads(model_json_str)
-                    if isinstance(models, dict) and models:
-                        definition["models"] = models
-                    else:
-                        raise json.JSONDecodeError("Input must be a non-empty JSON object.", model_json_str, 0)
+                    models = speech_api.parse_models(model_json_str)
                 except json.JSONDecodeError as e:
                     messagebox.showerror("Invalid JSON", f"The custom model definition is not valid JSON:\n{e}")
-                    return
-
-        # Handle Enhanced Mode
-        if self.use_enhanced_mode_var.get():
-            enhanced_mode = {
-                "enabled": True,
-                "task": self.enhanced_mode_task_var.get()
-            }
-            prompt = self.enhanced_mode_prompt_var.get().strip()
-            if prompt:
-                enhanced_mode["prompt"] = [prompt]
-            definition["enhancedMode"] = enhanced_mode
+                    return None
+
+        definition = speech_api.build_definition(
+            speech_api.parse_locales(self.locale_var.get()),
+            max_speakers=self.max_speakers_var.get() if self.diarization_enabled_var.get() else None,
+            channels=channels,
+            dpp_dump=self.postprocessing_dump_var.get(),
+            models=models,
+            enhanced_task=self.enhanced_mode_task_var.get() if self.use_enhanced_mode_var.get() else None,
+            enhanced_prompt=self.enhanced_mode_prompt_var.get(),
+        )
 
         # --- Build Request components ---
-        url = f"https://{self.region_var.get()}.api.cognitive.microsoft.com/speechtotext/transcriptions:transcribe?api-version={self.api_version_var.get()}"
-        headers = {
-            'Ocp-Apim-Subscription-Key': self.key_var.get()
-        }
-
         request_data = {
             'definition': json.dumps(definition)
         }
@@ -596,37 +727,190 @@ class CurlApp(tk.Tk):
             'definition': definition,
             'audio_file': audio_path
         }
+        return {
+            "function": "transcribe",
+            "method": "POST",
+            "data": request_data,
+            "audio_path": audio_path,
+            "form_data": log_form_data,
+        }
 
+    # --- Background request handling ---
+    # Jobs run on worker threads and must not touch Tk. Finished jobs are put on
+    # self._finished_jobs and picked up by _poll_jobs() on the main loop.
+
+    def _submit_job(self, job):
+        self.jobs[job.id] = job
+        self._pending_jobs.append(job)
+        self.jobs_tree.insert("", tk.END, iid=str(job.id), values=self._job_row(job))
+        self._display_job(job)
+        self._dispatch_pending_jobs()
+
+    def _submit_group(self, group):
+        group_iid = f"group-{group.id}"
+        self.groups[group.id] = group
+        self.jobs_tree.insert("", tk.END, iid=group_iid, open=True, values=self._group_row(group))
+        for job in group.jobs:
+            self.jobs[job.id] = job
+            self._pending_jobs.append(job)
+            self.jobs_tree.insert(group_iid, tk.END, iid=str(job.id), values=self._job_row(job))
+        self._display_group(group)
+        self._dispatch_pending_jobs()
+
+    def _dispatch_pending_jobs(self):
         try:
-            with open(audio_path, 'rb') as audio_file:
-                files = {
-                    'audio': (os.path.basename(audio_path), audio_file, 'audio/mpeg')
-                }
-
-                # Mask key for printing
-                masked_headers = headers.copy()
-                if 'Ocp-Apim-Subscription-Key' in masked_headers:
-                    masked_headers['Ocp-Apim-Subscription-Key'] = '********'
-
-                self.output_text.insert(tk.END, f"POST {url}\n")
-                self.output_text.insert(tk.END, f"Request Headers: {json.dumps(masked_headers, indent=2)}\n")
-                self.output_text.insert(tk.END, f"Form Data: {json.dumps(request_data, indent=2)}\n\n")
-
-                response = requests.post(url, headers=headers, data=request_data, files=files)
-                self._process_and_display_response(response, "POST", url, log_form_data)
-
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Request Error", f"An error occurred while sending the request:\n{e}")
-            self.output_text.insert(tk.END, f"\n\n--- Python Exception ---\n{e}")
-        except IOError as e:
-            messagebox.showerror("File Error", f"Could not open the audio file:\n{e}")
-            self.output_text.insert(tk.END, f"\n\n--- Python Exception ---\n{e}")
-        except Exception as e:
-            messagebox.showerror("An Unexpected Error Occurred", str(e))
-            self.output_text.insert(tk.END, f"\n\n--- Python Exception ---\n{e}")
+            limit = max(1, self.max_concurrent_var.get())
+        except tk.TclError: # Spinbox is empty or being edited
+            limit = 1
+        while self._pending_jobs:
+            job = self._pending_jobs[0]
+            # "Max Concurrent" throttles single requests; a comparison group goes out to all its regions at once, up to the executor size
+            job_limit = limit if job.group is None else self.MAX_WORKERS
+            if self._running_jobs >= job_limit:
+                break
+            self._pending_jobs.pop(0)
+            if job.cancel_event.is_set():
+                job.status = CANCELLED
+                self._on_job_finished(job)
+                continue
+            self._running_jobs += 1
+            future = self.executor.submit(job.execute, self.sessions)
+            future.add_done_callback(lambda _, job=job: self._finished_jobs.put(job))
+
+    def _poll_jobs(self):
+        try:
+            while True:
+                job = self._finished_jobs.get_nowait()
+                self._running_jobs -= 1
+                self._on_job_finished(job)
+        except queue.Empty:
+            pass
+        self._dispatch_pending_jobs()
+        # Refresh elapsed times of running jobs
+        for job in self.jobs.values():
+            if not job.is_finished and self.jobs_tree.exists(str(job.id)):
+                self.jobs_tree.item(str(job.id), values=self._job_row(job))
+        for group in self.groups.values():
+            if not group.is_finished and self.jobs_tree.exists(f"group-{group.id}"):
+                self.jobs_tree.item(f"group-{group.id}", values=self._group_row(group))
+        self._poll_after_id = self.after(self.JOB_POLL_INTERVAL_MS, self._poll_jobs)
+
+    def _on_job_finished(self, job):
+        if self.jobs_tree.exists(str(job.id)):
+            self.jobs_tree.item(str(job.id), values=self._job_row(job))
+        if job is self._displayed_job:
+            self._display_job(job)
+        if job.group is not None:
+            group_iid = f"group-{job.group.id}"
+            if self.jobs_tree.exists(group_iid):
+                self.jobs_tree.item(group_iid, values=self._group_row(job.group))
+            if job.group is self._displayed_job:
+                self._display_group(job.group)
+
+        if job.status == DONE:
+            response = job.response
+            self._log_request(job.method, job.url, job.form_data, response, response.text if response.text else "")
+            if job.group is not None:
+                return # Errors are summarized in the comparison report instead
+            try:
+                response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+            except requests.exceptions.RequestException as e:
+                messagebox.showerror("Request Error", f"An error occurred while sending the request:\n{e}")
+        elif job.status == FAILED and job.group is None:
+            e = job.error
+            if isinstance(e, requests.exceptions.RequestException):
+                messagebox.showerror("Request Error", f"An error occurred while sending the request:\n{e}")
+            elif isinstance(e, IOError):
+                messagebox.showerror("File Error", f"Could not open the audio file:\n{e}")
+            else:
+                messagebox.showerror("An Unexpected Error Occurred", str(e))
 
-    def _process_and_display_response(self, response, method, url, form_data):
+    def _job_row(self, job):
+        if job.status == DONE:
+            status = str(job.response.status_code)
+        elif job.status == RUNNING and job.bytes_total and job.bytes_sent < job.bytes_total:
+            status = f"uploading {job.bytes_sent * 100 // job.bytes_total}%"
+        else:
+            status = job.status
+        return (job.id, job.function, job.region, status, f"{job.elapsed:.1f}s")
+
+    def _group_row(self, group):
+        regions = f"{len(group.jobs)} regions"
+        elapsed = max(job.elapsed for job in group.jobs)
+        return (f"G{group.id}", group.function, regions, group.progress(), f"{elapsed:.1f}s")
+
+    def _item_for_iid(self, iid):
+        """Returns the RequestJob or RequestGroup shown in a jobs_tree row."""
+        if iid.startswith("group-"):
+            return self.groups.get(int(iid[len("group-"):]))
+        return self.jobs.get(int(iid))
+
+    def _on_job_selected(self, event=None):
+        selection = self.jobs_tree.selection()
+        if selection:
+            item = self._item_for_iid(selection[-1])
+            if item is None or item is self._displayed_job:
+                return
+            if isinstance(item, RequestGroup):
+                self._display_group(item)
+            else:
+                self._display_job(item)
+
+    def cancel_selected_jobs(self):
+        jobs = []
+        for iid in self.jobs_tree.selection():
+            item = self._item_for_iid(iid)
+            if isinstance(item, RequestGroup):
+                jobs.extend(item.jobs)
+            elif item is not None:
+                jobs.append(item)
+        for job in jobs:
+            if not job.is_finished:
+                job.cancel()
+                if job in self._pending_jobs:
+                    self._pending_jobs.remove(job)
+                    job.status = CANCELLED
+                    self._on_job_finished(job)
+
+    def clear_finished_jobs(self):
+        for job_id, job in list(self.jobs.items()):
+            if job.is_finished and job.group is None and job is not self._displayed_job:
+                del self.jobs[job_id]
+                self.jobs_tree.delete(str(job_id))
+        for group_id, group in list(self.groups.items()):
+            if group.is_finished and group is not self._displayed_job:
+                del self.groups[group_id]
+                for job in group.jobs:
+                    self.jobs.pop(job.id, None)
+                self.jobs_tree.delete(f"group-{group_id}")
+
+    def _display_group(self, group):
+        self._displayed_job = group
+        self._clear_output()
+        self.output_text.insert(tk.END, group.jobs[0].describe().replace(group.jobs[0].region, "{region}", 1))
+        self.output_text.insert(tk.END, f"--- Region Comparison ({group.progress()}) ---\n")
+        self.output_text.insert(tk.END, group.comparison_report())
+
+    def _display_job(self, job):
+        self._displayed_job = job
+        self._clear_output()
+        self.output_text.insert(tk.END, job.describe())
+        if job.status == QUEUED:
+            self.output_text.insert(tk.END, "Request queued...\n")
+        elif job.status == RUNNING:
+            self.output_text.insert(tk.END, "Sending request...\n")
+        elif job.status == CANCELLED:
+            self.output_text.insert(tk.END, "[Request cancelled]")
+        elif job.status == FAILED:
+            self.output_text.insert(tk.END, f"\n\n--- Python Exception ---\n{job.error}")
+        else:
+            self._process_and_display_response(job.response)
+
+    def _process_and_display_response(self, response):
         self.output_text.insert(tk.END, f"--- Response (Status: {response.status_code}) ---\n")
+        timings = getattr(response, "timings", None)
+        if timings is not None:
+            self.output_text.insert(tk.END, f"Timing: {timings}\n")
 
         # Print response headers
         self.output_text.insert(tk.END, "Response Headers:\n")
@@ -636,64 +920,35 @@ class CurlApp(tk.Tk):
 
         # Check if the response has content
         self.output_text.insert(tk.END, "Response Body:\n")
-        response_body_for_log = response.text if response.text else ""
         if response.text:
             try:
                 # Try to parse and pretty-print JSON
                 parsed_json = response.json()
                 formatted_json = json.dumps(parsed_json, indent=2, ensure_ascii=False)
                 self._highlight_json(formatted_json)
+                self.output_tree.set_data(parsed_json)
             except json.JSONDecodeError:
                 # If it's not JSON, just insert the raw text
                 self.output_text.insert(tk.END, response.text)
         else:
             self.output_text.insert(tk.END, "[No content in response]")
 
-        self._log_request(method, url, form_data, response, response_body_for_log)
-
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-
     def _log_request(self, method, url, form_data, response, response_body):
-        try:
-            directory = os.path.dirname(self.request_log_file)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory, exist_ok=True)
-
-            log_exists = os.path.exists(self.request_log_file)
-            fieldnames = [
-                "timestamp",
-                "method",
-                "endpoint",
-                "form_data",
-                "apim_request_id",
-                "date_header",
-                "status_code",
-                "response_body"
-            ]
-            if form_data is None:
-                form_data_str = ""
-            else:
-                try:
-                    form_data_str = json.dumps(form_data, ensure_ascii=False)
-                except (TypeError, ValueError):
-                    form_data_str = str(form_data)
-
-            with open(self.request_log_file, 'a', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                if not log_exists:
-                    writer.writeheader()
-                writer.writerow({
-                    "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
-                    "method": method,
-                    "endpoint": url,
-                    "form_data": form_data_str,
-                    "apim_request_id": response.headers.get('apim-request-id') or response.headers.get('Apim-Request-Id') or response.headers.get('apim_request_id'),
-                    "date_header": response.headers.get('Date'),
-                    "status_code": response.status_code,
-                    "response_body": response_body
-                })
-        except OSError as e:
-            self.output_text.insert(tk.END, f"\n[Warning] Failed to write request log: {e}\n")
+        timings = getattr(response, "timings", None)
+        self.history.record(
+            method,
+            url,
+            form_data,
+            response.status_code,
+            speech_api.apim_request_id(response.headers),
+            response.headers.get('Date'),
+            response_body,
+            total_ms=timings.as_dict()["total_ms"] if timings is not None else None,
+        )
+        # The writer runs in the background, so failures surface on the next request.
+        if self.history.error is not None:
+            self.output_text.insert(tk.END, f"\n[Warning] Failed to write request log: {self.history.error}\n")
+            self.history.error = None
 
 
 if __name__ == "__main__":
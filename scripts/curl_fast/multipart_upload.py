@@ -0,0 +1,123 @@
+"""
+Streaming multipart/form-data encoder for audio uploads.
+
+`requests.post(files=...)` builds the whole multipart body in memory before
+sending, which doubles RSS for multi-hundred-MB recordings and delays the
+first byte. MultipartUpload is a file-like body that requests sends as it is
+read: the form fields are encoded up front, the audio is read from disk in
+chunks (optionally through mmap), and the Content-Length is computed from the
+file size without buffering anything.
+"""
+import mmap
+import os
+import uuid
+
+import speech_api
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+class MultipartUpload:
+    """
+    A multipart/form-data body with text `fields` followed by one file part.
+
+    Pass it as `data=` together with `headers={'Content-Type': upload.content_type}`.
+    `progress_callback(bytes_sent, total_bytes)` is called after every chunk;
+    an exception raised from it aborts the upload.
+    """
+
+    def __init__(self, fields, file_field, file_path, file_content_type=None,
+                 progress_callback=None, use_mmap=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.progress_callback = progress_callback
+        self.chunk_size = chunk_size
+
+        file_content_type = file_content_type or speech_api.audio_content_type(file_path)
+        preamble = b"".join(self._field_part(name, value) for name, value in fields.items())
+        preamble += (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{file_field}\"; filename=\"{_quote(os.path.basename(file_path))}\"\r\n"
+            f"Content-Type: {file_content_type}\r\n\r\n"
+        ).encode("utf-8")
+        epilogue = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._file = open(file_path, 'rb')
+        self._file_size = os.fstat(self._file.fileno()).st_size
+        self._mmap = None
+        if use_mmap and self._file_size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._preamble = preamble
+        self._epilogue = epilogue
+        self._total = len(preamble) + self._file_size + len(epilogue)
+        self._position = 0
+
+    def _field_part(self, name, value):
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{_quote(name)}\"\r\n\r\n"
+            f"{value}\r\n"
+        ).encode("utf-8")
+
+    def __len__(self):
+        return self._total
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._total - self._position
+        size = min(size, self._total - self._position)
+        if size <= 0:
+            return b""
+
+        chunks = []
+        remaining = size
+        position = self._position
+        file_start = len(self._preamble)
+        file_end = file_start + self._file_size
+        while remaining > 0:
+            if position < file_start:
+                chunk = self._preamble[position:position + remaining]
+            elif position < file_end:
+                offset = position - file_start
+                if self._mmap is not None:
+                    chunk = self._mmap[offset:offset + remaining]
+                else:
+                    self._file.seek(offset)
+                    chunk = self._file.read(min(remaining, file_end - position))
+                if not chunk:
+                    raise IOError(f"Audio file '{self._file.name}' was truncated during upload.")
+            else:
+                offset = position - file_end
+                chunk = self._epilogue[offset:offset + remaining]
+            chunks.append(chunk)
+            position += len(chunk)
+            remaining -= len(chunk)
+
+        self._position = position
+        if self.progress_callback is not None:
+            self.progress_callback(self._position, self._total)
+        return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _quote(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
@@ -0,0 +1,350 @@
+"""
+Indexed request history for the cURL GUI.
+
+Requests are stored in a SQLite database in WAL mode. Rows are written in
+batches by a background thread, so logging never blocks the UI, and response
+bodies are zlib-compressed in a separate table so scans over the indexed
+columns (timestamp, region, endpoint, status, apim-request-id) stay fast.
+
+Run this file directly to query the history, e.g. all 5xx responses from
+eastus in the last week:
+
+    python request_history.py --status 5xx --region eastus --since 7d
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+DEFAULT_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "request_history.db")
+LEGACY_CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "request_history.csv")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    method TEXT,
+    endpoint TEXT,
+    region TEXT,
+    form_data TEXT,
+    apim_request_id TEXT,
+    date_header TEXT,
+    status_code INTEGER,
+    total_ms REAL,
+    body_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS response_bodies (
+    request_id INTEGER PRIMARY KEY REFERENCES requests(id),
+    body BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests(timestamp);
+CREATE INDEX IF NOT EXISTS idx_requests_region_timestamp ON requests(region, timestamp);
+CREATE INDEX IF NOT EXISTS idx_requests_endpoint ON requests(endpoint);
+CREATE INDEX IF NOT EXISTS idx_requests_status_timestamp ON requests(status_code, timestamp);
+CREATE INDEX IF NOT EXISTS idx_requests_apim_request_id ON requests(apim_request_id);
+"""
+
+_STOP = object()
+
+
+def region_from_endpoint(url):
+    """Returns 'eastus' for 'https://eastus.api.cognitive.microsoft.com/...', else the host."""
+    host = urlsplit(url).hostname or ""
+    if host.endswith(".api.cognitive.microsoft.com"):
+        return host.split(".", 1)[0]
+    return host
+
+
+def _connect(db_path):
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _insert(conn, record):
+    body = record.pop("response_body", None) or ""
+    body_bytes = body.encode("utf-8")
+    record["body_size"] = len(body_bytes)
+    cursor = conn.execute(
+        "INSERT INTO requests (timestamp, method, endpoint, region, form_data, apim_request_id,"
+        " date_header, status_code, total_ms, body_size)"
+        " VALUES (:timestamp, :method, :endpoint, :region, :form_data, :apim_request_id,"
+        " :date_header, :status_code, :total_ms, :body_size)",
+        record
+    )
+    if body_bytes:
+        conn.execute(
+            "INSERT INTO response_bodies (request_id, body) VALUES (?, ?)",
+            (cursor.lastrowid, zlib.compress(body_bytes))
+        )
+
+
+class RequestHistory:
+    """
+    Appends request records to the history database from a background thread.
+
+    `record()` only enqueues; the writer commits everything queued so far in
+    one transaction, so bursts of requests cost a single fsync.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_FILE, max_batch=200):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.error = None # Last write error, reported by the caller
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run_writer, name="request-history", daemon=True)
+        self._thread.start()
+
+    def record(self, method, endpoint, form_data, status_code, apim_request_id, date_header,
+               response_body, total_ms=None):
+        if form_data is None:
+            form_data_str = ""
+        else:
+            try:
+                form_data_str = json.dumps(form_data, ensure_ascii=False)
+            except (TypeError, ValueError):
+                form_data_str = str(form_data)
+        self._queue.put({
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "method": method,
+            "endpoint": endpoint,
+            "region": region_from_endpoint(endpoint),
+            "form_data": form_data_str,
+            "apim_request_id": apim_request_id,
+            "date_header": date_header,
+            "status_code": status_code,
+            "total_ms": total_ms,
+            "response_body": response_body,
+        })
+
+    def close(self, timeout=5):
+        """Flushes pending records and stops the writer."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run_writer(self):
+        try:
+            conn = _connect(self.db_path)
+        except sqlite3.Error as e:
+            self.error = e
+            return
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = _STOP in batch
+                records = [record for record in batch if record is not _STOP]
+                if records:
+                    try:
+                        with conn:
+                            for record in records:
+                                _insert(conn, record)
+                    except sqlite3.Error as e:
+                        self.error = e
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+
+# A CSV row that is already in the database, e.g. because the file was imported before
+_IMPORTED_QUERY = (
+    "SELECT 1 FROM requests WHERE timestamp IS :timestamp AND method IS :method AND endpoint IS :endpoint"
+    " AND apim_request_id IS :apim_request_id AND date_header IS :date_header AND status_code IS :status_code LIMIT 1"
+)
+
+
+def import_csv(csv_path, db_path=DEFAULT_DB_FILE):
+    """
+    Imports a legacy request_history.csv into the database. Rows already in it are skipped, so importing the
+    same (or a since appended) file again is safe. Returns the number of rows imported.
+    """
+    conn = _connect(db_path)
+    count = 0
+    try:
+        with open(csv_path, newline='', encoding='utf-8') as f, conn:
+            for row in csv.DictReader(f):
+                try:
+                    status_code = int(row.get("status_code") or 0) or None
+                except ValueError:
+                    status_code = None
+                record = {
+                    "timestamp": row.get("timestamp"),
+                    "method": row.get("method"),
+                    "endpoint": row.get("endpoint"),
+                    "region": region_from_endpoint(row.get("endpoint") or ""),
+                    "form_data": row.get("form_data"),
+                    "apim_request_id": row.get("apim_request_id") or None,
+                    "date_header": row.get("date_header"),
+                    "status_code": status_code,
+                    "total_ms": None,
+                    "response_body": row.get("response_body"),
+                }
+                if conn.execute(_IMPORTED_QUERY, record).fetchone() is not None:
+                    continue
+                _insert(conn, record)
+                count += 1
+    finally:
+        conn.close()
+    return count
+
+
+def _parse_since(value):
+    """Accepts durations like '7d', '12h', '30m' or an ISO date/time; returns an ISO UTC timestamp."""
+    match = re.fullmatch(r"(\d+)([dhm])", value)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        delta = {"d": timedelta(days=amount), "h": timedelta(hours=amount), "m": timedelta(minutes=amount)}[unit]
+        since = datetime.now(timezone.utc) - delta
+    else:
+        since = datetime.fromisoformat(value)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+    return since.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+
+def _status_clause(value):
+    """'5xx' -> a range over status_code, '404' -> equality."""
+    match = re.fullmatch(r"([1-5])xx", value.lower())
+    if match:
+        low = int(match.group(1)) * 100
+        return "status_code BETWEEN ? AND ?", [low, low + 99]
+    return "status_code = ?", [int(value)]
+
+
+def query(db_path=DEFAULT_DB_FILE, status=None, region=None, endpoint=None, apim_request_id=None,
+          since=None, until=None, limit=100):
+    """Returns matching rows (newest first) as dicts, without response bodies."""
+    clauses, params = [], []
+    if status:
+        clause, values = _status_clause(status)
+        clauses.append(clause)
+        params.extend(values)
+    if region:
+        clauses.append("region = ?")
+        params.append(region)
+    if endpoint:
+        clauses.append("endpoint LIKE ?")
+        params.append(f"%{endpoint}%")
+    if apim_request_id:
+        clauses.append("apim_request_id = ?")
+        params.append(apim_request_id)
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(_parse_since(since))
+    if until:
+        clauses.append("timestamp < ?")
+        params.append(_parse_since(until))
+    sql = "SELECT id, timestamp, method, region, status_code, total_ms, body_size, apim_request_id, endpoint FROM requests"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def get_request(request_id, db_path=DEFAULT_DB_FILE):
+    """Returns one full record, including the decompressed response body, or None."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(
+            "SELECT r.*, b.body FROM requests r LEFT JOIN response_bodies b ON b.request_id = r.id WHERE r.id = ?",
+            (request_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    record = dict(row)
+    body = record.pop("body")
+    record["response_body"] = zlib.decompress(body).decode("utf-8") if body else ""
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the request history recorded by the cURL GUI."
+    )
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="History database. Defaults to %(default)s.")
+    parser.add_argument("-s", "--status", help="Status code or class, e.g. 429 or 5xx.")
+    parser.add_argument("-r", "--region", help="Region, e.g. eastus.")
+    parser.add_argument("-e", "--endpoint", help="Substring of the endpoint URL.")
+    parser.add_argument("-i", "--apim-request-id", help="Exact apim-request-id.")
+    parser.add_argument("--since", help="Only requests newer than this, e.g. 7d, 12h or 2025-01-31.")
+    parser.add_argument("--until", help="Only requests older than this.")
+    parser.add_argument("-n", "--limit", type=int, default=100, help="Maximum rows to print. Defaults to %(default)s.")
+    parser.add_argument("--show", type=int, metavar="ID", help="Print one request in full, including the response body.")
+    parser.add_argument(
+        "--import-csv",
+        nargs="?",
+        const=LEGACY_CSV_FILE,
+        metavar="CSV",
+        help="Import a legacy request_history.csv (default: %(const)s)."
+    )
+    args = parser.parse_args()
+
+    if args.import_csv:
+        if not os.path.exists(args.import_csv):
+            print(f"Error: CSV file not found at {args.import_csv}", file=sys.stderr)
+            sys.exit(1)
+        count = import_csv(args.import_csv, args.db)
+        print(f"Imported {count} new request(s) into '{args.db}'.")
+        return
+
+    if not os.path.exists(args.db):
+        print(f"Error: History database not found at {args.db}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.show is not None:
+        record = get_request(args.show, args.db)
+        if record is None:
+            print(f"Error: No request with id {args.show}.", file=sys.stderr)
+            sys.exit(1)
+        body = record.pop("response_body")
+        print(json.dumps(record, indent=2, ensure_ascii=False))
+        print("\nResponse Body:")
+        try:
+            print(json.dumps(json.loads(body), indent=2, ensure_ascii=False))
+        except ValueError:
+            print(body)
+        return
+
+    try:
+        rows = query(args.db, args.status, args.region, args.endpoint, args.apim_request_id,
+                     args.since, args.until, args.limit)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for row in rows:
+        total_ms = f"{row['total_ms']:.0f}ms" if row["total_ms"] is not None else "-"
+        print(f"{row['id']:>6}  {row['timestamp']}  {row['method'] or '':<4}  {row['region'] or '':<18}"
+              f"  {row['status_code'] or '-':<4}  {total_ms:>8}  {row['body_size']:>9}B  {row['apim_request_id'] or '-'}")
+    print(f"\n{len(rows)} request(s).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
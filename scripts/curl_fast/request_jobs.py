@@ -0,0 +1,220 @@
+"""
+Background execution of GUI requests.
+
+A RequestJob is built on the Tk thread from the form, then executed on a
+worker thread. Workers never touch Tk widgets: CurlApp polls completed jobs
+from a queue with `after()` and renders them on the main loop.
+"""
+import difflib
+import itertools
+import json
+import threading
+import time
+
+import speech_api
+from multipart_upload import MultipartUpload
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Response bodies are read in chunks so an in-flight download can be cancelled.
+RESPONSE_CHUNK_SIZE = 64 * 1024
+# Gateway header carrying the backend processing time in milliseconds.
+SERVER_TIME_HEADER = "x-envoy-upstream-service-time"
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class RequestJob:
+    """A single request submitted from the GUI and its outcome."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, function, region, method, url, headers, data=None, audio_path=None, form_data=None):
+        self.id = next(self._ids)
+        self.function = function
+        self.region = region
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.audio_path = audio_path
+        self.form_data = form_data
+
+        self.status = QUEUED
+        self.cancel_event = threading.Event()
+        self.response = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.bytes_sent = 0 # Upload progress of the request body
+        self.bytes_total = 0
+        self.group = None # RequestGroup when sent to several regions at once
+
+    @property
+    def is_finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def describe(self):
+        """Returns the request preamble shown above the response."""
+        lines = [
+            f"{self.method} {self.url}",
+            f"Request Headers: {json.dumps(speech_api.mask_headers(self.headers), indent=2)}",
+        ]
+        if self.data is not None:
+            lines.append(f"Form Data: {json.dumps(self.data, indent=2)}")
+        return "\n".join(lines) + "\n\n"
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise RequestCancelled()
+
+    def execute(self, sessions):
+        """
+        Sends the request through the SessionManager `sessions`. Runs on a
+        worker thread; sets `status` and either `response` or `error`. Never raises.
+        """
+        self.started_at = time.perf_counter()
+        self.status = RUNNING
+        try:
+            self._check_cancelled()
+            self.response = self._send(sessions)
+            self.status = DONE
+        except RequestCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.error = e
+            self.status = FAILED
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def _on_upload_progress(self, bytes_sent, bytes_total):
+        self.bytes_sent = bytes_sent
+        self.bytes_total = bytes_total
+        # Raising here aborts the upload mid-body.
+        self._check_cancelled()
+
+    def _send(self, sessions):
+        if self.audio_path:
+            with MultipartUpload(self.data, 'audio', self.audio_path,
+                                 progress_callback=self._on_upload_progress,
+                                 use_mmap=True) as upload:
+                self.bytes_total = len(upload)
+                headers = dict(self.headers, **{'Content-Type': upload.content_type})
+                response = sessions.request(self.method, self.url, headers=headers,
+                                            data=upload, stream=True)
+        else:
+            response = sessions.request(self.method, self.url, headers=self.headers, stream=True)
+
+        try:
+            chunks = []
+            for chunk in response.iter_content(RESPONSE_CHUNK_SIZE):
+                self._check_cancelled()
+                chunks.append(chunk)
+        finally:
+            response.close()
+        # Hand the buffered body back to requests so .text/.json() work as usual.
+        response._content = b"".join(chunks)
+        response.timings.finish()
+        return response
+
+
+class RequestGroup:
+    """The same request sent to several regions, for comparing them side by side."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, jobs):
+        self.id = next(self._ids)
+        self.jobs = list(jobs)
+        for job in self.jobs:
+            job.group = self
+
+    @property
+    def function(self):
+        return self.jobs[0].function
+
+    @property
+    def is_finished(self):
+        return all(job.is_finished for job in self.jobs)
+
+    def progress(self):
+        finished = sum(job.is_finished for job in self.jobs)
+        return f"{finished}/{len(self.jobs)} done"
+
+    def comparison_report(self):
+        """
+        Returns a text table of status, server-side processing time and
+        end-to-end latency per region, followed by a diff of every response
+        body against the first successful one.
+        """
+        header = ("Region", "Status", "Server (ms)", "End-to-end (ms)", "Body")
+        baseline = next((job for job in self.jobs if _is_success(job)), None)
+        baseline_lines = _normalized_body(baseline) if baseline else None
+
+        rows = []
+        diffs = []
+        for job in self.jobs:
+            if job.status == DONE:
+                status = str(job.response.status_code)
+                server_time = job.response.headers.get(SERVER_TIME_HEADER, "-")
+                latency = f"{job.elapsed * 1000:.0f}"
+            else:
+                status = job.status
+                server_time = latency = "-"
+
+            if not job.is_finished or job.status != DONE or baseline is None:
+                body = "-"
+            elif job is baseline:
+                body = "baseline"
+            else:
+                diff = list(difflib.unified_diff(
+                    baseline_lines, _normalized_body(job),
+                    fromfile=baseline.region, tofile=job.region, lineterm=""
+                ))
+                if diff:
+                    changed = sum(1 for line in diff[2:] if line[:1] in "+-")
+                    body = f"differs ({changed} lines)"
+                    diffs.append("\n".join(diff))
+                else:
+                    body = "same"
+            rows.append((job.region, status, server_time, latency, body))
+
+        widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+        lines = ["  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
+                 for row in [header, tuple("-" * width for width in widths)] + rows]
+        report = "\n".join(lines) + "\n"
+        if not self.is_finished:
+            report += f"\n[{self.progress()}, waiting for the remaining regions...]\n"
+        for diff in diffs:
+            report += "\n" + diff + "\n"
+        return report
+
+
+def _is_success(job):
+    return job.status == DONE and 200 <= job.response.status_code < 300
+
+
+def _normalized_body(job):
+    """Pretty-prints a JSON body with sorted keys so only real differences show up in the diff."""
+    text = job.response.text
+    try:
+        text = json.dumps(job.response.json(), indent=2, sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        pass
+    return text.splitlines()
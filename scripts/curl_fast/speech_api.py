@@ -0,0 +1,126 @@
+"""
+Request-building helpers for the Speech-to-Text fast transcription API.
+
+Shared by the Tk GUI (main.py) and the headless batch runner
+(batch_transcribe.py) so both send exactly the same requests.
+"""
+import json
+import mimetypes
+import os
+
+SUBSCRIPTION_KEY_HEADER = "Ocp-Apim-Subscription-Key"
+REGION_HOST_TEMPLATE = "https://{region}.api.cognitive.microsoft.com"
+# mimetypes does not know most audio containers on Windows, so map them explicitly.
+AUDIO_CONTENT_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".wma": "audio/x-ms-wma",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".webm": "audio/webm",
+}
+
+
+def region_base_url(region, base_url=None):
+    """
+    Returns the scheme+host for a region. `base_url` overrides the public
+    endpoint (e.g. a local stub server); it may contain a `{region}` field.
+    """
+    template = base_url or REGION_HOST_TEMPLATE
+    return template.format(region=region).rstrip("/")
+
+
+def transcribe_url(region, api_version, base_url=None):
+    return f"{region_base_url(region, base_url)}/speechtotext/transcriptions:transcribe?api-version={api_version}"
+
+
+def locales_url(region, api_version, base_url=None):
+    return f"{region_base_url(region, base_url)}/speechtotext/transcriptions/locales?api-version={api_version}"
+
+
+def audio_content_type(path):
+    """Returns the MIME type to send for an audio file, based on its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in AUDIO_CONTENT_TYPES:
+        return AUDIO_CONTENT_TYPES[extension]
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def auth_headers(key):
+    return {SUBSCRIPTION_KEY_HEADER: key}
+
+
+def mask_headers(headers):
+    """Returns a copy of the headers that is safe to print or log."""
+    masked_headers = dict(headers)
+    if SUBSCRIPTION_KEY_HEADER in masked_headers:
+        masked_headers[SUBSCRIPTION_KEY_HEADER] = '********'
+    return masked_headers
+
+
+def parse_locales(locales_str):
+    """Parses a comma-separated string of locales."""
+    return [locale.strip() for locale in locales_str.split(',') if locale.strip()]
+
+
+def parse_models(model_json_str):
+    """
+    Parses the custom model definition. Raises json.JSONDecodeError if it is
+    not a non-empty JSON object.
+    """
+    models = json.loads(model_json_str)
+    if not isinstance(models, dict) or not models:
+        raise json.JSONDecodeError("Input must be a non-empty JSON object.", model_json_str, 0)
+    return models
+
+
+def build_definition(locales, max_speakers=None, channels=None, dpp_dump=False,
+                     models=None, enhanced_task=None, enhanced_prompt=None):
+    """
+    Builds the `definition` form field of a transcribe request.
+
+    `max_speakers` enables diarization, `enhanced_task` enables enhanced mode.
+    Channels are only sent when they differ from the service default ([0]).
+    """
+    definition = {
+        "locales": list(locales)
+    }
+    if max_speakers:
+        definition["diarization"] = {
+            "enabled": True,
+            "maxSpeakers": max_speakers
+        }
+
+    # Only add the key if channels are selected and the selection is not the default ([0])
+    if channels and list(channels) != [0]:
+        definition["channels"] = list(channels)
+
+    # Handle custom properties
+    custom_properties = {}
+    if dpp_dump:
+        custom_properties["isBatchDisplayPostprocessingDataDumpEnabled"] = "true"
+
+    if custom_properties:
+        definition["customProperties"] = custom_properties
+
+    if models:
+        definition["models"] = models
+
+    if enhanced_task:
+        enhanced_mode = {
+            "enabled": True,
+            "task": enhanced_task
+        }
+        prompt = (enhanced_prompt or "").strip()
+        if prompt:
+            enhanced_mode["prompt"] = [prompt]
+        definition["enhancedMode"] = enhanced_mode
+
+    return definition
+
+
+def apim_request_id(headers):
+    return headers.get('apim-request-id') or headers.get('Apim-Request-Id') or headers.get('apim_request_id')
@@ -0,0 +1,116 @@
+"""
+Benchmarks manifest loading: the pure-Python loader, libyaml, and the
+parsed-manifest cache (cold = cache miss, warm = cache hit), both in-process
+and as whole `process_regions.py` CLI runs.
+
+By default a synthetic manifest with --regions regions is generated in a
+temporary directory; pass a file to measure a real manifest instead (its
+cache directory is left in place).
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+
+import manifest_loader
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def generate_manifest(path, region_count, stage_count=20, clusters_per_region=3):
+    types = ["batch", "batch+aoaiwhisper"]
+    per_stage = max(1, region_count // stage_count)
+    data = []
+    for s in range(stage_count):
+        regions = []
+        for r in range(per_stage):
+            regions.append({
+                "name": f"Region{s}x{r}",
+                "clusters": [
+                    {
+                        "name": f"speech1b-a10-s{s}r{r}c{c}",
+                        "config": f"speech1b-ame-region{s}x{r}-v10",
+                        "type": types[(r + c) % len(types)],
+                    }
+                    for c in range(clusters_per_region)
+                ],
+            })
+        data.append({"stage": f"Stage{s}", "regions": regions})
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(manifest_loader.dump_yaml(data))
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def clear_cache(path):
+    shutil.rmtree(os.path.join(os.path.dirname(os.path.abspath(path)), manifest_loader.CACHE_DIR_NAME),
+                  ignore_errors=True)
+
+
+def run_cli(path, *extra):
+    subprocess.run(
+        [sys.executable, os.path.join(SCRIPT_DIR, "process_regions.py"), path, "-r", "none", *extra],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark manifest loading and the parsed-manifest cache.")
+    parser.add_argument("input_file", nargs="?", help="Manifest to load. Defaults to a generated one.")
+    parser.add_argument("--regions", type=int, default=5000, help="Regions in the generated manifest (default: %(default)s).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported (default: %(default)s).")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.input_file:
+        path = args.input_file
+    else:
+        temp_dir = tempfile.mkdtemp(prefix="region_filter_bench_")
+        path = os.path.join(temp_dir, "release_regions.yaml")
+        generate_manifest(path, args.regions)
+
+    try:
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"Manifest: {path} ({size_mb:.1f} MB), libyaml: {'yes' if yaml.__with_libyaml__ else 'no'}")
+
+        def cold():
+            clear_cache(path)
+            manifest_loader.load_manifest(path)
+
+        def pure_python():
+            with open(path, 'rb') as f:
+                yaml.load(f.read(), Loader=yaml.SafeLoader)
+
+        results = [
+            ("yaml.safe_load (pure Python)", best_of(args.repeat, pure_python)),
+            ("CSafeLoader, no cache", best_of(args.repeat, lambda: manifest_loader.load_manifest(path, use_cache=False))),
+            ("load_manifest, cold cache", best_of(args.repeat, cold)),
+        ]
+        manifest_loader.load_manifest(path)
+        results.append(("load_manifest, warm cache", best_of(args.repeat, lambda: manifest_loader.load_manifest(path))))
+
+        results.append(("CLI run, --no-cache", best_of(args.repeat, lambda: run_cli(path, "--no-cache"))))
+        run_cli(path)
+        results.append(("CLI run, warm cache", best_of(args.repeat, lambda: run_cli(path))))
+
+        baseline = results[0][1]
+        for label, seconds in results:
+            print(f"  {label:<30} {seconds * 1000:9.1f} ms  {baseline / seconds:6.1f}x")
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
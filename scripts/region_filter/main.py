@@ -1,8 +1,18 @@
 import tkinter as tk
 from tkinter import scrolledtext, filedialog, messagebox
-import yaml
 import os
-from process_regions import filter_regions_by_short_name
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from manifest_loader import load_manifest
+from region_index import RegionIndex
+from region_output import YamlFragments
+from region_query import Query
+
+# Wait this long after the last keystroke before filtering.
+FILTER_DEBOUNCE_MS = 150
+# How often to check for a finished filter while one is running.
+FILTER_POLL_MS = 15
 
 try:
     from ctypes import windll
@@ -16,8 +26,21 @@ class RegionFilterApp(tk.Tk):
         self.title("Region Filter")
 
         self.data = None
+        self.index = None # RegionIndex of self.data, rebuilt when a file is loaded
+        self.fragments = None # YamlFragments of self.index, warmed in the background
         self.input_file_path = ""
 
+        # Filtering runs on one worker thread so typing never waits for it.
+        # Each filter gets a generation number; results of superseded ones are dropped.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="region-filter")
+        self._filter_results = queue.Queue()
+        self._filter_generation = 0
+        self._filters_in_flight = 0
+        self._filter_after_id = None
+        self._poll_after_id = None
+        self._last_filter = None # (index, query text) of the last filter started
+        self._displayed_output = None
+
         # Top frame for file selection
         top_frame = tk.Frame(self)
         top_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -36,10 +59,12 @@ class RegionFilterApp(tk.Tk):
         region_frame = tk.Frame(self)
         region_frame.pack(fill=tk.X, padx=10, pady=5)
 
-        tk.Label(region_frame, text="Regions (comma-separated):").pack(side=tk.LEFT)
-        self.region_entry = tk.Entry(region_frame, width=50)
+        tk.Label(region_frame, text="Regions (e.g. use2,uswc or type=batch stage~Stage4*):").pack(side=tk.LEFT)
+        self.query_var = tk.StringVar()
+        self.region_entry = tk.Entry(region_frame, textvariable=self.query_var, width=50)
         self.region_entry.pack(side=tk.LEFT, expand=True, fill=tk.X)
         self.region_entry.bind('<Return>', lambda event: self.filter_and_display())
+        self.query_var.trace_add("write", self._on_query_changed)
 
         self.filter_button = tk.Button(region_frame, text="Filter", command=self.filter_and_display)
         self.filter_button.pack(side=tk.LEFT, padx=5)
@@ -56,6 +81,7 @@ class RegionFilterApp(tk.Tk):
         self.status_bar = tk.Label(self, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.load_default_file()
 
     def load_default_file(self):
@@ -74,11 +100,15 @@ class RegionFilterApp(tk.Tk):
 
     def load_file(self, file_path):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.data = yaml.safe_load(f)
+            self.data = load_manifest(file_path)
+            self.index = RegionIndex(self.data)
+            self.fragments = YamlFragments(self.index)
+            # Serialize every region up front; queued filters run once this is done
+            self.executor.submit(self.fragments.warm)
             self.input_file_path = file_path
             self.file_path_var.set(self.input_file_path)
             self.status_var.set(f"Loaded: {os.path.basename(self.input_file_path)}")
+            self._start_filter() # Refresh the output for the new file
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load or parse file: {e}")
             self.status_var.set("Error loading file.")
@@ -88,28 +118,99 @@ class RegionFilterApp(tk.Tk):
             messagebox.showwarning("Warning", "No data loaded. Please select a file first.")
             return
 
-        regions_str = self.region_entry.get()
-        if not regions_str:
-            messagebox.showwarning("Warning", "Please enter region short names.")
+        if not self.query_var.get().strip():
+            messagebox.showwarning("Warning", "Please enter region short names or a query.")
             return
 
-        regions_to_keep = [region.strip() for region in regions_str.split(',')]
+        self._start_filter(interactive=True)
 
-        filtered_data = filter_regions_by_short_name(self.data, regions_to_keep)
+    def _on_query_changed(self, *args):
+        if self._filter_after_id is not None:
+            self.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.after(FILTER_DEBOUNCE_MS, self._start_filter)
 
-        self.output_text.delete(1.0, tk.END)
-        if filtered_data:
+    def _start_filter(self, interactive=False):
+        """Filters with the current query on the worker thread. Errors only pop up if `interactive`."""
+        if self._filter_after_id is not None:
+            self.after_cancel(self._filter_after_id)
+            self._filter_after_id = None
+        if self.index is None:
+            return
+
+        query_text = self.query_var.get().strip()
+        if (self.index, query_text) == self._last_filter and not interactive:
+            return
+        self._last_filter = (self.index, query_text)
+        self._filter_generation += 1
+        if not query_text:
+            self._show_output("")
+            self.status_var.set(f"Loaded: {os.path.basename(self.input_file_path)}")
+            return
+
+        self._filters_in_flight += 1
+        self.executor.submit(self._compute_filter, self._filter_generation, self.index, self.fragments,
+                             query_text, interactive)
+        if self._poll_after_id is None:
+            self._poll_after_id = self.after(FILTER_POLL_MS, self._poll_filter_results)
+
+    def _compute_filter(self, generation, index, fragments, query_text, interactive):
+        """Runs on the worker thread; always posts exactly one result."""
+        result = {"generation": generation, "query": query_text, "interactive": interactive}
+        # Skip work for queries that were superseded while queued
+        if generation == self._filter_generation:
+            start = time.perf_counter()
             try:
-                yaml_output = yaml.dump(filtered_data, sort_keys=False, indent=2)
-                clean_output = yaml_output.rstrip() + '\n'
-                self.output_text.insert(tk.END, clean_output)
-                self.status_var.set(f"Filtered by: {regions_str}")
+                region_ids = Query(query_text).region_ids(index)
+                result["output"] = fragments.render(region_ids)
+                result["count"] = len(region_ids)
+            except ValueError as e:
+                result["query_error"] = e
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to generate YAML output: {e}")
-                self.status_var.set("Error generating output.")
+                result["error"] = e
+            result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        self._filter_results.put(result)
+
+    def _poll_filter_results(self):
+        self._poll_after_id = None
+        latest = None
+        while True:
+            try:
+                result = self._filter_results.get_nowait()
+            except queue.Empty:
+                break
+            self._filters_in_flight -= 1
+            if result["generation"] == self._filter_generation:
+                latest = result
+        if latest is not None:
+            self._display_filter_result(latest)
+        if self._filters_in_flight:
+            self._poll_after_id = self.after(FILTER_POLL_MS, self._poll_filter_results)
+
+    def _display_filter_result(self, result):
+        query_text = result["query"]
+        if "query_error" in result:
+            # Half-typed queries are common; only interrupt the user when they asked to filter
+            if result["interactive"]:
+                messagebox.showerror("Error", f"Invalid query: {result['query_error']}")
+            self.status_var.set(f"Invalid query: {result['query_error']}")
+        elif "error" in result:
+            if result["interactive"]:
+                messagebox.showerror("Error", f"Failed to generate YAML output: {result['error']}")
+            self.status_var.set("Error generating output.")
+        elif result["count"]:
+            self._show_output(result["output"].rstrip() + '\n')
+            self.status_var.set(f"Filtered by: {query_text} ({result['count']} region(s), {result['elapsed_ms']:.0f} ms)")
         else:
-            self.output_text.insert(tk.END, "# No matching regions found.")
-            self.status_var.set(f"No results for: {regions_str}")
+            self._show_output("# No matching regions found.")
+            self.status_var.set(f"No results for: {query_text}")
+
+    def _show_output(self, text):
+        if text == self._displayed_output:
+            return
+        self._displayed_output = text
+        self.output_text.delete(1.0, tk.END)
+        self.output_text.insert(tk.END, text)
+
     def copy_to_clipboard(self):
         text_to_copy = self.output_text.get(1.0, tk.END)
         # Ensure there is exactly one trailing newline
@@ -121,6 +222,12 @@ class RegionFilterApp(tk.Tk):
         else:
             self.status_var.set("Nothing to copy.")
 
+    def on_closing(self):
+        if self._poll_after_id is not None:
+            self.after_cancel(self._poll_after_id)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
 if __name__ == "__main__":
     app = RegionFilterApp()
     app.mainloop()
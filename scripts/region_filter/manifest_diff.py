@@ -0,0 +1,170 @@
+"""
+Structural diff and merge of release manifests.
+
+Regions are keyed by name and clusters by name within their region, so two
+manifests are compared with dict lookups in time linear in their size,
+regardless of how regions were reordered or moved between stages.
+"""
+import json
+
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+CHANGED = "changed"
+CLUSTER_ADDED = "cluster added"
+CLUSTER_REMOVED = "cluster removed"
+CLUSTER_CHANGED = "cluster changed"
+
+
+def _name(item):
+    name = item.get('name')
+    return "" if name is None else str(name)
+
+
+def _keyed(items):
+    """{name: item}; repeated names get a '#2', '#3', ... suffix so no item is lost."""
+    keyed = {}
+    for item in items:
+        key = _name(item)
+        if key in keyed:
+            n = 2
+            while f"{key}#{n}" in keyed:
+                n += 1
+            key = f"{key}#{n}"
+        keyed[key] = item
+    return keyed
+
+
+def _clusters(region):
+    clusters = region.get('clusters')
+    return [c for c in clusters if isinstance(c, dict)] if isinstance(clusters, list) else []
+
+
+def keyed_regions(index):
+    """{region name: (stage name, region dict)} in manifest order."""
+    stage_of = {}
+    for stage_index, region in index.regions:
+        stage_of[id(region)] = index.data[stage_index].get('stage')
+    return {key: (stage_of[id(region)], region) for key, region in _keyed(r for _, r in index.regions).items()}
+
+
+def _field_changes(old, new, skip):
+    """Yields (field, old value, new value) for differing keys, in the new item's key order."""
+    for field in list(new) + [f for f in old if f not in new]:
+        if field in skip:
+            continue
+        if old.get(field) != new.get(field):
+            yield field, old.get(field), new.get(field)
+
+
+def diff_manifests(old_index, new_index):
+    """
+    Returns a list of change dicts with a 'change' kind (added, removed, moved,
+    changed, cluster added/removed/changed), the 'region' and its 'stage', plus
+    'from_stage', 'cluster', 'field', 'old' and 'new' where relevant.
+    """
+    old_regions = keyed_regions(old_index)
+    new_regions = keyed_regions(new_index)
+    changes = []
+
+    for name, (old_stage, _) in old_regions.items():
+        if name not in new_regions:
+            changes.append({"change": REMOVED, "region": name, "stage": old_stage})
+
+    for name, (stage, region) in new_regions.items():
+        if name not in old_regions:
+            changes.append({"change": ADDED, "region": name, "stage": stage})
+            continue
+        old_stage, old_region = old_regions[name]
+        if old_stage != stage:
+            changes.append({"change": MOVED, "region": name, "stage": stage, "from_stage": old_stage})
+        for field, old_value, new_value in _field_changes(old_region, region, ('name', 'clusters')):
+            changes.append({"change": CHANGED, "region": name, "stage": stage,
+                            "field": field, "old": old_value, "new": new_value})
+
+        old_clusters = _keyed(_clusters(old_region))
+        new_clusters = _keyed(_clusters(region))
+        for cluster_name in old_clusters:
+            if cluster_name not in new_clusters:
+                changes.append({"change": CLUSTER_REMOVED, "region": name, "stage": stage, "cluster": cluster_name})
+        for cluster_name, cluster in new_clusters.items():
+            if cluster_name not in old_clusters:
+                changes.append({"change": CLUSTER_ADDED, "region": name, "stage": stage, "cluster": cluster_name})
+                continue
+            for field, old_value, new_value in _field_changes(old_clusters[cluster_name], cluster, ('name',)):
+                changes.append({"change": CLUSTER_CHANGED, "region": name, "stage": stage, "cluster": cluster_name,
+                                "field": field, "old": old_value, "new": new_value})
+    return changes
+
+
+def _value(value):
+    return json.dumps(value, ensure_ascii=False, default=str) if not isinstance(value, str) else value
+
+
+def format_change(change):
+    """One line of text for a change, prefixed with +, - or ~ like a diff."""
+    kind, region, stage = change["change"], change["region"], change["stage"]
+    if kind == ADDED:
+        return f"+ region {region} ({stage})"
+    if kind == REMOVED:
+        return f"- region {region} ({stage})"
+    if kind == MOVED:
+        return f"~ region {region}: stage {change['from_stage']} -> {stage}"
+    if kind == CHANGED:
+        return f"~ region {region}: {change['field']} {_value(change['old'])} -> {_value(change['new'])}"
+    if kind == CLUSTER_ADDED:
+        return f"+ cluster {change['cluster']} ({region})"
+    if kind == CLUSTER_REMOVED:
+        return f"- cluster {change['cluster']} ({region})"
+    return (f"~ cluster {change['cluster']} ({region}): {change['field']} "
+            f"{_value(change['old'])} -> {_value(change['new'])}")
+
+
+def merge_manifests(indexes):
+    """
+    Merges manifests in order; later ones win. Regions are matched by name and
+    placed in the stage the last manifest containing them puts them in;
+    clusters are matched by name within a region and replaced as a whole.
+    Stages keep their first-seen order, with new stages inserted after the
+    stage that precedes them in the manifest that introduced them.
+    Returns the merged document.
+    """
+    stage_order = [] # stage names
+    stage_fields = {} # stage name -> stage keys other than 'regions'
+    regions = {} # region key -> merged region
+    placement = {} # region key -> stage name
+
+    for index in indexes:
+        previous_stage = None
+        for stage in index.data:
+            if not isinstance(stage, dict) or not isinstance(stage.get('regions'), list):
+                continue
+            stage_name = stage.get('stage')
+            fields = {k: v for k, v in stage.items() if k != 'regions'}
+            if stage_name not in stage_fields:
+                position = stage_order.index(previous_stage) + 1 if previous_stage in stage_fields else 0
+                stage_order.insert(position, stage_name)
+                stage_fields[stage_name] = fields
+            else:
+                stage_fields[stage_name].update(fields)
+            previous_stage = stage_name
+
+        for key, (stage_name, region) in keyed_regions(index).items():
+            merged = regions.get(key)
+            if merged is None:
+                merged = regions[key] = {k: v for k, v in region.items()}
+            else:
+                clusters = _keyed(_clusters(merged))
+                clusters.update(_keyed(_clusters(region)))
+                merged.update({k: v for k, v in region.items() if k != 'clusters'})
+                if 'clusters' in region or 'clusters' in merged:
+                    merged['clusters'] = list(clusters.values())
+            placement[key] = stage_name
+
+    by_stage = {stage_name: [] for stage_name in stage_order}
+    for key, region in regions.items():
+        by_stage[placement[key]].append(region)
+    return [
+        {**stage_fields[stage_name], 'regions': by_stage[stage_name]}
+        for stage_name in stage_order if by_stage[stage_name]
+    ]
@@ -0,0 +1,172 @@
+"""
+Fast loading of release manifests.
+
+Parsing is most of the CLI's runtime on large manifests, so:
+
+* YAML is parsed and emitted with libyaml (CSafeLoader/CDumper) when PyYAML
+  was built with it, falling back to the pure-Python classes otherwise.
+* The parsed document is stored as JSON in a `.manifest_cache` directory
+  next to the manifest, keyed by a hash of the file's contents. Loading an
+  unchanged manifest again only reads and hashes the file and decodes the JSON.
+  Documents with YAML aliases are not cached: JSON would expand them into
+  copies, and the output must keep writing them as aliases.
+
+The cache is plain data: values JSON has no type for (dates, sets, non-string
+keys, ...) are tagged objects, and decoding only rebuilds those types, so a
+planted cache file can at worst yield wrong data, never run code. Delete the
+directory to clear it.
+"""
+import base64
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import yaml
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+CACHE_DIR_NAME = ".manifest_cache"
+# Bump when the cached structure changes so old entries are ignored.
+CACHE_FORMAT = 2
+# Oldest entries beyond this many are deleted when a new one is written.
+MAX_CACHE_ENTRIES = 64
+
+
+def parse_yaml(text):
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def dump_yaml(data):
+    """Serializes like `yaml.dump(data, sort_keys=False, indent=2)`, with libyaml if available."""
+    return yaml.dump(data, Dumper=Dumper, sort_keys=False, indent=2)
+
+
+def has_aliases(data):
+    """Whether `data` shares objects (YAML anchors/aliases), which yaml.dump writes as `&id001`/`*id001`."""
+    seen, stack = set(), [data]
+    while stack:
+        value = stack.pop()
+        # The values yaml.dump never aliases
+        if value is None or isinstance(value, (str, bytes, bool, int, float)):
+            continue
+        if id(value) in seen:
+            return True
+        seen.add(id(value))
+        if isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set)):
+            stack.extend(value)
+    return False
+
+
+# Key of the tagged objects standing for values JSON cannot hold. Real
+# mappings with this key are tagged too, so the encoding is unambiguous.
+_TAG = "$type"
+
+
+def _encode(value):
+    """Converts what safe_load produces into JSON-serializable data."""
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value) and _TAG not in value:
+            return {key: _encode(item) for key, item in value.items()}
+        return {_TAG: "map", "items": [[_encode(key), _encode(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {_TAG: "tuple", "items": [_encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {_TAG: "set", "items": [_encode(item) for item in value]}
+    if isinstance(value, datetime.datetime):
+        return {_TAG: "datetime", "value": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_TAG: "date", "value": value.isoformat()}
+    if isinstance(value, bytes):
+        return {_TAG: "bytes", "value": base64.b64encode(value).decode("ascii")}
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError(f"Cannot cache a value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    """`json.load` object hook undoing `_encode`."""
+    kind = obj.get(_TAG)
+    if kind is None:
+        return obj
+    if kind == "map":
+        return {key: item for key, item in obj["items"]}
+    if kind == "tuple":
+        return tuple(obj["items"])
+    if kind == "set":
+        return set(obj["items"])
+    if kind == "datetime":
+        return datetime.datetime.fromisoformat(obj["value"])
+    if kind == "date":
+        return datetime.date.fromisoformat(obj["value"])
+    if kind == "bytes":
+        return base64.b64decode(obj["value"])
+    raise ValueError(f"Unknown cache tag {kind!r}")
+
+
+def _cache_path(path, content):
+    digest = hashlib.sha256(content).hexdigest()
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME, f"{digest}.v{CACHE_FORMAT}.json")
+
+
+def _prune(cache_dir):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".json"):
+            with contextlib.suppress(OSError):
+                entries.append((entry.stat().st_mtime, entry.path))
+    entries.sort()
+    for _, old_path in entries[:-MAX_CACHE_ENTRIES]:
+        with contextlib.suppress(OSError):
+            os.unlink(old_path)
+
+
+def _write_cache(cache_path, data):
+    """Best effort: a read-only directory just means no cache."""
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(_encode(data), f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        _prune(cache_dir)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def load_manifest(path, use_cache=True):
+    """
+    Returns the parsed YAML document at `path`. Raises OSError (e.g.
+    FileNotFoundError) if it cannot be read and yaml.YAMLError if it is invalid.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if not use_cache:
+        return parse_yaml(content)
+
+    cache_path = _cache_path(path, content)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f, object_hook=_decode)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError):
+        pass # Corrupt or unreadable entry: parse again and overwrite it
+
+    data = parse_yaml(content)
+    if not has_aliases(data):
+        _write_cache(cache_path, data)
+    return data
@@ -1,41 +1,147 @@
 import yaml
 import argparse
 import sys
+import json
 import os
+from manifest_diff import diff_manifests, format_change, merge_manifests
+from manifest_loader import load_manifest
+from region_index import RegionIndex
+from region_output import OUTPUT_FORMATS, WRITERS
+from region_query import Query
 
 def filter_regions_by_short_name(data, short_names_to_keep):
     """
     Filters the regions in the data, keeping only the ones where a cluster name
     contains one of the specified short names.
+
+    `data` is the parsed YAML or a RegionIndex built from it; pass the index
+    when filtering the same document repeatedly.
+    """
+    index = data if isinstance(data, RegionIndex) else RegionIndex(data)
+    return index.filter_by_short_names(short_names_to_keep)
+
+def filter_regions(data, query):
+    """
+    Filters the regions in the data with a region_query expression, e.g.
+    'use2,uswc' or 'type=batch+aoaiwhisper stage~Stage4*'. `query` may be a
+    string or a compiled Query; raises QuerySyntaxError (a ValueError) if invalid.
+    """
+    index = data if isinstance(data, RegionIndex) else RegionIndex(data)
+    if not isinstance(query, Query):
+        query = Query(query)
+    return query.filter(index)
+
+def _load_index(path, use_cache=True):
+    """Loads a manifest into a RegionIndex, exiting with an error message if it can't be read."""
+    try:
+        return RegionIndex(load_manifest(path, use_cache=use_cache))
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {path}", file=sys.stderr)
+        sys.exit(1)
+    except yaml.YAMLError as e:
+        print(f"Error parsing YAML file {path}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def _write_stdout(write):
+    """Runs `write(sys.stdout)`, exiting quietly if the reader (e.g. `head`) closes the pipe."""
+    try:
+        write(sys.stdout)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+def diff_main(argv):
     """
-    filtered_data = []
-    for stage in data:
-        if 'regions' in stage and isinstance(stage['regions'], list):
-            filtered_regions = []
-            for region in stage['regions']:
-                if 'clusters' in region and isinstance(region['clusters'], list):
-                    # Check if the last part of the cluster name exactly matches one of the short names
-                    if any(
-                        any(cluster.get('name', '').split('-')[-1] == s for s in short_names_to_keep)
-                        for cluster in region['clusters']
-                    ):
-                        filtered_regions.append(region)
-
-            if filtered_regions:
-                new_stage = stage.copy()
-                new_stage['regions'] = filtered_regions
-                filtered_data.append(new_stage)
-    return filtered_data
+    `process_regions.py diff OLD NEW [NEWER ...]`: prints the structural changes
+    between each pair of consecutive manifests.
+    """
+    parser = argparse.ArgumentParser(
+        prog='process_regions.py diff',
+        description='Show added, removed and moved regions and changed clusters between manifests. '
+                    'With more than two files, each file is compared with the one before it.'
+    )
+    parser.add_argument('files', nargs='+', metavar='FILE', help='Manifests, oldest first.')
+    parser.add_argument('-f', '--format', choices=('text', 'json', 'jsonl'), default='text',
+                        help='Output format (default: text).')
+    parser.add_argument('--exit-code', action='store_true',
+                        help='Exit with status 1 if there are differences, like `git diff --exit-code`.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse the YAML files even if cached copies of their content exist.')
+    args = parser.parse_args(argv)
+    if len(args.files) < 2:
+        parser.error("at least two files are required")
+
+    indexes = [_load_index(path, not args.no_cache) for path in args.files]
+    comparisons = []
+    for (old_path, old_index), (new_path, new_index) in zip(zip(args.files, indexes), zip(args.files[1:], indexes[1:])):
+        comparisons.append((old_path, new_path, diff_manifests(old_index, new_index)))
+
+    def write(out):
+        if args.format == 'json':
+            out.write(json.dumps(
+                [{"old": old, "new": new, "changes": changes} for old, new, changes in comparisons],
+                ensure_ascii=False, indent=2, default=str
+            ) + '\n')
+            return
+        for old_path, new_path, changes in comparisons:
+            if args.format == 'jsonl':
+                for change in changes:
+                    out.write(json.dumps({"old_file": old_path, "new_file": new_path, **change},
+                                         ensure_ascii=False, default=str) + '\n')
+                continue
+            out.write(f"--- {old_path}\n+++ {new_path}\n")
+            for change in changes:
+                out.write(format_change(change) + '\n')
+            if not changes:
+                out.write("(no differences)\n")
+
+    _write_stdout(write)
+    if args.exit_code and any(changes for _, _, changes in comparisons):
+        sys.exit(1)
+
+def merge_main(argv):
+    """`process_regions.py merge BASE OVERRIDE [...]`: prints the merged manifest."""
+    parser = argparse.ArgumentParser(
+        prog='process_regions.py merge',
+        description='Merge manifests; later files win. Regions are matched by name and take the stage '
+                    'of the last file that lists them; clusters are matched by name within a region.'
+    )
+    parser.add_argument('files', nargs='+', metavar='FILE', help='Manifests, lowest priority first.')
+    parser.add_argument('-r', '--regions', help='Only output regions matching this query (see --help of the filter).')
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='yaml', help='Output format (default: yaml).')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse the YAML files even if cached copies of their content exist.')
+    args = parser.parse_args(argv)
+
+    try:
+        query = Query(args.regions) if args.regions else None
+    except ValueError as e:
+        print(f"Error: Invalid --regions query: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    merged = RegionIndex(merge_manifests(_load_index(path, not args.no_cache) for path in args.files))
+    region_ids = query.region_ids(merged) if query else range(len(merged))
+    _write_stdout(lambda out: WRITERS[args.format](merged, region_ids, out))
+
+SUBCOMMANDS = {"diff": diff_main, "merge": merge_main}
 
 def main():
     """
     Main function to process the YAML file.
     """
+    # Subcommands are dispatched by hand so `process_regions.py FILE -r ...` keeps working
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
     default_input_file = os.path.join(script_dir, 'release_regions.yaml')
 
     parser = argparse.ArgumentParser(
-        description='Filter regions in a YAML file by short name and print to stdout.'
+        description='Filter regions in a YAML file by short name and print to stdout.',
+        epilog='Subcommands: "diff OLD NEW [...]" compares manifests and "merge FILE [...]" merges them; '
+               'run "process_regions.py diff --help" for details.'
     )
     parser.add_argument(
         'input_file',
@@ -46,28 +152,36 @@ def main():
     parser.add_argument(
         '-r', '--regions',
         required=True,
-        help='A comma-separated list of region short names to keep (e.g., use,usw2).'
+        help='Regions to keep: comma-separated short names (e.g., use,usw2) or a query such as '
+             '"type=batch+aoaiwhisper stage~Stage4*", "config:*eastus*" or "!short=use2". '
+             'Fields: stage, region, cluster, short, config, type.'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Parse the YAML file even if a cached copy of this exact content exists.'
+    )
+    parser.add_argument(
+        '-f', '--format',
+        choices=OUTPUT_FORMATS,
+        default='yaml',
+        help='Output format: the filtered YAML (default), the same document as JSON, '
+             'or JSONL with one region per line including its stage name.'
     )
 
     args = parser.parse_args()
 
     try:
-        with open(args.input_file, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-    except FileNotFoundError:
-        print(f"Error: Input file not found at {args.input_file}", file=sys.stderr)
-        sys.exit(1)
-    except yaml.YAMLError as e:
-        print(f"Error parsing YAML file: {e}", file=sys.stderr)
+        query = Query(args.regions)
+    except ValueError as e:
+        print(f"Error: Invalid --regions query: {e}", file=sys.stderr)
         sys.exit(1)
 
-    regions_to_keep = [region.strip() for region in args.regions.split(',')]
-
-    filtered_data = filter_regions_by_short_name(data, regions_to_keep)
+    index = _load_index(args.input_file, use_cache=not args.no_cache)
 
-    if filtered_data:
-        output_str = yaml.dump(filtered_data, sort_keys=False, indent=2)
-        sys.stdout.write(output_str.rstrip() + '\n')
+    # Matching stages and regions are written as they are serialized, never as one big string
+    region_ids = query.region_ids(index)
+    _write_stdout(lambda out: WRITERS[args.format](index, region_ids, out))
 
 if __name__ == '__main__':
     main()
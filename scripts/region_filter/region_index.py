@@ -0,0 +1,108 @@
+"""
+Index over a parsed release_regions.yaml document.
+
+The manifest is a list of stages, each with `regions`, each with `clusters`
+that have a `name`, `config` and `type`. RegionIndex walks it once and keeps,
+for every field, a map from value to the regions that have it, so a query
+costs a few dict lookups plus the size of the result instead of a rescan of
+every stage, region and cluster.
+"""
+
+# Indexed fields. "short" is the last '-' segment of a cluster name (e.g. "use2"
+# for "speech1b-a10-use2"), which is what `--regions` filters on.
+FIELDS = ("stage", "region", "cluster", "short", "config", "type")
+
+
+def short_name(cluster_name):
+    return cluster_name.rsplit('-', 1)[-1]
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+class RegionIndex:
+    """
+    Regions are identified by their position in document order (0, 1, ...),
+    so sorting ids restores the manifest's order. `postings[field][value]` is
+    the ascending list of ids of the regions that have that value.
+    """
+
+    def __init__(self, data):
+        self.data = data if isinstance(data, list) else []
+        self.regions = [] # id -> (stage index, region dict)
+        self.postings = {field: {} for field in FIELDS}
+
+        for stage_index, stage in enumerate(self.data):
+            if not isinstance(stage, dict) or not isinstance(stage.get('regions'), list):
+                continue
+            stage_name = _text(stage.get('stage'))
+            for region in stage['regions']:
+                if not isinstance(region, dict):
+                    continue
+                region_id = len(self.regions)
+                self.regions.append((stage_index, region))
+                self._add("stage", stage_name, region_id)
+                self._add("region", _text(region.get('name')), region_id)
+                clusters = region.get('clusters')
+                if not isinstance(clusters, list):
+                    continue
+                for cluster in clusters:
+                    if not isinstance(cluster, dict):
+                        continue
+                    cluster_name = _text(cluster.get('name'))
+                    self._add("cluster", cluster_name, region_id)
+                    self._add("short", short_name(cluster_name), region_id)
+                    self._add("config", _text(cluster.get('config')), region_id)
+                    self._add("type", _text(cluster.get('type')), region_id)
+
+    def _add(self, field, value, region_id):
+        ids = self.postings[field].setdefault(value, [])
+        # Ids are added in increasing order, so only the last one can be a duplicate
+        if not ids or ids[-1] != region_id:
+            ids.append(region_id)
+
+    def __len__(self):
+        return len(self.regions)
+
+    def values(self, field):
+        """All distinct values of `field`."""
+        return self.postings[field].keys()
+
+    def lookup(self, field, values):
+        """Returns the set of ids of regions whose `field` equals any of `values`."""
+        postings = self.postings[field]
+        ids = set()
+        for value in set(values):
+            ids.update(postings.get(value, ()))
+        return ids
+
+    def group_by_stage(self, region_ids):
+        """Yields (stage index, [region dict]) for `region_ids`, in manifest order."""
+        current_stage_index, regions = None, []
+        for region_id in sorted(region_ids):
+            stage_index, region = self.regions[region_id]
+            if stage_index != current_stage_index:
+                if regions:
+                    yield current_stage_index, regions
+                current_stage_index, regions = stage_index, []
+            regions.append(region)
+        if regions:
+            yield current_stage_index, regions
+
+    def stage_with(self, stage_index, regions):
+        """A shallow copy of a stage holding only `regions`."""
+        new_stage = self.data[stage_index].copy()
+        new_stage['regions'] = regions
+        return new_stage
+
+    def select(self, region_ids):
+        """
+        Builds the filtered document for `region_ids`: the stages that contain
+        them, in manifest order, each a shallow copy holding only those regions.
+        """
+        return [self.stage_with(stage_index, regions) for stage_index, regions in self.group_by_stage(region_ids)]
+
+    def filter_by_short_names(self, short_names):
+        """Same result as process_regions.filter_regions_by_short_name, in O(result) time."""
+        return self.select(self.lookup("short", short_names))
@@ -0,0 +1,124 @@
+"""
+Rendering of filtered manifests.
+
+Dumping the filtered document with yaml.dump re-serializes every region on
+every query and holds the whole output in memory. YamlFragments serializes
+each region on its own, plus a prefix/suffix template per stage, and
+produces the output piece by piece; the result is identical to
+`dump_yaml(index.select(region_ids))`. The GUI caches the fragments across
+queries, the CLI streams them straight to stdout. Manifests with YAML
+aliases are dumped whole instead: yaml.dump numbers their anchors across the
+whole document, so separately dumped regions would expand them or number
+them differently.
+
+The write_* functions stream a filtered manifest to a file object as YAML,
+JSON (the same document) or JSONL (one region per line, with its stage).
+"""
+import json
+import re
+
+from manifest_loader import dump_yaml, has_aliases
+
+_PLACEHOLDER = "__region_filter_regions__"
+_PLACEHOLDER_RE = re.compile(rf"^  - {_PLACEHOLDER}\n", re.MULTILINE)
+_WRAPPER_HEADER = "- regions:\n"
+
+OUTPUT_FORMATS = ("yaml", "json", "jsonl")
+
+
+class YamlFragments:
+    def __init__(self, index, cache=True):
+        self.index = index
+        self.cache = cache
+        self._regions = {} # region id -> YAML of the region as an item of its stage's `regions`
+        self._stages = {} # stage index -> (prefix, suffix), or None if the stage can't be templated
+        self.aliases = has_aliases(index.data)
+
+    def _stage_template(self, stage_index):
+        if stage_index not in self._stages:
+            stage = self.index.stage_with(stage_index, [_PLACEHOLDER])
+            parts = _PLACEHOLDER_RE.split(dump_yaml([stage]))
+            self._stages[stage_index] = tuple(parts) if len(parts) == 2 else None
+        return self._stages[stage_index]
+
+    def region(self, region_id):
+        fragment = self._regions.get(region_id)
+        if fragment is None:
+            _, region = self.index.regions[region_id]
+            # Dumped at the same depth as in the full document, so line wrapping matches too
+            text = dump_yaml([{'regions': [region]}])
+            fragment = text[len(_WRAPPER_HEADER):]
+            if self.cache:
+                self._regions[region_id] = fragment
+        return fragment
+
+    def warm(self):
+        """Serializes every stage and region ahead of the first query."""
+        if self.aliases:
+            return
+        for region_id, (stage_index, _) in enumerate(self.index.regions):
+            self._stage_template(stage_index)
+            self.region(region_id)
+
+    def iter_yaml(self, region_ids):
+        """Yields the YAML of the filtered document stage by stage, in manifest order."""
+        if self.aliases:
+            yield dump_yaml(self.index.select(region_ids))
+            return
+        stage_index, stage_region_ids = None, []
+        for region_id in sorted(region_ids):
+            if self.index.regions[region_id][0] != stage_index:
+                if stage_region_ids:
+                    yield from self._iter_stage(stage_index, stage_region_ids)
+                stage_index, stage_region_ids = self.index.regions[region_id][0], []
+            stage_region_ids.append(region_id)
+        if stage_region_ids:
+            yield from self._iter_stage(stage_index, stage_region_ids)
+
+    def _iter_stage(self, stage_index, region_ids):
+        template = self._stage_template(stage_index)
+        if template is None:
+            regions = [self.index.regions[region_id][1] for region_id in region_ids]
+            yield dump_yaml([self.index.stage_with(stage_index, regions)])
+            return
+        prefix, suffix = template
+        yield prefix
+        for region_id in region_ids:
+            yield self.region(region_id)
+        yield suffix
+
+    def render(self, region_ids):
+        return "".join(self.iter_yaml(region_ids))
+
+
+def _json(value, indent=None):
+    # safe_load can produce dates and other non-JSON scalars
+    return json.dumps(value, ensure_ascii=False, indent=indent, default=str)
+
+
+def write_yaml(index, region_ids, out):
+    for chunk in YamlFragments(index, cache=False).iter_yaml(region_ids):
+        out.write(chunk)
+
+
+def write_json(index, region_ids, out):
+    """Writes the filtered document as a JSON array, one stage at a time."""
+    out.write("[")
+    separator = "\n"
+    for stage_index, regions in index.group_by_stage(region_ids):
+        out.write(separator)
+        out.write("  " + _json(index.stage_with(stage_index, regions), indent=2).replace("\n", "\n  "))
+        separator = ",\n"
+    out.write("\n]\n" if separator != "\n" else "]\n")
+
+
+def write_jsonl(index, region_ids, out):
+    """Writes one JSON object per region: its stage name followed by the region's own keys."""
+    for stage_index, regions in index.group_by_stage(region_ids):
+        stage_name = index.data[stage_index].get('stage')
+        for region in regions:
+            out.write(_json({'stage': stage_name, **region}))
+            out.write("\n")
+
+
+WRITERS = {"yaml": write_yaml, "json": write_json, "jsonl": write_jsonl}
@@ -0,0 +1,188 @@
+"""
+Query language for selecting regions from a release manifest.
+
+    use2,uswc     use2, uswc      short names (last '-' segment of a cluster name);
+                                  empty entries (',use2', 'use2,,uswc', 'use2,') are ignored
+    type=batch+aoaiwhisper        exact match on a field
+    stage~Stage4*                 glob match (*, ?, [...]), case-insensitive
+    config:*eastus*               same as ~
+    !type=batch   not type=batch  negation (also type!=batch, stage!~Stage4*)
+    stage~Stage4* type=batch      juxtaposition or & / 'and' is AND
+    use2 | uswc   use2 or uswc    ',' / '|' / 'or' is OR
+    (stage=Canary, stage=Stage1) & !short=uscx
+
+Fields: stage, region, cluster, short (the default), config, type. A region
+matches a term if the region (or any of its clusters) has a matching value.
+NOT binds tightest, then AND, then OR.
+
+A query is compiled once into a tree of closures that evaluate to sets of
+region ids using the postings of a RegionIndex. Globs are matched against
+the distinct values of a field, not against every cluster.
+"""
+import fnmatch
+import re
+
+from region_index import FIELDS
+
+DEFAULT_FIELD = "short"
+
+# `field!=value` is one word; any other '!' is the NOT operator
+_TOKEN_RE = re.compile(r"\s*(?:([A-Za-z_]+![=~:][^\s(),|&!]*)|([(),|&!])|([^\s(),|&!]+))")
+_TERM_RE = re.compile(r"^([A-Za-z_]+)(!?[=~:])(.*)$")
+_WILDCARD_RE = re.compile(r"[*?\[]")
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match:
+            raise QuerySyntaxError(f"Unexpected character at position {position}: {text[position]!r}")
+        negated_term, symbol, word = match.groups()
+        word = negated_term or word
+        if word is not None and word.lower() in ("and", "or", "not"):
+            symbol, word = word.lower(), None
+        tokens.append((symbol, word))
+        position = match.end()
+    return tokens
+
+
+def _term(word):
+    """Compiles one `field<op>value` (or bare value) into a function of the index."""
+    match = _TERM_RE.match(word)
+    if match:
+        field, op, value = match.group(1).lower(), match.group(2), match.group(3)
+        if field not in FIELDS:
+            raise QuerySyntaxError(f"Unknown field '{field}'. Use one of: {', '.join(FIELDS)}.")
+        if not value:
+            raise QuerySyntaxError(f"Missing value after '{field}{op}'.")
+    elif word[0] in "=~:":
+        # e.g. `type != batch` or `type ! =batch`: the field and operator must be written together
+        raise QuerySyntaxError(f"Missing field before '{word}'.")
+    else:
+        # Bare words keep the old --regions behaviour: exact short names, unless they contain a wildcard
+        field, value = DEFAULT_FIELD, word
+        op = "~" if _WILDCARD_RE.search(word) else "="
+
+    if op.startswith("!"):
+        node = _term(f"{field}{op[1:]}{value}")
+        return lambda index: set(range(len(index))) - node(index)
+    if op == "=":
+        return lambda index: index.lookup(field, (value,))
+
+    pattern = re.compile(fnmatch.translate(value), re.IGNORECASE)
+
+    def glob(index):
+        return index.lookup(field, [v for v in index.values(field) if pattern.match(v)])
+    return glob
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if all(symbol == "," for symbol, _ in self.tokens):
+            raise QuerySyntaxError("Empty query.")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            symbol, word = self.peek()
+            raise QuerySyntaxError(f"Unexpected '{symbol or word}'.")
+        return node
+
+    def skip_commas(self):
+        while self.peek()[0] == ",":
+            self.take()
+
+    def parse_or(self):
+        # Empty entries of a comma-separated list are skipped, as the old --regions list ignored them
+        self.skip_commas()
+        nodes = [self.parse_and()]
+        while self.peek()[0] in (",", "|", "or"):
+            if self.take()[0] == ",":
+                self.skip_commas()
+                if self.peek() == (None, None) or self.peek()[0] == ")":
+                    break
+            nodes.append(self.parse_and())
+        if len(nodes) == 1:
+            return nodes[0]
+
+        def union(index):
+            ids = set()
+            for node in nodes:
+                ids |= node(index)
+            return ids
+        return union
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while True:
+            symbol, word = self.peek()
+            if symbol in ("&", "and"):
+                self.take()
+            elif not (word is not None or symbol in ("(", "!", "not")):
+                break
+            nodes.append(self.parse_not())
+        if len(nodes) == 1:
+            return nodes[0]
+
+        def intersection(index):
+            ids = nodes[0](index)
+            for node in nodes[1:]:
+                if not ids:
+                    break
+                ids &= node(index)
+            return ids
+        return intersection
+
+    def parse_not(self):
+        if self.peek()[0] in ("!", "not"):
+            self.take()
+            node = self.parse_not()
+            return lambda index: set(range(len(index))) - node(index)
+        return self.parse_atom()
+
+    def parse_atom(self):
+        symbol, word = self.take()
+        if symbol == "(":
+            node = self.parse_or()
+            if self.take()[0] != ")":
+                raise QuerySyntaxError("Missing ')'.")
+            return node
+        if word is None:
+            raise QuerySyntaxError(f"Expected a term, found '{symbol}'." if symbol else "Query ends unexpectedly.")
+        return _term(word)
+
+
+class Query:
+    """A compiled query. Raises QuerySyntaxError (a ValueError) on invalid input."""
+
+    def __init__(self, text):
+        self.text = text
+        self._evaluate = _Parser(_tokenize(text)).parse()
+
+    def __repr__(self):
+        return f"Query({self.text!r})"
+
+    def region_ids(self, index):
+        """Returns the set of ids of matching regions in `index`."""
+        return set(self._evaluate(index))
+
+    def filter(self, index):
+        """Returns the filtered manifest (same shape as the input) for `index`."""
+        return index.select(self.region_ids(index))